@@ -0,0 +1,98 @@
+import asyncio
+import time
+import numpy as np
+
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+class MicroBatcher:
+    def __init__(self, predict, max_batch: int = 64, max_wait_ms: float = 2.0):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._loop = None
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+        self.queue_delay_sum = 0.0
+        self.queue_delay_max = 0.0
+        self.predict_time_sum = 0.0
+        self.batch_hist = np.zeros(len(BATCH_BUCKETS) + 1, dtype=np.int64)
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue, self._loop, self._task = asyncio.Queue(), loop, None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, row: np.ndarray, model) -> float:
+        self._ensure_running()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, model, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self) -> list:
+        items = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            start = time.perf_counter()
+            groups = {}
+            for it in items:
+                groups.setdefault(id(it[1]), []).append(it)
+            for group in groups.values():
+                try:
+                    X = np.vstack([row for row, _, _, _ in group])
+                    y = await asyncio.to_thread(self.predict, group[0][1], X)
+                except Exception as e:
+                    for _, _, fut, _ in group:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                for (_, _, fut, _), v in zip(group, y):
+                    if not fut.done():
+                        fut.set_result(float(v))
+            self._record(items, start, time.perf_counter() - start)
+
+    def _record(self, items: list, start: float, elapsed: float):
+        delays = [start - t for _, _, _, t in items]
+        self.batches += 1
+        self.rows += len(items)
+        self.queue_delay_sum += sum(delays)
+        self.queue_delay_max = max(self.queue_delay_max, max(delays))
+        self.predict_time_sum += elapsed
+        self.batch_hist[np.searchsorted(BATCH_BUCKETS, len(items))] += 1
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "mean_queue_delay_ms": 1000.0 * self.queue_delay_sum / self.rows if self.rows else 0.0,
+            "max_queue_delay_ms": 1000.0 * self.queue_delay_max,
+            "mean_predict_ms": 1000.0 * self.predict_time_sum / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {
+                **{f"le_{b}": int(c) for b, c in zip(BATCH_BUCKETS, self.batch_hist)},
+                f"gt_{BATCH_BUCKETS[-1]}": int(self.batch_hist[-1]),
+            },
+        }
\ No newline at end of file
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sharp.forest import load_forest, predict_forest
+from sharp.model import model_dir
+
+FOREST_MAX_ROWS = int(os.environ.get("SHARP_FOREST_MAX_ROWS", "256"))
+
+def _sklearn(m: dict):
+    if m["rf"] is None:
+        with m["lock"]:
+            if m["rf"] is None:
+                import joblib
+                m["rf"] = joblib.load(Path(m["dir"]) / "rf.pkl")
+    return m["rf"]
+
+def predict_rows(m: dict, X) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X[None, :]
+    if m["forest"] is None or (X.shape[0] > m["forest_max_rows"] and m["has_pkl"]):
+        return _sklearn(m).predict(pd.DataFrame(X, columns=m["features"]))
+    return predict_forest(m["forest"], X)
+
+class ModelHolder:
+    def __init__(self, root="models", reload_s: float = 1.0, forest_max_rows: int = FOREST_MAX_ROWS):
+        self.root = Path(root)
+        self.reload_s = reload_s
+        self.forest_max_rows = forest_max_rows
+        self._model = None
+        self._dir = None
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.last_error = None
+
+    def _load(self, d: Path) -> dict:
+        t0 = time.perf_counter()
+        feats = json.loads((d / "features.json").read_text())
+        m = {"dir": str(d), "features": feats, "forest": None, "rf": None, "lock": threading.Lock(),
+             "has_pkl": (d / "rf.pkl").exists(), "forest_max_rows": self.forest_max_rows}
+        if (d / "forest" / "meta.json").exists():
+            m["forest"] = load_forest(d / "forest")
+            engine, n_features = "forest", m["forest"]["n_features"]
+        else:
+            engine, n_features = "sklearn", _sklearn(m).n_features_in_
+        if n_features != len(feats):
+            raise ValueError(f"{d} has {len(feats)} features but the model expects {n_features}")
+        m.update({
+            "version": d.name if d != self.root else None,
+            "engine": engine,
+            "loaded_at": time.time(),
+            "load_ms": 1000.0 * (time.perf_counter() - t0),
+        })
+        return m
+
+    def get(self) -> dict | None:
+        if time.monotonic() - self._checked < self.reload_s:
+            return self._model
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= self.reload_s:
+                self._checked = now
+                d = model_dir(self.root)
+                if d != self._dir or self._model is None:
+                    try:
+                        self._model = self._load(d)
+                        self._dir = d
+                        self.loads += 1
+                        self.last_error = None
+                    except (OSError, ValueError) as e:
+                        self.last_error = f"{type(e).__name__}: {e}"
+        return self._model
+
+    def predict(self, X):
+        m = self.get()
+        if m is None:
+            raise RuntimeError(f"no model loaded from {self.root}: {self.last_error}")
+        return predict_rows(m, X)
+
+    def status(self) -> dict:
+        m = self.get()
+        info = {k: m[k] for k in ("version", "dir", "engine", "loaded_at", "load_ms", "forest_max_rows")} if m else {}
+        if m:
+            info["sklearn_loaded"] = m["rf"] is not None
+        return {"ready": m is not None, "loads": self.loads, "last_error": self.last_error, **info}
\ No newline at end of file
@@ -1,16 +1,58 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import joblib
 import json
+import os
+import time
 import numpy as np
-import pandas as pd
-from pathlib import Path
+from api.batching import MicroBatcher, BATCH_BUCKETS
+from api.models import ModelHolder, predict_rows
+from sharp.profiling import Histogram, Counters
+from sharp.model import design_matrix
+from sharp.store import STORE_DIR, YEAR_BASE, load_feature_store, store_mtime, lookup
 
 app = FastAPI()
-MODEL_PATH = Path("models/rf.pkl")
-FEATS_PATH = Path("models/features.json")
-rf = joblib.load(MODEL_PATH)
-feats = json.loads(FEATS_PATH.read_text())
+models = ModelHolder(os.environ.get("SHARP_MODEL_DIR", "models"), float(os.environ.get("SHARP_MODEL_RELOAD_S", "1")))
+STORE_RELOAD_S = float(os.environ.get("SHARP_STORE_RELOAD_S", "1"))
+_fs = {"store": None, "mtime": None, "checked": float("-inf")}
+batcher = MicroBatcher(
+    predict_rows,
+    max_batch=int(os.environ.get("SHARP_BATCH_MAX_ROWS", "64")),
+    max_wait_ms=float(os.environ.get("SHARP_BATCH_WAIT_MS", "2")),
+)
+latency = Histogram("sharp_http_request_duration_seconds", "HTTP request latency by route template")
+requests_total = Counters("sharp_http_requests_total", "HTTP requests by route template and status")
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        latency.observe(time.perf_counter() - t0, path, request.method)
+        requests_total.inc(path, request.method, status)
+
+def current_model() -> dict:
+    m = models.get()
+    if m is None:
+        raise HTTPException(status_code=503, detail=f"model not loaded: {models.last_error}")
+    return m
+
+def feature_store():
+    now = time.monotonic()
+    if now - _fs["checked"] >= STORE_RELOAD_S:
+        _fs["checked"] = now
+        m = store_mtime(STORE_DIR)
+        if m != _fs["mtime"]:
+            _fs["store"] = load_feature_store(STORE_DIR)
+            _fs["mtime"] = m
+    return _fs["store"]
 
 class ScoreRequest(BaseModel):
     payment_ratio: float
@@ -22,13 +64,139 @@ class ScoreRequest(BaseModel):
     year: int
     hospital_size_category: str | None = None
 
+NUMERIC = [
+    "payment_ratio",
+    "medicare_coverage_ratio",
+    "financial_stress_index",
+    "avg_charges_log",
+    "state_avg_payment_ratio",
+    "drg_diversity_index",
+    "year",
+]
+
+def _columns_from_records(records: list) -> dict:
+    n = len(records)
+    try:
+        cols = {f: np.fromiter((r[f] for r in records), dtype=np.float64, count=n) for f in NUMERIC}
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"missing field {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"invalid value: {e}")
+    cols["hospital_size_category"] = [r.get("hospital_size_category") for r in records]
+    if n and "Provider_Id" in records[0]:
+        cols["Provider_Id"] = [r.get("Provider_Id") for r in records]
+    return cols
+
+def _columns_from_mapping(columns: dict) -> dict:
+    missing = [f for f in NUMERIC if f not in columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"missing columns {missing}")
+    cols = {f: np.asarray(columns[f], dtype=np.float64) for f in NUMERIC}
+    for c in ("hospital_size_category", "Provider_Id"):
+        if c in columns:
+            cols[c] = np.asarray(columns[c], dtype=object).tolist()
+    return cols
+
+def _columns_from_arrow(body: bytes) -> dict:
+    import pyarrow as pa
+    tbl = pa.ipc.open_stream(body).read_all()
+    cols = {c: tbl.column(c).to_numpy(zero_copy_only=False) for c in tbl.column_names}
+    return _columns_from_mapping(cols)
+
+async def _parse_batch(request: Request) -> dict:
+    ctype = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    body = await request.body()
+    if ctype in ("application/vnd.apache.arrow.stream", "application/x-arrow"):
+        return _columns_from_arrow(body)
+    try:
+        if ctype in ("application/x-ndjson", "application/jsonl"):
+            return _columns_from_records([json.loads(line) for line in body.splitlines() if line.strip()])
+        payload = json.loads(body)
+        if isinstance(payload, list):
+            return _columns_from_records(payload)
+        if isinstance(payload, dict) and "records" in payload:
+            return _columns_from_records(payload["records"])
+        if isinstance(payload, dict) and "columns" in payload:
+            return _columns_from_mapping(payload["columns"])
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"invalid JSON: {e}")
+    except (TypeError, AttributeError) as e:
+        raise HTTPException(status_code=422, detail=f"invalid batch: {e}")
+    raise HTTPException(status_code=422, detail="expected a list of records, {'records': [...]} or {'columns': {...}}")
+
 @app.post("/score")
-def score(req: ScoreRequest):
-    d = pd.DataFrame([{**req.dict()}])
-    for c in ["hospital_size_category_small","hospital_size_category_medium","hospital_size_category_large"]:
-        d[c] = 0
-    if req.hospital_size_category:
-        d[f"hospital_size_category_{req.hospital_size_category}"] = 1
-    X = d[feats]
-    y_pred = rf.predict(X)[0]
-    return {"pred_next_readmit_discharges": float(y_pred)}
\ No newline at end of file
+async def score(req: ScoreRequest):
+    m = current_model()
+    X = design_matrix({k: [v] for k, v in req.dict().items()}, 1, m["features"])
+    y_pred = await batcher.submit(X[0], m)
+    return {"pred_next_readmit_discharges": float(y_pred)}
+
+@app.get("/ready")
+def ready():
+    status = models.status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return batcher.stats()
+
+def _batch_metrics() -> str:
+    st = batcher.stats()
+    lines = ["# HELP sharp_batch_size Rows per micro-batch sent to the model", "# TYPE sharp_batch_size histogram"]
+    cum = 0
+    for b, c in zip([*BATCH_BUCKETS, "+Inf"], batcher.batch_hist):
+        cum += int(c)
+        lines.append(f'sharp_batch_size_bucket{{le="{b}"}} {cum}')
+    lines += [f"sharp_batch_size_sum {st['rows']}", f"sharp_batch_size_count {st['batches']}"]
+    for k, help_text in [("mean_queue_delay_ms", "Mean queue delay per row"), ("max_queue_delay_ms", "Max queue delay"),
+                         ("mean_predict_ms", "Mean model time per batch")]:
+        lines += [f"# HELP sharp_batch_{k} {help_text}", f"# TYPE sharp_batch_{k} gauge", f"sharp_batch_{k} {st[k]}"]
+    return "\n".join(lines)
+
+@app.get("/metrics")
+def metrics():
+    body = "\n".join([latency.render(), requests_total.render(), _batch_metrics()]) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.post("/score/batch")
+async def score_batch(request: Request):
+    cols = await _parse_batch(request)
+    n = len(cols[NUMERIC[0]])
+    if n == 0:
+        return {"n": 0, "pred_next_readmit_discharges": []}
+    m = current_model()
+    y_pred = await run_in_threadpool(predict_rows, m, design_matrix(cols, n, m["features"]))
+    out = {"n": n, "pred_next_readmit_discharges": y_pred.tolist()}
+    if "Provider_Id" in cols:
+        out["Provider_Id"] = cols["Provider_Id"]
+    return out
+
+@app.get("/score/provider/{provider_id}")
+async def score_provider(provider_id: int, year: int | None = None):
+    store = feature_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="feature store not published")
+    i = lookup(store, provider_id, year)
+    if i is None:
+        raise HTTPException(status_code=404, detail=f"no features for provider {provider_id} year {year}")
+    m = current_model()
+    if store["features"] != m["features"]:
+        raise HTTPException(status_code=409, detail="feature store was built for a different model")
+    cache = store["predictions"]
+    key = (m["version"], i)
+    cached = key in cache
+    if not cached:
+        cache[key] = await batcher.submit(np.asarray(store["X"][i]), m)
+    return {
+        "Provider_Id": provider_id,
+        "Provider_Name": str(store["provider_name"][i]),
+        "Provider_State": str(store["provider_state"][i]),
+        "year": int(store["keys"][i] % YEAR_BASE),
+        "store_version": store["version"],
+        "cached": cached,
+        "model_version": m["version"],
+        "features": dict(zip(m["features"], np.asarray(store["X"][i]).tolist())),
+        "pred_next_readmit_discharges": float(cache[key]),
+    }
\ No newline at end of file
@@ -0,0 +1,47 @@
+import sys
+import argparse
+import json
+import time
+from pathlib import Path
+from pathlib import Path as _P
+sys.path.append(str(_P(__file__).resolve().parents[1]))
+import pandas as pd
+from sharp.model import update_provider_year, add_next_year_target
+from sharp.backtest import (DEFAULT_GRID, FOLD_CACHE_DIR, param_grid, sample_params, backtest_folds,
+                            run_backtest, leaderboard)
+
+def main():
+    p = argparse.ArgumentParser(description="Rolling-origin backtest and hyperparameter search for the RF")
+    p.add_argument("--panel", default="outputs/provider_year.csv",
+                   help="add_next_year_target panel; rebuilt from data/ when missing")
+    p.add_argument("--grid", default=None, help="JSON object of parameter -> list of values")
+    p.add_argument("--n-iter", type=int, default=None, help="random search over --grid instead of the full grid")
+    p.add_argument("--min-train-years", type=int, default=1)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--cache-dir", default=str(FOLD_CACHE_DIR))
+    p.add_argument("--out-dir", default="outputs")
+    args = p.parse_args()
+    panel_path = Path(args.panel)
+    if panel_path.exists():
+        agg = pd.read_csv(panel_path)
+    else:
+        agg = add_next_year_target(update_provider_year()[0])
+    grid = json.loads(args.grid) if args.grid else DEFAULT_GRID
+    configs = sample_params(grid, args.n_iter, args.seed) if args.n_iter else param_grid(grid)
+    folds = backtest_folds(agg["year"], args.min_train_years)
+    print(f"{len(configs)} configs x {len(folds)} folds ({[f['test'] for f in folds]})")
+    t0 = time.perf_counter()
+    results = run_backtest(agg, configs, folds, n_workers=args.workers, random_state=args.seed,
+                           cache_dir=args.cache_dir)
+    board = leaderboard(results, configs)
+    out = Path(args.out_dir)
+    out.mkdir(exist_ok=True)
+    results.to_csv(out / "backtest_folds.csv", index=False)
+    board.to_csv(out / "backtest_leaderboard.csv", index=False)
+    print(f"done in {time.perf_counter() - t0:.1f}s")
+    print(board[["params", "mae_mean", "auc_mean", "wall_s", "predict_us_per_row", "n_nodes_mean"]]
+          .head(10).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import sys
+import time
+import argparse
+from pathlib import Path as _P
+sys.path.append(str(_P(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+from sharp.data import load_ipps_data
+from sharp.features import build_features, HIGH_READMIT_DRGS
+
+def build_features_merge(cms: pd.DataFrame) -> pd.DataFrame:
+    df = cms.copy()
+    df["payment_ratio"] = df["Average_Total_Payments"] / df["Average_Covered_Charges"]
+    df["medicare_coverage_ratio"] = df["Average_Medicare_Payments"] / df["Average_Total_Payments"]
+    df["financial_stress_index"] = 1 - df["payment_ratio"]
+    df["DRG_Code"] = df["DRG_Definition"].astype(str).str.extract(r"(\d{3})")
+    df["is_readmit_prone"] = df["DRG_Code"].isin(list(HIGH_READMIT_DRGS.keys()))
+    df["avg_charges_log"] = np.log1p(df["Average_Covered_Charges"])
+    state_ratio = (
+        df.groupby(["Provider_State", "year"], observed=True)["payment_ratio"].mean().rename("state_avg_payment_ratio")
+    )
+    df = df.merge(state_ratio.reset_index(), on=["Provider_State", "year"], how="left")
+    size = df.groupby(["Provider_Id", "year"])['Total_Discharges'].sum().rename('year_discharge_total')
+    df = df.merge(size.reset_index(), on=["Provider_Id", "year"], how="left")
+    bins = [0, 500, 2000, np.inf]
+    labels = ["small", "medium", "large"]
+    df["hospital_size_category"] = pd.cut(df["year_discharge_total"], bins=bins, labels=labels)
+    diversity = df.groupby(["Provider_Id", "year"])['DRG_Code'].nunique().rename('drg_diversity_index')
+    df = df.merge(diversity.reset_index(), on=["Provider_Id", "year"], how="left")
+    return df
+
+def _time(fn, cms, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(cms)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def _check(a: pd.DataFrame, b: pd.DataFrame):
+    assert list(a.columns) == list(b.columns)
+    for c in a.columns:
+        x, y = a[c].reset_index(drop=True), b[c].reset_index(drop=True)
+        if x.dtype.kind == "f":
+            assert np.allclose(x, y, rtol=1e-6, equal_nan=True), c
+        else:
+            assert (x.astype(str) == y.astype(str)).all(), c
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+    cms = load_ipps_data()
+    t_old, old = _time(build_features_merge, cms, args.repeat)
+    t_new, new = _time(build_features, cms, args.repeat)
+    _check(old, new)
+    print(f"rows={len(cms):,} years={cms['year'].nunique()}")
+    print(f"merge     {t_old:8.3f}s")
+    print(f"factorize {t_new:8.3f}s  ({t_old / t_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
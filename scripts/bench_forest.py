@@ -0,0 +1,56 @@
+import sys
+import time
+import argparse
+import json
+import warnings
+from pathlib import Path as _P
+sys.path.append(str(_P(__file__).resolve().parents[1]))
+import numpy as np
+import pandas as pd
+import joblib
+from sharp.forest import export_forest, load_forest, predict_forest
+from sharp.model import model_dir
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+def _best(fn, repeat):
+    best, out = np.inf, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def _matrix(panel: pd.DataFrame, feats: list, n: int) -> np.ndarray:
+    d = panel.copy()
+    d["hospital_size_category"] = d["hospital_size_category"].astype(str)
+    d = pd.get_dummies(d, columns=["hospital_size_category"], dummy_na=True)
+    for f in feats:
+        if f not in d:
+            d[f] = 0
+    X = d[feats].to_numpy(np.float64)
+    return X[np.arange(n) % len(X)]
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model-dir", default="models")
+    p.add_argument("--panel", default="outputs/provider_year.csv")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+    md = model_dir(args.model_dir)
+    feats = json.loads((md / "features.json").read_text())
+    t_pkl, rf = _best(lambda: joblib.load(md / "rf.pkl"), args.repeat)
+    if not (md / "forest" / "meta.json").exists():
+        export_forest(rf, md / "forest")
+    t_npy, forest = _best(lambda: load_forest(md / "forest"), args.repeat)
+    panel = pd.read_csv(args.panel)
+    print(f"load   joblib {t_pkl * 1e3:9.2f}ms   mmap arrays {t_npy * 1e3:9.2f}ms")
+    for n in (1, 64, 1024, 5000):
+        X = _matrix(panel, feats, n)
+        t_sk, a = _best(lambda: rf.predict(X), args.repeat)
+        t_np, b = _best(lambda: predict_forest(forest, X), args.repeat)
+        assert np.array_equal(a, b), f"prediction mismatch at n={n}"
+        print(f"n={n:<5d} sklearn {t_sk * 1e3:9.2f}ms   numpy {t_np * 1e3:9.2f}ms   ({t_sk / t_np:.1f}x)")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
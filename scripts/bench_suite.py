@@ -0,0 +1,219 @@
+import sys
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+import numpy as np
+
+STAGES = ["load_csv", "load_cache", "features", "provider_year", "bootstrap_tam", "bootstrap_readmit",
+          "bootstrap_did", "train", "api_score", "api_batch"]
+
+def _rss_mb() -> float:
+    from sharp.model import _peak_rss_mb
+    return _peak_rss_mb() or float("nan")
+
+def _reset_peak() -> float:
+    from sharp.model import _reset_peak_rss
+    return _reset_peak_rss() or float("nan")
+
+def _features():
+    from sharp.data import load_ipps_data
+    from sharp.features import build_features
+    return build_features(load_ipps_data(), copy=False)
+
+def _panel():
+    from sharp.model import build_provider_year, add_next_year_target
+    return add_next_year_target(build_provider_year(_features()))
+
+def _api_client():
+    from fastapi.testclient import TestClient
+    from api.scoring_api import app
+    return TestClient(app)
+
+def _api_rows(n: int) -> list:
+    import pandas as pd
+    panel = pd.read_csv("outputs/provider_year.csv") if Path("outputs/provider_year.csv").exists() else _panel()
+    cols = ["payment_ratio", "medicare_coverage_ratio", "financial_stress_index", "avg_charges_log",
+            "state_avg_payment_ratio", "drg_diversity_index", "year", "hospital_size_category"]
+    rows = panel[cols].dropna(subset=cols[:-1]).head(n).astype({"year": int})
+    rows["hospital_size_category"] = rows["hospital_size_category"].astype(str)
+    return rows.to_dict("records")
+
+def _latency(times: list) -> dict:
+    ms = np.asarray(times) * 1e3
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+def run_stage(stage: str, args) -> dict:
+    from sharp.data import load_ipps_data
+    from sharp.features import build_features
+    from sharp.model import build_provider_year, add_next_year_target, train_models, save_model
+    from sharp.bootstrap import bootstrap_tam, bootstrap_readmit_ratio, bootstrap_did
+    extra = {}
+    if stage == "load_csv":
+        base, t0 = _reset_peak(), time.perf_counter()
+        rows = len(load_ipps_data(cache=False))
+    elif stage == "load_cache":
+        load_ipps_data()
+        base, t0 = _reset_peak(), time.perf_counter()
+        rows = len(load_ipps_data())
+    elif stage == "features":
+        cms = load_ipps_data()
+        base, t0 = _reset_peak(), time.perf_counter()
+        rows = len(build_features(cms, copy=False))
+    elif stage == "provider_year":
+        d = _features()
+        base, t0 = _reset_peak(), time.perf_counter()
+        panel = add_next_year_target(build_provider_year(d))
+        rows = len(d)
+        Path("outputs").mkdir(exist_ok=True)
+        panel.to_csv("outputs/provider_year.csv", index=False)
+    elif stage.startswith("bootstrap_"):
+        d = _features()
+        fn = {"bootstrap_tam": bootstrap_tam, "bootstrap_readmit": bootstrap_readmit_ratio,
+              "bootstrap_did": bootstrap_did}[stage]
+        base, t0 = _reset_peak(), time.perf_counter()
+        fn(d, n_boot=args.n_boot)
+        rows = len(d)
+        extra["n_boot"] = args.n_boot
+    elif stage == "train":
+        panel = _panel()
+        base, t0 = _reset_peak(), time.perf_counter()
+        m = train_models(panel, n_estimators=args.n_estimators, n_jobs=args.n_jobs)
+        rows = len(panel)
+        extra.update(n_estimators=args.n_estimators, train_seconds=m["train_seconds"])
+        save_model(m, "models")
+    elif stage == "api_score":
+        warnings.filterwarnings("ignore")
+        rows_in = _api_rows(args.api_requests)
+        client = _api_client()
+        client.post("/score", json=rows_in[0])
+        times = []
+        base, t0 = _reset_peak(), time.perf_counter()
+        for r in rows_in:
+            s = time.perf_counter()
+            resp = client.post("/score", json=r)
+            times.append(time.perf_counter() - s)
+            resp.raise_for_status()
+        rows = len(rows_in)
+        extra.update(_latency(times))
+    elif stage == "api_batch":
+        warnings.filterwarnings("ignore")
+        rows_in = _api_rows(args.api_batch_rows)
+        client = _api_client()
+        client.post("/score/batch", json=rows_in[:8])
+        times = []
+        base, t0 = _reset_peak(), time.perf_counter()
+        for _ in range(args.api_batches):
+            s = time.perf_counter()
+            resp = client.post("/score/batch", json={"records": rows_in})
+            times.append(time.perf_counter() - s)
+            resp.raise_for_status()
+        rows = len(rows_in) * args.api_batches
+        extra.update(_latency(times), batch_rows=len(rows_in))
+    else:
+        raise ValueError(f"Unknown stage {stage!r}")
+    wall = time.perf_counter() - t0
+    return {"stage": stage, "rows": rows, "wall_s": wall, "rows_per_s": rows / wall if wall > 0 else None,
+            "peak_rss_mb": _rss_mb() - base, "prep_rss_mb": base, **extra}
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _child(stage: str, work: Path, args) -> dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", stage, "--n-boot", str(args.n_boot),
+           "--n-estimators", str(args.n_estimators), "--n-jobs", str(args.n_jobs),
+           "--api-requests", str(args.api_requests), "--api-batches", str(args.api_batches),
+           "--api-batch-rows", str(args.api_batch_rows)]
+    r = subprocess.run(cmd, cwd=work, capture_output=True, text=True)
+    if r.returncode != 0:
+        return {"stage": stage, "error": (r.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+def _load_history(path: Path) -> list:
+    return json.loads(path.read_text()) if path.exists() else []
+
+def _save_history(path: Path, history: list):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(history, indent=1))
+    tmp.replace(path)
+
+def _baseline(history: list, scale: float, stage: str, window: int) -> float | None:
+    prev = [h["wall_s"] for h in history if h.get("scale") == scale and h.get("stage") == stage and "wall_s" in h]
+    return float(np.median(prev[-window:])) if prev else None
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark sharp stages and the scoring API on synthetic IPPS data")
+    p.add_argument("--scales", default="1", help="comma-separated provider scale factors")
+    p.add_argument("--year-scale", type=int, default=1)
+    p.add_argument("--stages", default=",".join(STAGES))
+    p.add_argument("--work-dir", default="bench")
+    p.add_argument("--history", default="bench/history.json")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--n-boot", type=int, default=300)
+    p.add_argument("--n-estimators", type=int, default=100)
+    p.add_argument("--n-jobs", type=int, default=-1)
+    p.add_argument("--api-requests", type=int, default=200)
+    p.add_argument("--api-batches", type=int, default=20)
+    p.add_argument("--api-batch-rows", type=int, default=1000)
+    p.add_argument("--tolerance", type=float, default=0.2, help="flag stages slower than baseline by this fraction")
+    p.add_argument("--window", type=int, default=5, help="previous runs in the baseline median")
+    p.add_argument("--fail-on-regression", action="store_true")
+    p.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        print(json.dumps(run_stage(args.child, args), default=float))
+        return
+    from sharp.synth import write_synthetic_ipps
+    hist_path = Path(args.history)
+    history = _load_history(hist_path)
+    run = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_commit(),
+           "host": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count()}
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    regressions = []
+    for scale in [float(s) for s in args.scales.split(",")]:
+        work = Path(args.work_dir) / f"scale_{scale:g}x{args.year_scale}"
+        data = work / "data"
+        results = []
+        if not any(data.glob("*.csv")):
+            t0 = time.perf_counter()
+            paths = write_synthetic_ipps(data, scale, year_scale=args.year_scale, seed=args.seed)
+            results.append({"stage": "generate", "wall_s": time.perf_counter() - t0,
+                            "mb": sum(q.stat().st_size for q in paths) / 1024 ** 2})
+        for stage in stages:
+            results.append(_child(stage, work.resolve(), args))
+        for r in results:
+            r = {**run, "scale": scale, "year_scale": args.year_scale, **r}
+            base = _baseline(history, scale, r["stage"], args.window) if "wall_s" in r else None
+            if base is not None:
+                r["vs_baseline"] = r["wall_s"] / base
+                if r["wall_s"] > base * (1 + args.tolerance):
+                    regressions.append(r)
+            history.append(r)
+            if "error" in r:
+                print(f"scale={scale:g} {r['stage']:<18} ERROR {r['error']}")
+                continue
+            tput = f"{r['rows_per_s']:>12,.0f} rows/s" if r.get("rows_per_s") else " " * 19
+            rss = f"{r['peak_rss_mb']:>8,.0f} MB" if "peak_rss_mb" in r else " " * 11
+            vs = f"  x{r['vs_baseline']:.2f} vs baseline" if "vs_baseline" in r else ""
+            print(f"scale={scale:g} {r['stage']:<18} {r['wall_s']:9.3f}s {tput} {rss}{vs}")
+    _save_history(hist_path, history)
+    for r in regressions:
+        print(f"REGRESSION scale={r['scale']:g} {r['stage']}: {r['wall_s']:.3f}s is x{r['vs_baseline']:.2f} the baseline")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
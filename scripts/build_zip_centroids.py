@@ -0,0 +1,25 @@
+import sys
+import argparse
+import gzip
+from pathlib import Path as _P
+sys.path.append(str(_P(__file__).resolve().parents[1]))
+from sharp.spatial import CENTROIDS_PATH
+
+def main():
+    p = argparse.ArgumentParser(description="Regenerate the ZIP centroid table shipped in sharp/ (needs `pip install zipcodes`)")
+    p.add_argument("--out", default=str(CENTROIDS_PATH))
+    args = p.parse_args()
+    import zipcodes
+    rows = {}
+    for z in zipcodes.list_all():
+        if z.get("lat") and z.get("long") and z.get("country", "US") == "US":
+            rows[int(z["zip_code"])] = (float(z["lat"]), float(z["long"]), z["state"])
+    with gzip.open(args.out, "wt", newline="") as f:
+        f.write("zip,lat,lon,state\n")
+        for k in sorted(rows):
+            lat, lon, st = rows[k]
+            f.write(f"{k},{lat:.4f},{lon:.4f},{st}\n")
+    print(f"wrote {len(rows)} ZIP centroids to {args.out}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
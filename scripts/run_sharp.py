@@ -1,120 +1,331 @@
 from pathlib import Path
+import argparse
+import json
 import sys
 from pathlib import Path as _P
 sys.path.append(str(_P(__file__).resolve().parents[1]))
-from sharp.data import load_ipps_data
-from sharp.features import build_features
+import numpy as np
+import joblib
+from sharp import data as _data
+from sharp.data import load_ipps_data, ipps_files
+from sharp.backend import BACKENDS
+from sharp.features import build_features, write_features
 from sharp.cluster import build_zip_metrics, readmit_concentration
 from sharp.temporal import build_temporal, yoy_readmit_growth
 from sharp.system_perf import build_system_perf
-from sharp.model import build_provider_year, add_next_year_target, train_models, save_model
-from sharp.savings import tam_and_top_hospitals
-from sharp.causal import label_medicaid_expansion, did_effect, estimate_dml_tlearner
+from sharp.model import (build_provider_year, update_provider_year, add_next_year_target, train_models,
+                         save_model, load_model)
+from sharp.savings import tam_and_top_hospitals, readmit_ratio, build_savings_engine
+from sharp.causal import estimate_effects, write_effects
+from sharp.did import did_cells, did_2x2, event_study
 from sharp.bootstrap import bootstrap_tam, bootstrap_readmit_ratio, bootstrap_did
+from sharp.spatial import moran_by_year
+from sharp.network import weighted_degree, provider_graph, graph_centrality
+from sharp.survival import survival_frame, km_strata, median_survival, cox_model
+from sharp.cube import build_cube, write_cube
+from sharp.providers import write_provider_index, PROVIDER_INDEX_DIR
+from sharp.store import write_feature_store, STORE_DIR
+from sharp.pipeline import stage, run_pipeline, fingerprint_files, CACHE_DIR
+from sharp.versioning import POINTER, current_dir
+from sharp import profiling
 
-def main():
-    d = load_ipps_data()
-    d = build_features(d)
-    try:
-        import duckdb as _duck
-        _duck.register("cms", d)
-        z_duck = _duck.sql(
-            """
-            select Provider_Zip_Code, year,
-                   avg(payment_ratio) as payment_ratio,
-                   sum(Total_Discharges) as Total_Discharges,
-                   avg(Average_Total_Payments) as Average_Total_Payments,
-                   avg(financial_stress_index) as financial_stress_index
-            from cms
-            group by 1,2
-            """
-        ).to_df()
-        r_duck = _duck.sql(
-            """
-            select Provider_Zip_Code,
-                   sum(Total_Discharges) as readmit_discharges
-            from cms
-            where is_readmit_prone
-            group by 1
-            """
-        ).to_df()
-        t_duck = _duck.sql(
-            """
-            select year, Provider_State, is_readmit_prone,
-                   sum(Total_Discharges) as Total_Discharges,
-                   avg(payment_ratio) as payment_ratio,
-                   avg(Average_Total_Payments) as Average_Total_Payments
-            from cms
-            group by 1,2,3
-            """
-        ).to_df()
-        a_duck = _duck.sql(
-            """
-            select Provider_Id, Provider_Name, Provider_State, year,
-                   avg(payment_ratio) as payment_ratio,
-                   avg(medicare_coverage_ratio) as medicare_coverage_ratio,
-                   avg(financial_stress_index) as financial_stress_index,
-                   avg(avg_charges_log) as avg_charges_log,
-                   avg(state_avg_payment_ratio) as state_avg_payment_ratio,
-                   max(hospital_size_category) as hospital_size_category,
-                   max(drg_diversity_index) as drg_diversity_index,
-                   sum(Total_Discharges) as readmit_discharges
-            from cms
-            group by 1,2,3,4
-            """
-        ).to_df()
-    except Exception:
-        z_duck = None
-        r_duck = None
-        t_duck = None
-        a_duck = None
-    z = build_zip_metrics(d)
-    r = readmit_concentration(d)
-    t = build_temporal(d)
-    g = yoy_readmit_growth(d)
-    s = build_system_perf(d)
-    a = a_duck if a_duck is not None else build_provider_year(d)
-    a = add_next_year_target(a)
-    m = train_models(a)
-    save_model(m, "models")
-    d2 = label_medicaid_expansion(d)
-    did = did_effect(d2)
-    out = Path("outputs")
-    out.mkdir(exist_ok=True)
-    z.to_csv(out/"zip_metrics.csv", index=False)
-    r.to_csv(out/"readmit_concentration.csv", index=False)
-    t.to_csv(out/"temporal.csv", index=False)
-    if z_duck is not None:
-        z_duck.to_csv(out/"zip_metrics_duck.csv", index=False)
-    if r_duck is not None:
-        r_duck.to_csv(out/"readmit_concentration_duck.csv", index=False)
-    if t_duck is not None:
-        t_duck.to_csv(out/"temporal_duck.csv", index=False)
-    g.to_csv(out/"yoy_growth.csv", index=False)
-    s.to_csv(out/"system_performance.csv", index=False)
-    a.to_csv(out/"provider_year.csv", index=False)
-    m["pred_test"].to_csv(out/"predictions_2016.csv", index=False)
-    did.to_csv(out/"did_payment_ratio.csv", index=False)
-    est = estimate_dml_tlearner(d2)
-    if est is not None:
-        import numpy as np
-        np.savetxt(out/"dml_te.csv", est["dml_te"], delimiter=",")
-        np.savetxt(out/"tlearner_te.csv", est["tlearner_te"], delimiter=",")
-    bt = bootstrap_tam(d)
-    br = bootstrap_readmit_ratio(d)
-    bd = bootstrap_did(d2)
-    bt.to_csv(out/"tam_bootstrap.csv", index=False)
-    br.to_csv(out/"readmit_ratio_bootstrap.csv", index=False)
-    bd.to_csv(out/"did_bootstrap.csv", index=False)
-    tam, top100 = tam_and_top_hospitals(d)
-    (out/"tam.txt").write_text(f"{tam}")
-    top100.to_csv(out/"top100_hospitals.csv", index=False)
-    low = d[d["payment_ratio"] < 0.3]
-    high = d[d["payment_ratio"] >= 0.3]
-    x1 = low[low["is_readmit_prone"]]["Total_Discharges"].sum()
-    x2 = high[high["is_readmit_prone"]]["Total_Discharges"].sum()
-    ratio = x1 / (x2 + 1e-6)
-    (out/"readmit_ratio.txt").write_text(f"{ratio}")
+def _features(inputs):
+    return build_features(load_ipps_data(), copy=False)
+
+def _source(inputs, backend, features_dir, chunksize):
+    if backend == "duckdb" and features_dir:
+        return str(write_features(features_dir, chunksize=chunksize))
+    return None
+
+def _src(inputs):
+    return inputs["source"] if inputs.get("source") is not None else inputs["features"]
+
+def _zip_metrics(inputs, backend):
+    src = _src(inputs)
+    return {"zip": build_zip_metrics(src, backend=backend), "readmit": readmit_concentration(src, backend=backend)}
+
+def _save_zip_metrics(res, out):
+    res["zip"].to_csv(out/"zip_metrics.csv", index=False)
+    res["readmit"].to_csv(out/"readmit_concentration.csv", index=False)
+
+def _temporal(inputs, backend):
+    src = _src(inputs)
+    return {"temporal": build_temporal(src, backend=backend), "yoy": yoy_readmit_growth(src, backend=backend)}
+
+def _save_temporal(res, out):
+    res["temporal"].to_csv(out/"temporal.csv", index=False)
+    res["yoy"].to_csv(out/"yoy_growth.csv", index=False)
+
+def _system_perf(inputs, backend):
+    return build_system_perf(_src(inputs), backend=backend)
+
+def _save_system_perf(res, out):
+    res.to_csv(out/"system_performance.csv", index=False)
+
+def _provider_year(inputs, backend):
+    panel = build_provider_year(_src(inputs), backend=backend)
+    return {"panel": panel, "train": add_next_year_target(panel)}
+
+def _provider_year_incremental(inputs, backend):
+    panel, rebuilt = update_provider_year(backend=backend)
+    print(f"[provider_year] rebuilt years {rebuilt or 'none'}")
+    return {"panel": panel, "train": add_next_year_target(panel)}
+
+def _save_provider_year(res, out):
+    res["train"].to_csv(out/"provider_year.csv", index=False)
+
+def _train(inputs, model_dir, n_estimators, n_jobs, warm_start, add_trees):
+    prev = load_model(model_dir) if warm_start else None
+    m = train_models(inputs["provider_year"]["train"], n_estimators=n_estimators, n_jobs=n_jobs,
+                     warm_start=prev, add_trees=add_trees)
+    save_model(m, model_dir)
+    m["model_dir"] = model_dir
+    rss = "n/a" if m["peak_rss_mb"] is None else f"{m['peak_rss_mb']:.0f}"
+    print(f"[train] {m['n_trees']} trees (+{m['trees_added']}) train={m['split']['train']} "
+          f"val={m['split']['val']} test={m['split']['test']} in {m['train_seconds']:.2f}s, "
+          f"fit peak RSS +{rss} MB; mae_val={m['mae_val']:.3f} mae_test={m['mae_test']:.3f} "
+          f"auc_test={m['auc_test']:.3f}")
+    return m
+
+def _feature_store(inputs, store_dir):
+    return str(write_feature_store(inputs["provider_year"]["panel"], inputs["train"]["features"], store_dir))
+
+def _save_train(res, out):
+    d = current_dir(res["model_dir"])
+    if d is None or not (d/"rf.pkl").exists():
+        save_model(res, res["model_dir"])
+    res["pred_test"].to_csv(out/"predictions_2016.csv", index=False)
+    (out/"model_eval.json").write_text(json.dumps(res["evaluation"], default=float))
+
+def _did(inputs, bootstrap, n_boot):
+    cells = did_cells(inputs["features"])
+    return {
+        "did": did_2x2(cells),
+        "event_study": event_study(cells, bootstrap=bootstrap, n_boot=n_boot),
+    }
+
+def _save_did(res, out):
+    res["did"].to_csv(out/"did_payment_ratio.csv", index=False)
+    res["event_study"].to_csv(out/"did_event_study.csv", index=False)
+
+def _causal_ml(inputs, level, sample, folds, jobs, threads, cluster):
+    d = inputs["provider_year"]["panel"] if level == "panel" else inputs["features"]
+    cluster = {"state": "Provider_State", "provider": "Provider_Id", "none": None}[cluster]
+    return estimate_effects(d, sample_size=sample, n_folds=folds, n_jobs=jobs, threads_per_job=threads,
+                            cluster=cluster)
+
+def _save_causal_ml(res, out):
+    write_effects(res["effects"], out/"causal_effects.parquet")
+    res["coef"].to_csv(out/"causal_dml_coef.csv", index=False)
+    keys = ["n", "ate_dml", "ate_dml_se", "ate_tlearner", "se_cluster", "n_clusters", "timings"]
+    (out/"causal_ml.json").write_text(json.dumps({k: res[k] for k in keys}, indent=2))
+
+def _bootstrap(inputs, n_boot, n_workers, tol):
+    d = inputs["features"]
+    return {
+        "tam": bootstrap_tam(d, n_boot=n_boot, n_workers=n_workers, tol=tol),
+        "readmit_ratio": bootstrap_readmit_ratio(d, n_boot=n_boot, n_workers=n_workers, tol=tol),
+        "did": bootstrap_did(d, n_boot=n_boot, n_workers=n_workers, tol=tol),
+    }
+
+def _save_bootstrap(res, out):
+    res["tam"].to_csv(out/"tam_bootstrap.csv", index=False)
+    res["readmit_ratio"].to_csv(out/"readmit_ratio_bootstrap.csv", index=False)
+    res["did"].to_csv(out/"did_bootstrap.csv", index=False)
+
+def _savings(inputs, backend):
+    src = _src(inputs)
+    tam, top100 = tam_and_top_hospitals(src, backend=backend)
+    return {"tam": tam, "top100": top100, "readmit_ratio": readmit_ratio(src, backend=backend)}
+
+def _savings_engine(inputs):
+    return build_savings_engine(inputs["features"])
+
+def _save_savings_engine(res, out):
+    tmp = out/"savings_engine.joblib.tmp"
+    joblib.dump(res, tmp)
+    tmp.replace(out/"savings_engine.joblib")
+
+def _save_savings(res, out):
+    (out/"tam.txt").write_text(f"{res['tam']}")
+    res["top100"].to_csv(out/"top100_hospitals.csv", index=False)
+    (out/"readmit_ratio.txt").write_text(f"{res['readmit_ratio']}")
+
+def _spatial(inputs):
+    glob, local = moran_by_year(inputs["features"])
+    return {"global": glob, "local": local}
+
+def _save_spatial(res, out):
+    res["global"].to_csv(out/"moran_global.csv", index=False)
+    res["local"].to_csv(out/"moran_local.csv", index=False)
+
+def _network(inputs, min_weight):
+    df = inputs["features"]
+    cent = graph_centrality(*provider_graph(df, min_weight=min_weight))
+    deg = weighted_degree(df).rename(columns={"degree": "zip_degree"})
+    return cent.merge(deg, on="Provider_Id", how="left").fillna({"zip_degree": 0.0})
+
+def _save_network(res, out):
+    res.to_csv(out/"provider_network.csv", index=False)
+
+def _survival(inputs, backend):
+    frame = survival_frame(_src(inputs), inputs["provider_year"]["panel"], backend=backend)
+    km = km_strata(frame)
+    return {"frame": frame, "km": km, "medians": median_survival(km), "cox": cox_model(frame)["summary"]}
+
+def _save_survival(res, out):
+    res["frame"].to_csv(out/"survival.csv", index=False)
+    res["km"].to_csv(out/"km_curves.csv", index=False)
+    res["medians"].to_csv(out/"km_medians.csv", index=False)
+    res["cox"].to_csv(out/"cox_summary.csv", index=False)
+
+def _cube(inputs):
+    return build_cube(inputs["features"])
+
+def _save_cube(res, out):
+    write_cube(res, out/"cube.parquet")
+
+def _provider_index(inputs, index_dir):
+    return str(write_provider_index(inputs["features"], index_dir))
+
+def build_stages(args) -> dict:
+    be = {"backend": args.backend}
+    src = ["source"] if args.backend == "duckdb" and args.features_dir else ["features", "source"]
+    stages = [
+        stage("features", _features, modules=["sharp.data", "sharp.features"], fmt="parquet"),
+        stage("source", _source, [], {**be, "features_dir": args.features_dir, "chunksize": args.chunksize},
+              modules=["sharp.features"]),
+        stage("zip_metrics", _zip_metrics, src, be, ["zip_metrics.csv", "readmit_concentration.csv"],
+              _save_zip_metrics, ["sharp.cluster"]),
+        stage("temporal", _temporal, src, be, ["temporal.csv", "yoy_growth.csv"],
+              _save_temporal, ["sharp.temporal"]),
+        stage("system_perf", _system_perf, src, be, ["system_performance.csv"],
+              _save_system_perf, ["sharp.system_perf"]),
+        stage("provider_year", _provider_year_incremental, [], be, ["provider_year.csv"],
+              _save_provider_year, ["sharp.data", "sharp.features", "sharp.model"])
+        if args.incremental else
+        stage("provider_year", _provider_year, src, be, ["provider_year.csv"],
+              _save_provider_year, ["sharp.model"]),
+        stage("train", _train, ["provider_year"], {
+            "model_dir": args.model_dir,
+            "n_estimators": args.n_estimators,
+            "n_jobs": args.n_jobs,
+            "warm_start": args.warm_start,
+            "add_trees": args.add_trees,
+        }, ["predictions_2016.csv", "model_eval.json", str(Path(args.model_dir)/POINTER)], _save_train,
+              ["sharp.model"]),
+        stage("feature_store", _feature_store, ["provider_year", "train"], {"store_dir": args.store_dir},
+              modules=["sharp.store"]),
+        stage("did", _did, ["features"], {"bootstrap": args.did_bootstrap, "n_boot": args.n_boot},
+              ["did_payment_ratio.csv", "did_event_study.csv"], _save_did, ["sharp.did", "sharp.causal"]),
+        stage("causal_ml", _causal_ml, ["provider_year", "features"], {
+            "level": args.causal_level,
+            "sample": args.causal_sample,
+            "folds": args.causal_folds,
+            "jobs": args.causal_jobs,
+            "threads": args.causal_threads,
+            "cluster": args.causal_cluster,
+        }, ["causal_effects.parquet", "causal_dml_coef.csv", "causal_ml.json"], _save_causal_ml, ["sharp.causal"]),
+        stage("bootstrap", _bootstrap, ["features"], {"n_boot": args.n_boot, "n_workers": args.bootstrap_workers,
+                                                  "tol": args.bootstrap_tol},
+              ["tam_bootstrap.csv", "readmit_ratio_bootstrap.csv", "did_bootstrap.csv"],
+              _save_bootstrap, ["sharp.bootstrap"]),
+        stage("provider_index", _provider_index, ["features"], {"index_dir": args.index_dir},
+              modules=["sharp.providers"]),
+        stage("spatial", _spatial, ["features"], {}, ["moran_global.csv", "moran_local.csv"], _save_spatial,
+              ["sharp.spatial"]),
+        stage("network", _network, ["features"], {"min_weight": args.network_min_weight},
+              ["provider_network.csv"], _save_network, ["sharp.network"]),
+        stage("survival", _survival, src + ["provider_year"], be,
+              ["survival.csv", "km_curves.csv", "km_medians.csv", "cox_summary.csv"], _save_survival,
+              ["sharp.advanced", "sharp.survival"]),
+        stage("cube", _cube, ["features"], {}, ["cube.parquet"], _save_cube, ["sharp.cube"]),
+        stage("savings_engine", _savings_engine, ["features"], {}, ["savings_engine.joblib"],
+              _save_savings_engine, ["sharp.savings"]),
+        stage("savings", _savings, src, be,
+              ["tam.txt", "top100_hospitals.csv", "readmit_ratio.txt"], _save_savings, ["sharp.savings"]),
+    ]
+    return {s["name"]: s for s in stages}
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Run the SHARP pipeline and write outputs/")
+    p.add_argument("--backend", choices=BACKENDS, default="pandas",
+                   help="execution backend for the aggregation stages")
+    p.add_argument("--features-dir", default=None,
+                   help="write per-year feature Parquet here and let the duckdb backend scan it")
+    p.add_argument("--chunksize", type=int, default=None,
+                   help="row chunk size when streaming features to --features-dir")
+    p.add_argument("--only", default=None,
+                   help="comma-separated stages to re-run (dependencies come from cache when possible)")
+    p.add_argument("--since", default=None,
+                   help="comma-separated stages to re-run together with everything downstream")
+    p.add_argument("--force", action="store_true", help="ignore the stage cache")
+    p.add_argument("--workers", type=int, default=4, help="stages to run concurrently")
+    p.add_argument("--n-boot", type=int, default=300)
+    p.add_argument("--bootstrap-workers", type=int, default=1,
+                   help="processes for the bootstrap stage; results do not depend on this")
+    p.add_argument("--bootstrap-tol", type=float, default=None,
+                   help="stop the bootstrap early once the 95%% CI width changes by less than this fraction")
+    p.add_argument("--did-bootstrap", choices=["wild", "cluster"], default="wild",
+                   help="state-clustered bootstrap for the event-study CIs")
+    p.add_argument("--network-min-weight", type=float, default=0.0,
+                   help="drop ZIP3 graph edges whose min(discharges) is below this")
+    p.add_argument("--incremental", action="store_true",
+                   help="build the provider-year panel per year file, rebuilding only new or changed years")
+    p.add_argument("--n-estimators", type=int, default=300)
+    p.add_argument("--n-jobs", type=int, default=-1, help="cores for random forest training")
+    p.add_argument("--warm-start", action="store_true",
+                   help="add --add-trees trees to the model in --model-dir instead of refitting")
+    p.add_argument("--add-trees", type=int, default=100)
+    p.add_argument("--causal-level", choices=["panel", "rows"], default="panel",
+                   help="estimate DML/T-learner effects on the provider-year panel or on feature rows")
+    p.add_argument("--causal-sample", type=int, default=None,
+                   help="stratified (state, year, treated) subsample size for the causal estimators")
+    p.add_argument("--causal-folds", type=int, default=5, help="cross-fitting folds, grouped by provider")
+    p.add_argument("--causal-jobs", type=int, default=-1, help="folds fitted in parallel")
+    p.add_argument("--causal-threads", type=int, default=1, help="BLAS/OpenMP threads per fold")
+    p.add_argument("--causal-cluster", choices=["state", "provider", "none"], default="state",
+                   help="cluster for the DML sandwich standard errors (treatment is assigned by state)")
+    p.add_argument("--cache-dir", default=str(CACHE_DIR))
+    p.add_argument("--model-dir", default="models")
+    p.add_argument("--store-dir", default=str(STORE_DIR))
+    p.add_argument("--index-dir", default=str(PROVIDER_INDEX_DIR))
+    p.add_argument("--out-dir", default="outputs")
+    p.add_argument("--profile", action="store_true",
+                   help="time every public sharp function and write profile_report.json/.txt to --out-dir")
+    p.add_argument("--profile-stage", default=None,
+                   help="re-run this stage under the sampling profiler and write <stage>.folded to --out-dir")
+    p.add_argument("--profile-interval", type=float, default=5.0, help="sampling interval in ms")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = _parse_args(argv)
+    stages = build_stages(args)
+    split = lambda v: [x.strip() for x in v.split(",") if x.strip()] if v else None
+    only = split(args.only)
+    if args.profile_stage:
+        s = stages[args.profile_stage]
+        s["fn"] = profiling.sampled(s["fn"], Path(args.out_dir)/f"{args.profile_stage}.folded", args.profile_interval)
+        only = sorted(set(only or ()) | {args.profile_stage})
+    if args.profile:
+        profiling.enable()
+        profiling.instrument()
+    fingerprint = fingerprint_files(ipps_files()) + f":{_data.CACHE_VERSION}"
+    res = run_pipeline(
+        stages,
+        fingerprint,
+        only=only,
+        since=split(args.since),
+        force=args.force,
+        max_workers=args.workers,
+        cache_dir=Path(args.cache_dir),
+        out_dir=Path(args.out_dir),
+    )
+    if args.profile:
+        js, txt = profiling.write_report(args.out_dir, meta={"argv": sys.argv[1:], "ran": res["ran"],
+                                                             "timings": res["timings"]})
+        print(f"[profile] {js} {txt}")
+    return res
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,6 @@
 __all__ = [
     "load_ipps_data",
     "build_features",
+    "iter_ipps_data",
+    "iter_features",
 ]
\ No newline at end of file
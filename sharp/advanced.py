@@ -1,44 +1,91 @@
 import numpy as np
 import pandas as pd
+from sharp.backend import check_backend, query
+from sharp.network import weighted_degree
+from sharp.spatial import build_weights
 
-def spatial_autocorrelation(df: pd.DataFrame) -> pd.DataFrame:
-    c = df.groupby(["Provider_Zip_Code", "year"]).agg(payment_ratio=("payment_ratio","mean")).reset_index()
-    c["zip_int"] = c["Provider_Zip_Code"].astype(str).str.slice(0,3).astype(int)
-    c = c.sort_values(["year","zip_int"]) 
-    c["lag_ratio"] = c.groupby("year")["payment_ratio"].shift(1)
+SPATIAL_SQL = """
+select Provider_Zip_Code, year, avg(payment_ratio) as payment_ratio
+from {cms}
+group by 1, 2
+order by year, Provider_Zip_Code
+"""
+
+ANOMALY_SQL = """
+select Provider_Id, avg(payment_ratio) as mean_ratio, stddev_samp(payment_ratio) as std_ratio
+from {cms}
+group by 1
+order by 1
+"""
+
+SURVIVAL_SQL = """
+select Provider_Id, year, sum(Total_Discharges) as vol
+from {cms}
+where is_readmit_prone
+group by 1, 2
+order by 1, 2
+"""
+
+def spatial_autocorrelation(df: pd.DataFrame, backend: str = "pandas", method: str = "knn", k: int = 8) -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        c = query(SPATIAL_SQL, df)
+    else:
+        c = df.groupby(["year", "Provider_Zip_Code"]).agg(payment_ratio=("payment_ratio","mean")).reset_index()
+        c = c[["Provider_Zip_Code", "year", "payment_ratio"]]
+    lag = np.full(len(c), np.nan)
+    for _, idx in c.groupby("year").indices.items():
+        g = c.iloc[idx]
+        w = build_weights(g["Provider_Zip_Code"].to_numpy(), method, k)
+        pos = np.searchsorted(w["zips"], g["Provider_Zip_Code"].to_numpy())
+        x = g["payment_ratio"].to_numpy(np.float64)
+        ok = ~np.isnan(x)
+        Wg = w["W"][pos][:, pos]
+        num, den = Wg @ np.where(ok, x, 0.0), Wg @ ok.astype(np.float64)
+        lag[idx] = np.divide(num, den, out=np.full(len(x), np.nan), where=den > 0)
+    c["lag_ratio"] = lag
     c["diff"] = (c["payment_ratio"] - c["lag_ratio"]).abs()
     return c
 
-def anomaly_hospitals(df: pd.DataFrame) -> pd.DataFrame:
-    g = df.groupby(["Provider_Id"]).agg(
-        mean_ratio=("payment_ratio","mean"),
-        std_ratio=("payment_ratio","std"),
-    ).reset_index()
+def anomaly_hospitals(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        g = query(ANOMALY_SQL, df)
+    else:
+        g = df.groupby(["Provider_Id"]).agg(
+            mean_ratio=("payment_ratio","mean"),
+            std_ratio=("payment_ratio","std"),
+        ).reset_index()
     g["z"] = (g["mean_ratio"] - g["mean_ratio"].mean()) / (g["mean_ratio"].std() + 1e-6)
     return g.sort_values("z")
 
-def network_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    e = df.groupby(["Provider_Zip_Code", "Provider_Id"]).agg(
-        vol=("Total_Discharges","sum")
-    ).reset_index()
-    z = e.merge(e, on="Provider_Zip_Code", suffixes=("_u","_v"))
-    z = z[z["Provider_Id_u"] != z["Provider_Id_v"]]
-    z["weight"] = z[["vol_u","vol_v"]].min(axis=1)
-    deg = z.groupby("Provider_Id_u")["weight"].sum().rename("degree")
-    return deg.reset_index().rename(columns={"Provider_Id_u":"Provider_Id"})
+def network_metrics(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    return weighted_degree(df, backend=backend)
 
-def survival_dataset(df: pd.DataFrame) -> pd.DataFrame:
-    g = df[df["is_readmit_prone"]].groupby(["Provider_Id", "year"]).agg(
-        vol=("Total_Discharges","sum")
-    ).reset_index()
-    g = g.sort_values(["Provider_Id","year"])
-    g["prev"] = g.groupby("Provider_Id")["vol"].shift(1)
-    g["growth"] = (g["vol"] - g["prev"]) / (g["prev"] + 1e-6)
-    th = g["growth"].quantile(0.80)
-    first = g[g["growth"] >= th].groupby("Provider_Id")["year"].min().rename("event_year")
-    base = g.groupby("Provider_Id")["year"].min().rename("start_year")
-    last = g.groupby("Provider_Id")["year"].max().rename("last_year")
-    s = pd.concat([first, base, last], axis=1).reset_index()
-    s["duration"] = (s["event_year"].fillna(s["last_year"]) - s["start_year"]) 
+def survival_dataset(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        g = query(SURVIVAL_SQL, df)
+    else:
+        g = df[df["is_readmit_prone"]].groupby(["Provider_Id", "year"]).agg(
+            vol=("Total_Discharges","sum")
+        ).reset_index()
+    g = g.sort_values(["Provider_Id", "year"])
+    ids = g["Provider_Id"].to_numpy()
+    year = g["year"].to_numpy()
+    vol = g["vol"].to_numpy(np.float64)
+    first = np.r_[True, ids[1:] != ids[:-1]]
+    prev = np.r_[np.nan, vol[:-1]]
+    prev[first] = np.nan
+    growth = (vol - prev) / (prev + 1e-6)
+    th = np.nanquantile(growth, 0.80) if (~np.isnan(growth)).any() else np.nan
+    starts = np.flatnonzero(first)
+    ends = np.r_[starts[1:], len(ids)] - 1
+    hit = np.where(growth >= th, year, np.inf)
+    ev = np.minimum.reduceat(hit, starts) if len(starts) else np.empty(0)
+    s = pd.DataFrame({
+        "Provider_Id": ids[starts],
+        "event_year": np.where(np.isinf(ev), np.nan, ev),
+        "start_year": year[starts],
+        "last_year": year[ends],
+    })
+    s["duration"] = s["event_year"].fillna(s["last_year"]) - s["start_year"]
     s["event"] = (~s["event_year"].isna()).astype(int)
     return s
\ No newline at end of file
@@ -0,0 +1,48 @@
+from pathlib import Path
+import threading
+import pandas as pd
+
+BACKENDS = ("pandas", "duckdb")
+
+_CON = None
+_LOCK = threading.Lock()
+
+def check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+    return backend
+
+def duck_connect(threads: int | None = None, memory_limit: str | None = None):
+    global _CON
+    import duckdb
+    with _LOCK:
+        if _CON is None:
+            _CON = duckdb.connect()
+        if threads:
+            _CON.execute(f"set threads to {int(threads)}")
+        if memory_limit:
+            _CON.execute(f"set memory_limit = '{memory_limit}'")
+    return _CON
+
+def _scan(src) -> str:
+    p = Path(src)
+    if p.is_dir():
+        files = sorted(p.glob("*.parquet"))
+        if files:
+            return f"read_parquet('{(p / '*.parquet').as_posix()}', union_by_name = true)"
+        return f"read_csv_auto('{(p / '*.csv').as_posix()}', union_by_name = true)"
+    if p.suffix == ".csv":
+        return f"read_csv_auto('{p.as_posix()}')"
+    return f"read_parquet('{p.as_posix()}')"
+
+def query(sql: str, src) -> pd.DataFrame:
+    cur = duck_connect().cursor()
+    try:
+        if isinstance(src, pd.DataFrame):
+            cur.register("cms_df", src)
+            rel = "cms_df"
+        else:
+            rel = _scan(src)
+        return cur.sql(sql.format(cms=rel)).df()
+    finally:
+        cur.close()
\ No newline at end of file
@@ -0,0 +1,140 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import hashlib
+import itertools
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import roc_auc_score, mean_absolute_error
+from sharp.model import model_frame, growth_score
+
+FOLD_CACHE_DIR = Path(".sharp_cache") / "backtest"
+ARRAYS = ["X", "y", "readmit", "high_risk", "year"]
+DEFAULT_GRID = {
+    "n_estimators": [100, 300],
+    "max_depth": [None, 12],
+    "min_samples_leaf": [1, 5],
+    "max_features": [1.0, 0.5],
+}
+_SHARED = {}
+
+def param_grid(grid: dict) -> list:
+    keys = list(grid)
+    return [dict(zip(keys, v)) for v in itertools.product(*(grid[k] for k in keys))]
+
+def sample_params(space: dict, n_iter: int, random_state: int = 42) -> list:
+    rng = np.random.default_rng(random_state)
+    keys = list(space)
+    seen, out = set(), []
+    for _ in range(n_iter * 20):
+        cfg = {k: space[k][rng.integers(len(space[k]))] for k in keys}
+        tag = json.dumps(cfg, sort_keys=True, default=str)
+        if tag not in seen:
+            seen.add(tag)
+            out.append(cfg)
+        if len(out) == n_iter:
+            break
+    return out
+
+def backtest_folds(years, min_train_years: int = 1) -> list:
+    ys = sorted(set(int(y) for y in years))
+    return [{"train_max": ys[i - 1], "test": ys[i]} for i in range(max(min_train_years, 1), len(ys))]
+
+def _panel_key(agg: pd.DataFrame) -> str:
+    h = hashlib.sha256(pd.util.hash_pandas_object(agg, index=False).to_numpy().tobytes())
+    h.update(",".join(agg.columns).encode())
+    return h.hexdigest()[:16]
+
+def cache_fold_data(agg: pd.DataFrame, cache_dir=FOLD_CACHE_DIR) -> Path:
+    p = Path(cache_dir) / _panel_key(agg)
+    if (p / "meta.json").exists():
+        return p
+    d, cols = model_frame(agg)
+    arrays = {
+        "X": d[cols].to_numpy(np.float64),
+        "y": d["next_readmit_discharges"].to_numpy(np.float64),
+        "readmit": d["readmit_discharges"].to_numpy(np.float64),
+        "high_risk": d["high_risk"].to_numpy(np.int8),
+        "year": d["year"].to_numpy(np.int32),
+    }
+    tmp = p.with_suffix(".tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    for name, a in arrays.items():
+        np.save(tmp / f"{name}.npy", np.ascontiguousarray(a))
+    meta = {"features": cols, "threshold": float(d["target_growth"].quantile(0.80)), "n_rows": len(d)}
+    (tmp / "meta.json").write_text(json.dumps(meta))
+    try:
+        tmp.replace(p)
+    except OSError:
+        if not (p / "meta.json").exists():
+            raise
+    return p
+
+def _attach(path: str):
+    p = Path(path)
+    _SHARED.update({name: np.load(p / f"{name}.npy", mmap_mode="r") for name in ARRAYS})
+    _SHARED.update(json.loads((p / "meta.json").read_text()))
+
+def _run_job(cid: int, params: dict, fold: dict, random_state: int) -> dict:
+    X, y, year = _SHARED["X"], _SHARED["y"], _SHARED["year"]
+    tr = np.flatnonzero(year <= fold["train_max"])
+    te = np.flatnonzero(year == fold["test"])
+    rf = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    t0 = time.perf_counter()
+    rf.fit(X[tr], y[tr])
+    fit_s = time.perf_counter() - t0
+    Xt = np.ascontiguousarray(X[te])
+    t0 = time.perf_counter()
+    pred = rf.predict(Xt)
+    predict_s = time.perf_counter() - t0
+    hr = _SHARED["high_risk"][te]
+    score = growth_score(pred, _SHARED["readmit"][te], _SHARED["threshold"])
+    return {
+        "config_id": cid,
+        "test_year": fold["test"],
+        "n_train": len(tr),
+        "n_test": len(te),
+        "mae": mean_absolute_error(y[te], pred),
+        "auc": roc_auc_score(hr, score) if 0 < hr.sum() < len(hr) else np.nan,
+        "fit_s": fit_s,
+        "predict_s": predict_s,
+        "n_nodes": int(sum(e.tree_.node_count for e in rf.estimators_)),
+    }
+
+def run_backtest(agg: pd.DataFrame, configs: list, folds: list | None = None, n_workers: int | None = None,
+                 random_state: int = 42, cache_dir=FOLD_CACHE_DIR) -> pd.DataFrame:
+    folds = backtest_folds(agg["year"]) if folds is None else folds
+    if not folds:
+        raise ValueError("Need at least two years with a next-year target for a rolling backtest")
+    path = str(cache_fold_data(agg, cache_dir))
+    jobs = [(cid, cfg, f) for cid, cfg in enumerate(configs) for f in folds]
+    jobs.sort(key=lambda j: -j[1].get("n_estimators", 100))
+    args = [list(a) for a in zip(*jobs)] + [[random_state] * len(jobs)]
+    if n_workers == 1:
+        _attach(path)
+        rows = list(map(_run_job, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach, initargs=(path,)) as pool:
+            rows = list(pool.map(_run_job, *args))
+    return pd.DataFrame(rows).sort_values(["config_id", "test_year"], ignore_index=True)
+
+def leaderboard(results: pd.DataFrame, configs: list) -> pd.DataFrame:
+    r = results.assign(wall_s=results["fit_s"] + results["predict_s"])
+    board = r.groupby("config_id").agg(
+        n_folds=("test_year", "size"),
+        mae_mean=("mae", "mean"),
+        mae_std=("mae", "std"),
+        auc_mean=("auc", "mean"),
+        fit_s_mean=("fit_s", "mean"),
+        wall_s=("wall_s", "sum"),
+        predict_s=("predict_s", "sum"),
+        n_test=("n_test", "sum"),
+        n_nodes_mean=("n_nodes", "mean"),
+    )
+    board["predict_us_per_row"] = 1e6 * board.pop("predict_s") / board.pop("n_test")
+    params = pd.DataFrame(configs, dtype=object).rename_axis("config_id")
+    board = params.join(board, how="inner")
+    board["params"] = [json.dumps(configs[i], sort_keys=True, default=str) for i in board.index]
+    return board.reset_index().sort_values(["mae_mean", "wall_s"], ignore_index=True)
\ No newline at end of file
@@ -1,70 +1,212 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+import tempfile
 import numpy as np
 import pandas as pd
+from sharp.causal import EXPANSION_STATES
 
-def _tam(df: pd.DataFrame) -> float:
-    stressed = df[df["payment_ratio"] < 0.3].groupby("DRG_Code").agg(
-        Average_Total_Payments=("Average_Total_Payments","mean"),
-        Total_Discharges=("Total_Discharges","sum")
-    )
-    normal = df[df["payment_ratio"] > 0.5].groupby("DRG_Code").agg(
-        Average_Total_Payments=("Average_Total_Payments","mean"),
-        Total_Discharges=("Total_Discharges","sum")
-    )
-    inter = stressed.join(normal, lsuffix="_s", rsuffix="_n", how="inner")
-    s = (inter["Average_Total_Payments_s"] - inter["Average_Total_Payments_n"]) * inter["Total_Discharges_s"]
-    return float(s.sum())
+_SHARED = {}
 
-def bootstrap_tam(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42) -> pd.DataFrame:
-    rng = np.random.default_rng(random_state)
-    drgs = df["DRG_Code"].dropna().unique()
-    vals = []
-    for _ in range(n_boot):
-        sample_drgs = rng.choice(drgs, size=len(drgs), replace=True)
-        b = df[df["DRG_Code"].isin(sample_drgs)]
-        vals.append(_tam(b))
-    arr = np.array(vals)
-    return pd.DataFrame({
-        "mean": [arr.mean()],
-        "p2_5": [np.percentile(arr, 2.5)],
-        "p97_5": [np.percentile(arr, 97.5)],
-    })
+def _grouped_mean(codes: np.ndarray, x: np.ndarray, mask: np.ndarray, k: int) -> tuple:
+    n = np.bincount(codes[mask], minlength=k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(codes[mask], weights=x[mask], minlength=k) / n, n
 
-def bootstrap_readmit_ratio(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42) -> pd.DataFrame:
-    rng = np.random.default_rng(random_state)
-    providers = df["Provider_Id"].unique()
-    vals = []
-    for _ in range(n_boot):
-        samp = rng.choice(providers, size=len(providers), replace=True)
-        b = df[df["Provider_Id"].isin(samp)]
-        low = b[b["payment_ratio"] < 0.3]
-        high = b[b["payment_ratio"] >= 0.3]
-        x1 = low[low["is_readmit_prone"]]["Total_Discharges"].sum()
-        x2 = high[high["is_readmit_prone"]]["Total_Discharges"].sum()
-        vals.append(x1 / (x2 + 1e-6))
-    arr = np.array(vals)
-    return pd.DataFrame({
-        "mean": [arr.mean()],
-        "p2_5": [np.percentile(arr, 2.5)],
-        "p97_5": [np.percentile(arr, 97.5)],
-    })
+def _tam_stat(a: dict) -> float:
+    codes, ratio = a["DRG_Code"], a["payment_ratio"]
+    ok = codes >= 0
+    k = int(codes.max()) + 1 if len(codes) else 0
+    s_mask, n_mask = ok & (ratio < 0.3), ok & (ratio > 0.5)
+    atp_s, n_s = _grouped_mean(codes, a["Average_Total_Payments"], s_mask, k)
+    atp_n, n_n = _grouped_mean(codes, a["Average_Total_Payments"], n_mask, k)
+    td_s = np.bincount(codes[s_mask], weights=a["Total_Discharges"][s_mask], minlength=k)
+    both = (n_s > 0) & (n_n > 0)
+    return float(((atp_s - atp_n) * td_s)[both].sum())
+
+def _readmit_ratio_stat(a: dict) -> float:
+    td = a["Total_Discharges"] * a["is_readmit_prone"]
+    low = a["payment_ratio"] < 0.3
+    return float(td[low].sum() / (td[~low & (a["payment_ratio"] >= 0.3)].sum() + 1e-6))
 
-def bootstrap_did(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42) -> pd.DataFrame:
-    rng = np.random.default_rng(random_state)
-    states = df["Provider_State"].unique()
-    vals = []
-    for _ in range(n_boot):
-        samp = rng.choice(states, size=len(states), replace=True)
-        b = df[df["Provider_State"].isin(samp)]
-        treated = b["Provider_State"].isin(["CA","NY","IL","PA","OH","MI","NJ","WA","MA","MD"])
-        pre = b[b["year"] < 2014]
-        post = b[b["year"] >= 2014]
-        pre_g = pre.groupby(treated)["payment_ratio"].mean()
-        post_g = post.groupby(treated)["payment_ratio"].mean()
-        did = (post_g.get(True, np.nan) - pre_g.get(True, np.nan)) - (post_g.get(False, np.nan) - pre_g.get(False, np.nan))
-        vals.append(did)
-    arr = np.array(vals)
+def _did_stat(a: dict) -> float:
+    ratio, post, t = a["payment_ratio"], a["post"].astype(bool), a["treated"].astype(bool)
+    has = ~np.isnan(ratio)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        def mean(g, p):
+            m = has & g & p
+            return ratio[m].sum() / m.sum()
+        return float((mean(t, post) - mean(t, ~post)) - (mean(~t, post) - mean(~t, ~post)))
+
+def _summary(arr: np.ndarray) -> pd.DataFrame:
     return pd.DataFrame({
         "mean": [np.nanmean(arr)],
         "p2_5": [np.nanpercentile(arr, 2.5)],
         "p97_5": [np.nanpercentile(arr, 97.5)],
-    })
\ No newline at end of file
+        "n_boot": [len(arr)],
+    })
+
+def _cluster_sums(keys: pd.Series, cols: dict) -> tuple:
+    codes, uniq = pd.factorize(keys)
+    ok = codes >= 0
+    sums = {
+        name: np.bincount(codes[ok], weights=np.asarray(v, dtype=np.float64)[ok], minlength=len(uniq))
+        for name, v in cols.items()
+    }
+    return uniq, sums
+
+def tam_cluster_stats(df: pd.DataFrame) -> pd.Series:
+    drgs = df["DRG_Code"].dropna().unique()
+    stressed = df[df["payment_ratio"] < 0.3].groupby("DRG_Code").agg(
+        atp=("Average_Total_Payments", "mean"),
+        td=("Total_Discharges", "sum"),
+    )
+    normal = df[df["payment_ratio"] > 0.5].groupby("DRG_Code")["Average_Total_Payments"].mean()
+    v = (stressed["atp"] - normal) * stressed["td"]
+    return v.reindex(drgs).fillna(0.0)
+
+def _tam_from_weights(w: np.ndarray, v: np.ndarray) -> np.ndarray:
+    return w @ v
+
+def _ratio_from_weights(w: np.ndarray, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    return (w @ low) / (w @ high + 1e-6)
+
+def bootstrap_tam(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42, n_workers: int = 1,
+                  tol: float | None = None) -> pd.DataFrame:
+    v = tam_cluster_stats(df).to_numpy()
+    return weight_bootstrap(partial(_tam_from_weights, v=v), len(v), n_boot, random_state, n_workers, tol=tol)
+
+def bootstrap_readmit_ratio(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42,
+                            n_workers: int = 1, tol: float | None = None) -> pd.DataFrame:
+    ratio = df["payment_ratio"].to_numpy()
+    prone = df["is_readmit_prone"].to_numpy(bool)
+    td = df["Total_Discharges"].to_numpy(np.float64)
+    _, s = _cluster_sums(df["Provider_Id"], {
+        "low": np.where(prone & (ratio < 0.3), td, 0.0),
+        "high": np.where(prone & (ratio >= 0.3), td, 0.0),
+    })
+    stat = partial(_ratio_from_weights, low=s["low"], high=s["high"])
+    return weight_bootstrap(stat, len(s["low"]), n_boot, random_state, n_workers, tol=tol)
+
+def did_cluster_stats(df: pd.DataFrame, treated_states=EXPANSION_STATES, start_year: int = 2014) -> pd.DataFrame:
+    ratio = df["payment_ratio"].to_numpy(np.float64)
+    has = ~np.isnan(ratio)
+    post = df["year"].to_numpy() >= start_year
+    states, s = _cluster_sums(df["Provider_State"], {
+        "sum_pre": np.where(has & ~post, ratio, 0.0),
+        "n_pre": (has & ~post).astype(np.float64),
+        "sum_post": np.where(has & post, ratio, 0.0),
+        "n_post": (has & post).astype(np.float64),
+    })
+    out = pd.DataFrame(s, index=pd.Index(np.asarray(states), name="Provider_State"))
+    out["treated"] = out.index.isin(list(treated_states))
+    return out
+
+def _did_from_weights(w: np.ndarray, stats: pd.DataFrame) -> np.ndarray:
+    t = stats["treated"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        def mean(g, period):
+            return (w[:, g] @ stats[f"sum_{period}"].to_numpy()[g]) / (w[:, g] @ stats[f"n_{period}"].to_numpy()[g])
+        return (mean(t, "post") - mean(t, "pre")) - (mean(~t, "post") - mean(~t, "pre"))
+
+def bootstrap_did(df: pd.DataFrame, n_boot: int = 300, random_state: int = 42, n_workers: int = 1,
+                  tol: float | None = None) -> pd.DataFrame:
+    stats = did_cluster_stats(df)
+    return weight_bootstrap(partial(_did_from_weights, stats=stats), len(stats), n_boot, random_state, n_workers,
+                            tol=tol)
+
+def _column(v: pd.Series) -> np.ndarray:
+    if isinstance(v.dtype, pd.CategoricalDtype) or v.dtype == object:
+        return pd.factorize(v)[0].astype(np.int32)
+    if v.dtype == bool:
+        return v.to_numpy(np.uint8)
+    return v.to_numpy(np.float64 if v.dtype.kind == "f" else None)
+
+def _share_arrays(arrays: dict, path: Path):
+    import pyarrow as pa
+    tbl = pa.table({k: pa.array(v) for k, v in arrays.items()})
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, tbl.schema) as w:
+            w.write_table(tbl)
+
+def _attach(path: str, starts: np.ndarray, counts: np.ndarray, stat):
+    import pyarrow as pa
+    tbl = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    cols = {n: tbl.column(n).chunk(0).to_numpy(zero_copy_only=True) for n in tbl.column_names}
+    _SHARED.update(k=len(starts), cols=cols, starts=starts, counts=counts, stat=stat)
+
+def _attach_weights(k: int, stat):
+    _SHARED.update(k=k, stat=stat)
+
+def _resample_index(w: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    lengths = np.repeat(counts, w)
+    first = np.repeat(np.repeat(starts, w), lengths)
+    offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return first + offset
+
+def _run_shard(seed: np.random.SeedSequence, n: int) -> np.ndarray:
+    k, stat = _SHARED["k"], _SHARED["stat"]
+    rng = np.random.default_rng(seed)
+    p = np.full(k, 1.0 / k)
+    if "cols" not in _SHARED:
+        return np.asarray(stat(rng.multinomial(k, p, size=n).astype(np.float64)), dtype=np.float64)
+    cols, starts, counts = _SHARED["cols"], _SHARED["starts"], _SHARED["counts"]
+    out = np.empty(n)
+    for i in range(n):
+        w = rng.multinomial(k, p)
+        idx = _resample_index(w, starts, counts)
+        out[i] = stat({n: v[idx] for n, v in cols.items()})
+    return out
+
+def _ci_width(arr: np.ndarray) -> float:
+    return float(np.nanpercentile(arr, 97.5) - np.nanpercentile(arr, 2.5))
+
+def _run_shards(init, initargs: tuple, n_boot: int, random_state: int, n_workers: int | None,
+                shard_size: int, wave: int, tol: float | None) -> np.ndarray:
+    n_shards = -(-n_boot // shard_size)
+    seeds = np.random.SeedSequence(random_state).spawn(n_shards)
+    sizes = [min(shard_size, n_boot - i * shard_size) for i in range(n_shards)]
+    vals, prev = [], None
+    pool = ProcessPoolExecutor(max_workers=n_workers, initializer=init, initargs=initargs) if n_workers != 1 else None
+    try:
+        if pool is None:
+            init(*initargs)
+        for w0 in range(0, n_shards, wave):
+            batch = range(w0, min(w0 + wave, n_shards))
+            if pool is None:
+                vals.extend(_run_shard(seeds[i], sizes[i]) for i in batch)
+            else:
+                vals.extend(pool.map(_run_shard, [seeds[i] for i in batch], [sizes[i] for i in batch]))
+            width = _ci_width(np.concatenate(vals))
+            if tol is not None and prev is not None and abs(width - prev) <= tol * abs(prev):
+                break
+            prev = width
+    finally:
+        if pool is None:
+            _SHARED.clear()
+        else:
+            pool.shutdown()
+    return np.concatenate(vals)
+
+def weight_bootstrap(stat, k: int, n_boot: int = 300, random_state: int = 42, n_workers: int | None = 1,
+                     shard_size: int = 25, wave: int = 8, tol: float | None = None) -> pd.DataFrame:
+    arr = _run_shards(_attach_weights, (k, stat), n_boot, random_state, n_workers, shard_size, wave, tol)
+    return _summary(arr)
+
+def parallel_bootstrap(df: pd.DataFrame, stat, cluster: str, n_boot: int = 300, random_state: int = 42,
+                       n_workers: int | None = None, shard_size: int = 25, wave: int = 8,
+                       tol: float | None = None, columns: list | None = None) -> pd.DataFrame:
+    codes, _ = pd.factorize(df[cluster])
+    keep = codes >= 0
+    order = np.argsort(codes[keep], kind="stable")
+    rows = np.flatnonzero(keep)[order]
+    arrays = {c: _column(df[c])[rows] for c in (columns or df.columns)}
+    counts = np.bincount(codes[keep])
+    starts = np.cumsum(counts) - counts
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "frame.arrow"
+        _share_arrays(arrays, path)
+        del arrays
+        arr = _run_shards(_attach, (str(path), starts, counts, stat), n_boot, random_state, n_workers,
+                          shard_size, wave, tol)
+    return _summary(arr)
\ No newline at end of file
@@ -1,3 +1,7 @@
+from pathlib import Path
+import time
+import warnings
+import numpy as np
 import pandas as pd
 
 EXPANSION_STATES = [
@@ -10,24 +14,16 @@ def label_medicaid_expansion(df: pd.DataFrame) -> pd.DataFrame:
     return d
 
 def did_effect(df: pd.DataFrame) -> pd.DataFrame:
-    d = df.copy()
-    d["treated"] = d["Provider_State"].isin(EXPANSION_STATES)
-    pre = d[d["year"] < 2014]
-    post = d[d["year"] >= 2014]
-    pre_g = pre.groupby("treated")["payment_ratio"].mean().rename("pre")
-    post_g = post.groupby("treated")["payment_ratio"].mean().rename("post")
-    m = pd.concat([pre_g, post_g], axis=1).reset_index()
-    m["did"] = (m.loc[m["treated"]==True, "post"].values[0] - m.loc[m["treated"]==True, "pre"].values[0]) - (
-        m.loc[m["treated"]==False, "post"].values[0] - m.loc[m["treated"]==False, "pre"].values[0]
-    )
-    return m
+    from sharp.did import did_cells, did_2x2
+    return did_2x2(did_cells(df))
 
 def estimate_dml_tlearner(df: pd.DataFrame):
     try:
         from econml.dml import LinearDML
         from xgboost import XGBRegressor
         from causalml.inference.meta import TLearner
-    except Exception:
+    except ImportError as e:
+        warnings.warn(f"estimate_dml_tlearner skipped ({e}); estimate_effects needs only scikit-learn")
         return None
     d = df.copy()
     d["treated"] = d["Provider_State"].isin(EXPANSION_STATES) & (d["year"] >= 2014)
@@ -38,4 +34,133 @@ def estimate_dml_tlearner(df: pd.DataFrame):
     dm.fit(y, T, X=X)
     tl = TLearner()
     te = tl.fit_predict(X, T, y)
-    return {"dml_te": dm.effect(X), "tlearner_te": te}
\ No newline at end of file
+    return {"dml_te": dm.effect(X), "tlearner_te": te}
+
+CAUSAL_COVARIATES = ["year", "financial_stress_index", "state_avg_payment_ratio", "avg_charges_log"]
+CAUSAL_STRATA = ["Provider_State", "year", "treated"]
+
+def causal_frame(df: pd.DataFrame) -> pd.DataFrame:
+    cols = ["Provider_Id", "Provider_State", "payment_ratio"] + CAUSAL_COVARIATES
+    d = df[cols].dropna().reset_index(drop=True)
+    d["Provider_State"] = d["Provider_State"].astype(str)
+    d["treated"] = (d["Provider_State"].isin(EXPANSION_STATES) & (d["year"] >= 2014)).astype(np.int8)
+    return d
+
+def stratified_sample(df: pd.DataFrame, n: int, strata=CAUSAL_STRATA, random_state: int = 42) -> pd.DataFrame:
+    if n is None or n >= len(df):
+        return df
+    rng = np.random.default_rng(random_state)
+    codes = df.groupby(list(strata), sort=False, observed=True).ngroup().to_numpy()
+    counts = np.bincount(codes)
+    take = np.maximum(1, np.floor(counts * n / len(df)).astype(np.int64))
+    keys = rng.random(len(df))
+    order = np.lexsort((keys, codes))
+    rank = np.arange(len(df)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = np.sort(order[rank < take[codes[order]]])
+    return df.iloc[keep].reset_index(drop=True)
+
+def _fold_ids(groups: np.ndarray, n_folds: int, random_state: int) -> np.ndarray:
+    uniq, inv = np.unique(groups, return_inverse=True)
+    perm = np.random.default_rng(random_state).permutation(len(uniq))
+    return perm[inv] % n_folds
+
+def _nuisance(params: dict, classifier: bool = False):
+    from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+    return (HistGradientBoostingClassifier if classifier else HistGradientBoostingRegressor)(**params)
+
+def _fit_fold(X, y, T, train, test, params: dict, threads: int) -> dict:
+    from threadpoolctl import threadpool_limits
+    t0 = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        my = _nuisance(params).fit(X[train], y[train])
+        tr_t = T[train]
+        if tr_t.min() == tr_t.max():
+            p = np.full(len(test), float(tr_t[0]))
+        else:
+            p = _nuisance(params, classifier=True).fit(X[train], tr_t).predict_proba(X[test])[:, 1]
+        m1 = _nuisance(params).fit(X[train][tr_t == 1], y[train][tr_t == 1]) if tr_t.any() else None
+        m0 = _nuisance(params).fit(X[train][tr_t == 0], y[train][tr_t == 0]) if (tr_t == 0).any() else None
+        y_res = y[test] - my.predict(X[test])
+        mu1 = m1.predict(X[test]) if m1 is not None else np.full(len(test), np.nan)
+        mu0 = m0.predict(X[test]) if m0 is not None else np.full(len(test), np.nan)
+    return {"test": test, "y_res": y_res, "t_res": T[test] - p, "tlearner_te": mu1 - mu0,
+            "seconds": time.perf_counter() - t0}
+
+def _final_stage(Phi: np.ndarray, y_res: np.ndarray, t_res: np.ndarray, clusters=None) -> tuple:
+    from sharp.did import _cluster_cov
+    Z = Phi * t_res[:, None]
+    beta, *_ = np.linalg.lstsq(Z, y_res, rcond=None)
+    e = y_res - Z @ beta
+    bread = np.linalg.pinv(Z.T @ Z)
+    if clusters is None:
+        si = np.arange(len(e))
+    else:
+        _, si = np.unique(np.asarray(clusters), return_inverse=True)
+    return beta, _cluster_cov(Z, np.ones(len(e)), e, si, int(si.max()) + 1, len(e), bread)
+
+def estimate_effects(df: pd.DataFrame, sample_size: int | None = None, n_folds: int = 5, n_jobs: int = -1,
+                     threads_per_job: int = 1, random_state: int = 42, nuisance_params: dict | None = None,
+                     cluster: str | None = "Provider_State") -> dict:
+    from joblib import Parallel, delayed
+    timings = {}
+    t0 = time.perf_counter()
+    d = stratified_sample(causal_frame(df), sample_size, random_state=random_state)
+    X = d[CAUSAL_COVARIATES].to_numpy(np.float64)
+    y = d["payment_ratio"].to_numpy(np.float64)
+    T = d["treated"].to_numpy(np.int8)
+    folds = _fold_ids(d["Provider_Id"].to_numpy(), n_folds, random_state)
+    timings["prepare"] = time.perf_counter() - t0
+    params = {"max_iter": 200, "random_state": random_state, **(nuisance_params or {})}
+    t0 = time.perf_counter()
+    parts = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(X, y, T, np.flatnonzero(folds != k), np.flatnonzero(folds == k), params, threads_per_job)
+        for k in range(n_folds)
+    )
+    timings["cross_fit"] = time.perf_counter() - t0
+    timings["fold_fit_seconds"] = [p["seconds"] for p in parts]
+    y_res, t_res, tl = np.empty(len(d)), np.empty(len(d)), np.empty(len(d))
+    for p in parts:
+        y_res[p["test"]], t_res[p["test"]], tl[p["test"]] = p["y_res"], p["t_res"], p["tlearner_te"]
+    t0 = time.perf_counter()
+    mu, sd = X.mean(axis=0), X.std(axis=0)
+    sd[sd == 0] = 1.0
+    Phi = np.column_stack([np.ones(len(d)), (X - mu) / sd])
+    beta, cov = _final_stage(Phi, y_res, t_res, None if cluster is None else d[cluster].to_numpy())
+    dml = Phi @ beta
+    timings["final_stage"] = time.perf_counter() - t0
+    coef = pd.DataFrame({
+        "term": ["intercept"] + CAUSAL_COVARIATES,
+        "coef": beta,
+        "se": np.sqrt(np.clip(np.diag(cov), 0, None)),
+    })
+    g = Phi.mean(axis=0)
+    effects = d[["Provider_Id", "Provider_State", "year", "treated"]].assign(dml_te=dml, tlearner_te=tl)
+    return {
+        "n": len(d),
+        "ate_dml": float(dml.mean()),
+        "ate_dml_se": float(np.sqrt(max(g @ cov @ g, 0.0))),
+        "ate_tlearner": float(np.nanmean(tl)),
+        "se_cluster": cluster,
+        "n_clusters": len(d) if cluster is None else int(d[cluster].nunique()),
+        "coef": coef,
+        "effects": effects,
+        "timings": timings,
+    }
+
+def write_effects(effects: pd.DataFrame, path, chunksize: int = 100_000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    writer = None
+    try:
+        for i in range(0, max(len(effects), 1), chunksize):
+            tbl = pa.Table.from_pandas(effects.iloc[i:i + chunksize], preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, tbl.schema)
+            writer.write_table(tbl)
+    finally:
+        if writer is not None:
+            writer.close()
+    tmp.replace(path)
+    return path
\ No newline at end of file
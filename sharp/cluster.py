@@ -1,17 +1,43 @@
 import pandas as pd
+from sharp.backend import check_backend, query
 
-def build_zip_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    z = df.groupby(["Provider_Zip_Code", "year"]).agg(
-        payment_ratio=("payment_ratio", "mean"),
-        Total_Discharges=("Total_Discharges", "sum"),
-        Average_Total_Payments=("Average_Total_Payments", "mean"),
-        financial_stress_index=("financial_stress_index", "mean"),
-    ).reset_index()
+ZIP_METRICS_SQL = """
+select Provider_Zip_Code, year,
+       avg(payment_ratio) as payment_ratio,
+       sum(Total_Discharges) as Total_Discharges,
+       avg(Average_Total_Payments) as Average_Total_Payments,
+       avg(financial_stress_index) as financial_stress_index
+from {cms}
+group by 1, 2
+order by 1, 2
+"""
+
+READMIT_CONCENTRATION_SQL = """
+select Provider_Zip_Code,
+       sum(Total_Discharges) as readmit_discharges
+from {cms}
+where is_readmit_prone
+group by 1
+order by 1
+"""
+
+def build_zip_metrics(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        z = query(ZIP_METRICS_SQL, df)
+    else:
+        z = df.groupby(["Provider_Zip_Code", "year"]).agg(
+            payment_ratio=("payment_ratio", "mean"),
+            Total_Discharges=("Total_Discharges", "sum"),
+            Average_Total_Payments=("Average_Total_Payments", "mean"),
+            financial_stress_index=("financial_stress_index", "mean"),
+        ).reset_index()
     q = z["payment_ratio"].quantile(0.25)
     z["is_stressed_area"] = z["payment_ratio"] < q
     return z
 
-def readmit_concentration(df: pd.DataFrame) -> pd.DataFrame:
+def readmit_concentration(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        return query(READMIT_CONCENTRATION_SQL, df)
     r = df[df["is_readmit_prone"]].groupby("Provider_Zip_Code").agg(
         readmit_discharges=("Total_Discharges", "sum")
     ).reset_index()
@@ -0,0 +1,117 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+CUBE_DIMS = ["Provider_State", "year", "DRG_Code", "hospital_size_category", "is_readmit_prone", "ratio_band"]
+CORR_COLS = ["payment_ratio", "medicare_coverage_ratio", "financial_stress_index", "avg_charges_log"]
+RATIO_BANDS = ["stressed", "mid", "normal"]
+STRESSED_MAX = 0.3
+NORMAL_MIN = 0.5
+
+def _pairs() -> list:
+    return [(a, b) for i, a in enumerate(CORR_COLS) for b in CORR_COLS[i + 1:]]
+
+def ratio_band(ratio) -> pd.Categorical:
+    r = np.asarray(ratio, dtype=np.float64)
+    codes = np.where(r < STRESSED_MAX, 0, np.where(r > NORMAL_MIN, 2, 1))
+    codes[np.isnan(r)] = -1
+    return pd.Categorical.from_codes(codes, categories=RATIO_BANDS)
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    atp = df["Average_Total_Payments"].to_numpy(np.float64)
+    ratio = df["payment_ratio"].to_numpy(np.float64)
+    m = {
+        "n_rows": np.ones(len(df), dtype=np.int64),
+        "discharges": df["Total_Discharges"].to_numpy(np.int64),
+        "atp_sum": np.nan_to_num(atp),
+        "atp_n": (~np.isnan(atp)).astype(np.int64),
+        "ratio_sum": np.nan_to_num(ratio),
+        "ratio_n": (~np.isnan(ratio)).astype(np.int64),
+    }
+    X = df[CORR_COLS].to_numpy(np.float64)
+    ok = ~np.isnan(X)
+    X[~ok] = 0.0
+    idx = {c: j for j, c in enumerate(CORR_COLS)}
+    # per pair sums over the rows where both columns are present, so correlation() is pairwise-complete
+    for a, b in _pairs():
+        both = ok[:, idx[a]] & ok[:, idx[b]]
+        xa, xb = np.where(both, X[:, idx[a]], 0.0), np.where(both, X[:, idx[b]], 0.0)
+        p = f"{a}__{b}"
+        m[f"n_{p}"], m[f"sa_{p}"], m[f"sb_{p}"] = both.astype(np.int64), xa, xb
+        m[f"qa_{p}"], m[f"qb_{p}"], m[f"q_{p}"] = xa * xa, xb * xb, xa * xb
+    keys = {c: df[c].to_numpy() if c != "hospital_size_category" else df[c] for c in CUBE_DIMS[:-1]}
+    keys["ratio_band"] = ratio_band(ratio)
+    frame = pd.DataFrame({**keys, **m})
+    for c in ["Provider_State", "DRG_Code"]:
+        frame[c] = frame[c].astype("category")
+    return frame.groupby(CUBE_DIMS, observed=True, dropna=False, sort=True).sum().reset_index()
+
+def combine_cubes(cubes) -> pd.DataFrame:
+    cubes = list(cubes)
+    for c in ["Provider_State", "DRG_Code"]:
+        cats = sorted(set().union(*(k[c].cat.categories for k in cubes)))
+        for k in cubes:
+            k[c] = k[c].cat.set_categories(cats)
+    out = pd.concat(cubes, ignore_index=True)
+    return out.groupby(CUBE_DIMS, observed=True, dropna=False, sort=True).sum().reset_index()
+
+def write_cube(cube: pd.DataFrame, path) -> Path:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    cube.to_parquet(tmp, index=False)
+    tmp.replace(p)
+    return p
+
+def load_cube(path) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+def slice_cube(cube: pd.DataFrame, states=None, years=None, drgs=None, sizes=None,
+               readmit_prone: bool | None = None) -> pd.DataFrame:
+    mask = np.ones(len(cube), dtype=bool)
+    if states:
+        mask &= cube["Provider_State"].isin(states).to_numpy()
+    if years is not None:
+        y = cube["year"].to_numpy()
+        mask &= (y >= years[0]) & (y <= years[1])
+    if drgs:
+        mask &= cube["DRG_Code"].isin(drgs).to_numpy()
+    if sizes:
+        mask &= cube["hospital_size_category"].isin(sizes).to_numpy()
+    if readmit_prone is not None:
+        mask &= cube["is_readmit_prone"].to_numpy() == readmit_prone
+    return cube[mask]
+
+def state_year(cube: pd.DataFrame) -> pd.DataFrame:
+    g = cube.groupby(["Provider_State", "year"], observed=True)[["discharges", "ratio_sum", "ratio_n"]].sum()
+    g["stress"] = 1 - g["ratio_sum"] / g["ratio_n"]
+    return g.rename(columns={"discharges": "readmit_discharges"})[["readmit_discharges", "stress"]].reset_index()
+
+def correlation(cube: pd.DataFrame) -> pd.DataFrame:
+    corr = np.eye(len(CORR_COLS))
+    idx = {c: j for j, c in enumerate(CORR_COLS)}
+    for a, b in _pairs():
+        n, sa, sb, qa, qb, q = (cube[f"{k}_{a}__{b}"].sum() for k in ("n", "sa", "sb", "qa", "qb", "q"))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = (q - sa * sb / n) / np.sqrt((qa - sa * sa / n) * (qb - sb * sb / n))
+        corr[idx[a], idx[b]] = corr[idx[b], idx[a]] = r
+    return pd.DataFrame(corr, index=CORR_COLS, columns=CORR_COLS)
+
+def drg_band_stats(cube: pd.DataFrame) -> pd.DataFrame:
+    c = cube[cube["DRG_Code"].notna() & cube["ratio_band"].notna()]
+    g = c.groupby(["DRG_Code", "ratio_band"], observed=True)[["atp_sum", "atp_n", "discharges"]].sum()
+    g["atp_mean"] = g["atp_sum"] / g["atp_n"]
+    return g.unstack("ratio_band")
+
+def cube_tam(cube: pd.DataFrame) -> float:
+    g = drg_band_stats(cube)
+    if "stressed" not in g["atp_mean"] or "normal" not in g["atp_mean"]:
+        return 0.0
+    s = (g["atp_mean"]["stressed"] - g["atp_mean"]["normal"]) * g["discharges"]["stressed"]
+    return float(s.sum())
+
+def readmit_ratio(cube: pd.DataFrame) -> float:
+    c = cube[cube["is_readmit_prone"].to_numpy(bool)]
+    x1 = c.loc[c["ratio_band"] == "stressed", "discharges"].sum()
+    x2 = c.loc[c["ratio_band"].isin(["mid", "normal"]), "discharges"].sum()
+    return x1 / (x2 + 1e-6)
\ No newline at end of file
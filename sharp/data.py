@@ -1,8 +1,29 @@
 from pathlib import Path
+import json
 import pandas as pd
 import re
 
 DATA_DIR = Path("data")
+CACHE_DIR = DATA_DIR / ".cache"
+CACHE_VERSION = 1
+
+MONEY_COLS = [
+    "Average_Covered_Charges",
+    "Average_Total_Payments",
+    "Average_Medicare_Payments",
+]
+
+SCHEMA = {
+    "DRG_Definition": "category",
+    "Provider_Id": "int32",
+    "Provider_State": "category",
+    "Provider_Zip_Code": "int32",
+    "Total_Discharges": "int32",
+    "Average_Covered_Charges": "float32",
+    "Average_Total_Payments": "float32",
+    "Average_Medicare_Payments": "float32",
+    "year": "int32",
+}
 
 def _detect_year(path: Path) -> int:
     m = re.search(r"fy(\d{4})", path.name, re.IGNORECASE)
@@ -10,26 +31,86 @@ def _detect_year(path: Path) -> int:
         return int(m.group(1))
     raise ValueError(f"Year not found in filename: {path}")
 
-def load_ipps_data() -> pd.DataFrame:
-    files = sorted(DATA_DIR.glob("*.csv"))
-    frames = []
-    for f in files:
-        df = pd.read_csv(f)
-        df.columns = [c.strip().replace(" ", "_") for c in df.columns]
-        rename = {
-            "DRG_Definition": "DRG_Definition",
-            "Provider_Id": "Provider_Id",
-            "Provider_Name": "Provider_Name",
-            "Provider_City": "Provider_City",
-            "Provider_State": "Provider_State",
-            "Provider_Zip_Code": "Provider_Zip_Code",
-            "Total_Discharges": "Total_Discharges",
-            "Average_Covered_Charges": "Average_Covered_Charges",
-            "Average_Total_Payments": "Average_Total_Payments",
-            "Average_Medicare_Payments": "Average_Medicare_Payments",
-        }
-        df = df.rename(columns=rename)
-        df["year"] = _detect_year(f)
-        frames.append(df)
-    cms = pd.concat(frames, ignore_index=True)
+def _normalize(df: pd.DataFrame, year: int, source: Path | None = None, first_line: int = 2) -> pd.DataFrame:
+    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
+    for c in MONEY_COLS:
+        if c in df.columns and df[c].dtype == object:
+            df[c] = pd.to_numeric(df[c].str.replace(r"[$,\s]", "", regex=True), errors="coerce")
+    if "Total_Discharges" in df.columns:
+        if df["Total_Discharges"].dtype == object:
+            df["Total_Discharges"] = pd.to_numeric(df["Total_Discharges"].str.replace(",", ""), errors="coerce")
+        bad = df["Total_Discharges"].isna().to_numpy().nonzero()[0] + first_line
+        if len(bad):
+            raise ValueError(f"{source or 'IPPS data'}: Total_Discharges is blank or not a number on "
+                             f"{len(bad)} line(s): {bad[:10].tolist()}{' ...' if len(bad) > 10 else ''}")
+    df["year"] = year
+    return df.astype({c: t for c, t in SCHEMA.items() if c in df.columns})
+
+def _read_csv(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype={"DRG Definition": "category", "Provider State": "category"})
+    return _normalize(df, _detect_year(path), path)
+
+def _cache_key(path: Path, extra: dict | None = None) -> dict:
+    st = path.stat()
+    return {"source": path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "version": CACHE_VERSION,
+            **(extra or {})}
+
+def _is_fresh(path: Path, cache_dir: Path, extra: dict | None = None) -> bool:
+    target = cache_dir / f"{path.stem}.parquet"
+    manifest = cache_dir / f"{path.stem}.json"
+    return target.exists() and manifest.exists() and json.loads(manifest.read_text()) == _cache_key(path, extra)
+
+def _write_cache(path: Path, cache_dir: Path, df: pd.DataFrame, extra: dict | None = None) -> Path | None:
+    target = cache_dir / f"{path.stem}.parquet"
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".parquet.tmp")
+        df.to_parquet(tmp, index=False)
+        tmp.replace(target)
+        (cache_dir / f"{path.stem}.json").write_text(json.dumps(_cache_key(path, extra)))
+    except ImportError:
+        return None
+    return target
+
+def _read_year(path: Path, cache_dir: Path | None) -> pd.DataFrame:
+    if cache_dir is None:
+        return _read_csv(path)
+    if _is_fresh(path, cache_dir):
+        return pd.read_parquet(cache_dir / f"{path.stem}.parquet")
+    df = _read_csv(path)
+    _write_cache(path, cache_dir, df)
+    return df
+
+def _concat(frames: list) -> pd.DataFrame:
+    for c in ["Provider_State", "DRG_Definition"]:
+        cats = sorted(set().union(*(f[c].cat.categories for f in frames)))
+        for f in frames:
+            f[c] = f[c].cat.set_categories(cats)
+    return pd.concat(frames, ignore_index=True)
+
+def ipps_files() -> list:
+    return sorted(DATA_DIR.glob("*.csv"))
+
+def iter_ipps_data(cache: bool = True):
+    cache_dir = CACHE_DIR if cache else None
+    for f in ipps_files():
+        yield _read_year(f, cache_dir)
+
+def iter_year_chunks(path: Path, chunksize: int, cache: bool = True):
+    if cache:
+        target = CACHE_DIR / f"{path.stem}.parquet"
+        if _is_fresh(path, CACHE_DIR) or _write_cache(path, CACHE_DIR, _read_csv(path)) is not None:
+            import pyarrow.parquet as pq
+            for b in pq.ParquetFile(target).iter_batches(batch_size=chunksize):
+                yield b.to_pandas()
+            return
+    year, line = _detect_year(path), 2
+    for c in pd.read_csv(path, chunksize=chunksize):
+        yield _normalize(c, year, path, line)
+        line += len(c)
+
+def load_ipps_data(cache: bool = True) -> pd.DataFrame:
+    cache_dir = CACHE_DIR if cache else None
+    frames = [_read_year(f, cache_dir) for f in ipps_files()]
+    cms = _concat(frames)
     return cms
\ No newline at end of file
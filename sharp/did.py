@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from sharp.causal import EXPANSION_STATES
+
+BASE_YEAR = 2014
+DID_OUTCOMES = ["payment_ratio"]
+BOOT_BLOCK = 4096
+
+def default_cohorts(states=EXPANSION_STATES, year: int = BASE_YEAR) -> dict:
+    return {str(s): int(year) for s in states}
+
+def did_cells(df: pd.DataFrame, outcomes=DID_OUTCOMES, weight: str | None = None) -> pd.DataFrame:
+    w = np.ones(len(df)) if weight is None else df[weight].to_numpy(np.float64)
+    cols = {}
+    for v in outcomes:
+        y = df[v].to_numpy(np.float64)
+        ok = ~np.isnan(y)
+        cols[f"{v}_sum"] = np.where(ok, w * y, 0.0)
+        cols[f"{v}_w"] = np.where(ok, w, 0.0)
+        cols[f"{v}_n"] = ok.astype(np.float64)
+    c = pd.DataFrame(cols)
+    c["Provider_State"] = df["Provider_State"].astype(str).to_numpy()
+    c["year"] = df["year"].to_numpy()
+    return c.groupby(["Provider_State", "year"], sort=True).sum().reset_index()
+
+def did_2x2(cells: pd.DataFrame, outcome: str = "payment_ratio", treated_states=EXPANSION_STATES,
+            start_year: int = BASE_YEAR) -> pd.DataFrame:
+    t = cells["Provider_State"].isin([str(s) for s in treated_states])
+    post = cells["year"] >= start_year
+    g = cells.assign(treated=t.to_numpy(), period=np.where(post, "post", "pre"))
+    s = g.groupby(["treated", "period"])[[f"{outcome}_sum", f"{outcome}_w"]].sum()
+    m = (s[f"{outcome}_sum"] / s[f"{outcome}_w"]).unstack("period")[["pre", "post"]].reset_index()
+    m.columns.name = None
+    d = m.set_index("treated")
+    m["did"] = (d.loc[True, "post"] - d.loc[True, "pre"]) - (d.loc[False, "post"] - d.loc[False, "pre"])
+    return m
+
+def _design(cells: pd.DataFrame, cohorts: dict, ref: int, window, static: bool) -> tuple:
+    n = len(cells)
+    year = cells["year"].to_numpy()
+    g = cells["Provider_State"].map(cohorts).to_numpy(np.float64)
+    treated = ~np.isnan(g)
+    rel = year - g
+    if window is not None:
+        rel = np.clip(rel, window[0], window[1])
+    if static:
+        events = np.array([0.0])
+        dummies = (treated & (rel >= 0))[:, None]
+    else:
+        events = np.unique(rel[treated])
+        events = events[events != ref]
+        dummies = treated[:, None] & (rel[:, None] == events[None, :])
+    si, su = pd.factorize(cells["Provider_State"], sort=True)
+    yi, yu = pd.factorize(year, sort=True)
+    X = np.zeros((n, len(su) + len(yu) - 1 + dummies.shape[1]))
+    X[np.arange(n), si] = 1.0
+    later = yi > 0
+    X[np.flatnonzero(later), len(su) + yi[later] - 1] = 1.0
+    X[:, len(su) + len(yu) - 1:] = dummies
+    return X, si, len(su), events, dummies.shape[1]
+
+def _cluster_cov(X, w, e, si, n_clusters: int, n_rows: float, bread) -> np.ndarray:
+    S = np.zeros((n_clusters, X.shape[1]))
+    np.add.at(S, si, X * (w * e)[:, None])
+    k = np.linalg.matrix_rank(X * np.sqrt(w)[:, None])
+    c = n_clusters / max(n_clusters - 1, 1) * (n_rows - 1) / max(n_rows - k, 1)
+    return c * bread @ (S.T @ S) @ bread
+
+def _wild(P, beta, e, si, n_clusters: int, n_boot: int, rng) -> np.ndarray:
+    out = []
+    for start in range(0, n_boot, BOOT_BLOCK):
+        V = rng.choice([-1.0, 1.0], size=(n_clusters, min(BOOT_BLOCK, n_boot - start)))
+        out.append(beta[:, None] + P @ (e[:, None] * V[si]))
+    return np.concatenate(out, axis=1)
+
+def _pairs(X, y, w, si, n_clusters: int, n_boot: int, rng) -> np.ndarray:
+    draws = rng.multinomial(n_clusters, np.full(n_clusters, 1.0 / n_clusters), size=n_boot)
+    out = np.empty((X.shape[1], n_boot))
+    for b in range(n_boot):
+        wb = w * draws[b][si]
+        sw = np.sqrt(wb)
+        out[:, b] = np.linalg.lstsq(X * sw[:, None], y * sw, rcond=None)[0]
+    return out
+
+def event_study(cells: pd.DataFrame, outcome: str = "payment_ratio", cohorts: dict | None = None, ref: int = -1,
+                window=None, static: bool = False, years=None, bootstrap: str | None = None, n_boot: int = 999,
+                random_state: int = 42) -> pd.DataFrame:
+    if bootstrap not in (None, "wild", "cluster"):
+        raise ValueError(f"Unknown bootstrap {bootstrap!r}; expected None, 'wild' or 'cluster'")
+    cohorts = default_cohorts() if cohorts is None else {str(k): v for k, v in cohorts.items()}
+    c = cells[cells[f"{outcome}_w"] > 0]
+    if years is not None:
+        c = c[c["year"].between(years[0], years[1])]
+    c = c.reset_index(drop=True)
+    X, si, n_clusters, events, n_ev = _design(c, cohorts, ref, window, static)
+    w = c[f"{outcome}_w"].to_numpy(np.float64)
+    y = c[f"{outcome}_sum"].to_numpy(np.float64) / w
+    bread = np.linalg.pinv((X * w[:, None]).T @ X)
+    P = bread @ (X * w[:, None]).T
+    beta = P @ y
+    e = y - X @ beta
+    cov = _cluster_cov(X, w, e, si, n_clusters, c[f"{outcome}_n"].sum(), bread)
+    cols = slice(X.shape[1] - n_ev, X.shape[1])
+    out = pd.DataFrame({
+        "event_time": events.astype(int),
+        "coef": beta[cols],
+        "se": np.sqrt(np.clip(np.diag(cov)[cols], 0, None)),
+    })
+    if bootstrap is not None:
+        rng = np.random.default_rng(random_state)
+        B = (_wild(P, beta, e, si, n_clusters, n_boot, rng) if bootstrap == "wild"
+             else _pairs(X, y, w, si, n_clusters, n_boot, rng))[cols]
+        out["boot_se"] = np.nanstd(B, axis=1, ddof=1)
+        out["p2_5"] = np.nanpercentile(B, 2.5, axis=1)
+        out["p97_5"] = np.nanpercentile(B, 97.5, axis=1)
+    if not static:
+        out = pd.concat([out, pd.DataFrame({"event_time": [ref], "coef": [0.0]})], ignore_index=True)
+        out = out.sort_values("event_time", ignore_index=True)
+    out.insert(0, "term", "post" if static else "event")
+    out["n_clusters"] = n_clusters
+    return out
+
+def run_specs(cells: pd.DataFrame, specs: list) -> pd.DataFrame:
+    parts = []
+    for i, spec in enumerate(specs):
+        parts.append(event_study(cells, **spec).assign(spec=i))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
\ No newline at end of file
@@ -1,5 +1,7 @@
+from pathlib import Path
 import numpy as np
 import pandas as pd
+from sharp.data import ipps_files, iter_year_chunks, iter_ipps_data
 
 HIGH_READMIT_DRGS = {
     "291": "Heart Failure",
@@ -13,23 +15,123 @@ HIGH_READMIT_DRGS = {
     "195": "Pneumonia MCC",
 }
 
-def build_features(cms: pd.DataFrame) -> pd.DataFrame:
-    df = cms.copy()
+SIZE_BINS = [0, 500, 2000, np.inf]
+SIZE_LABELS = ["small", "medium", "large"]
+
+def _drg_code(defs: pd.Series) -> np.ndarray:
+    cat = defs if isinstance(defs.dtype, pd.CategoricalDtype) else defs.astype("category")
+    uniq = pd.Series(cat.cat.categories.astype(str)).str.extract(r"(\d{3})")[0].to_numpy(object)
+    codes = cat.cat.codes.to_numpy()
+    return np.where(codes >= 0, uniq[codes], np.nan)
+
+def _row_features(df: pd.DataFrame) -> pd.DataFrame:
     df["payment_ratio"] = df["Average_Total_Payments"] / df["Average_Covered_Charges"]
     df["medicare_coverage_ratio"] = df["Average_Medicare_Payments"] / df["Average_Total_Payments"]
     df["financial_stress_index"] = 1 - df["payment_ratio"]
-    df["DRG_Code"] = df["DRG_Definition"].astype(str).str.extract(r"(\d{3})")
+    df["DRG_Code"] = _drg_code(df["DRG_Definition"])
     df["is_readmit_prone"] = df["DRG_Code"].isin(list(HIGH_READMIT_DRGS.keys()))
     df["avg_charges_log"] = np.log1p(df["Average_Covered_Charges"])
-    state_ratio = (
-        df.groupby(["Provider_State", "year"])["payment_ratio"].mean().rename("state_avg_payment_ratio")
+    return df
+
+def _group_index(df: pd.DataFrame, keys: list) -> tuple:
+    g = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    for k in keys:
+        codes, uniq = pd.factorize(df[k], sort=False)
+        valid &= codes >= 0
+        g = g * len(uniq) + codes
+    out = np.full(len(df), -1, dtype=np.int64)
+    out[valid], uniq = pd.factorize(g[valid], sort=False)
+    return out, len(uniq)
+
+def _scatter(values: np.ndarray, g: np.ndarray) -> np.ndarray:
+    out = values[np.where(g >= 0, g, 0)]
+    if out.dtype.kind == "f":
+        out[g < 0] = np.nan
+    return out
+
+def _group_mean(x: np.ndarray, g: np.ndarray, n: int) -> np.ndarray:
+    ok = (g >= 0) & ~np.isnan(x)
+    s = np.bincount(g[ok], weights=x[ok], minlength=n)
+    c = np.bincount(g[ok], minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return s / c
+
+def build_features(cms: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+    df = cms.copy() if copy else cms
+    df = _row_features(df)
+    ratio = df["payment_ratio"].to_numpy(np.float64)
+    gs, ns = _group_index(df, ["Provider_State", "year"])
+    df["state_avg_payment_ratio"] = _scatter(_group_mean(ratio, gs, ns), gs).astype(df["payment_ratio"].dtype)
+    gp, npy = _group_index(df, ["Provider_Id", "year"])
+    ok = gp >= 0
+    size = np.bincount(gp[ok], weights=df["Total_Discharges"].to_numpy(np.float64)[ok], minlength=npy)
+    size_row = _scatter(size, gp)
+    df["year_discharge_total"] = size_row.astype(np.int64) if ok.all() else size_row
+    size_cat = pd.cut(size, bins=SIZE_BINS, labels=SIZE_LABELS)
+    df["hospital_size_category"] = pd.Categorical.from_codes(
+        np.where(ok, size_cat.codes[np.where(ok, gp, 0)], -1), dtype=size_cat.dtype
     )
-    df = df.merge(state_ratio.reset_index(), on=["Provider_State", "year"], how="left")
-    size = df.groupby(["Provider_Id", "year"])['Total_Discharges'].sum().rename('year_discharge_total')
-    df = df.merge(size.reset_index(), on=["Provider_Id", "year"], how="left")
-    bins = [0, 500, 2000, np.inf]
-    labels = ["small", "medium", "large"]
-    df["hospital_size_category"] = pd.cut(df["year_discharge_total"], bins=bins, labels=labels)
-    diversity = df.groupby(["Provider_Id", "year"])['DRG_Code'].nunique().rename('drg_diversity_index')
-    df = df.merge(diversity.reset_index(), on=["Provider_Id", "year"], how="left")
-    return df
\ No newline at end of file
+    drg, drgs = pd.factorize(df["DRG_Code"], sort=False)
+    m = max(len(drgs), 1)
+    has = ok & (drg >= 0)
+    pairs = np.unique(gp[has] * m + drg[has])
+    df["drg_diversity_index"] = _scatter(np.bincount(pairs // m, minlength=npy), gp)
+    return df
+
+def _accumulate(acc: dict, df: pd.DataFrame) -> dict:
+    g = df.groupby(["Provider_State", "year"], observed=True)["payment_ratio"].agg(["sum", "count"])
+    acc["state"] = g if acc["state"] is None else acc["state"].add(g, fill_value=0)
+    s = df.groupby(["Provider_Id", "year"])["Total_Discharges"].sum()
+    acc["size"] = s if acc["size"] is None else acc["size"].add(s, fill_value=0)
+    pairs = df[["Provider_Id", "year", "DRG_Code"]].dropna().drop_duplicates()
+    acc["pairs"] = pairs if acc["pairs"] is None else pd.concat([acc["pairs"], pairs]).drop_duplicates()
+    return acc
+
+def _finalize(acc: dict) -> dict:
+    state = acc["state"]
+    return {
+        "state_avg_payment_ratio": (state["sum"] / state["count"]).rename("state_avg_payment_ratio"),
+        "year_discharge_total": acc["size"].astype("int64").rename("year_discharge_total"),
+        "drg_diversity_index": acc["pairs"].groupby(["Provider_Id", "year"]).size().rename("drg_diversity_index"),
+    }
+
+def _apply_aggregates(df: pd.DataFrame, aggs: dict) -> pd.DataFrame:
+    df = df.join(aggs["state_avg_payment_ratio"], on=["Provider_State", "year"])
+    df = df.join(aggs["year_discharge_total"], on=["Provider_Id", "year"])
+    df["hospital_size_category"] = pd.cut(df["year_discharge_total"], bins=SIZE_BINS, labels=SIZE_LABELS)
+    df = df.join(aggs["drg_diversity_index"], on=["Provider_Id", "year"])
+    df["drg_diversity_index"] = df["drg_diversity_index"].fillna(0).astype(int)
+    return df
+
+def iter_features(chunksize: int | None = None, cache: bool = True):
+    if chunksize is None:
+        for cms in iter_ipps_data(cache=cache):
+            yield build_features(cms, copy=False)
+        return
+    for f in ipps_files():
+        acc = {"state": None, "size": None, "pairs": None}
+        for c in iter_year_chunks(f, chunksize, cache=cache):
+            acc = _accumulate(acc, _row_features(c))
+        aggs = _finalize(acc)
+        for c in iter_year_chunks(f, chunksize, cache=cache):
+            yield _apply_aggregates(_row_features(c), aggs)
+
+def write_features(out_dir, chunksize: int | None = None, cache: bool = True) -> Path:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    writers = {}
+    try:
+        for c in iter_features(chunksize=chunksize, cache=cache):
+            for year, part in c.groupby("year"):
+                tbl = pa.Table.from_pandas(part, preserve_index=False)
+                if year not in writers:
+                    writers[year] = pq.ParquetWriter(out / f"fy{year}.parquet", tbl.schema)
+                w = writers[year]
+                w.write_table(tbl if tbl.schema.equals(w.schema) else tbl.cast(w.schema))
+    finally:
+        for w in writers.values():
+            w.close()
+    return out
\ No newline at end of file
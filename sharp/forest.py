@@ -0,0 +1,99 @@
+from pathlib import Path
+import json
+import numpy as np
+
+ARRAYS = ["feature", "threshold", "children", "value", "missing_left", "roots"]
+ROW_BLOCK = 512
+
+def _float32_floor(t: np.ndarray) -> np.ndarray:
+    t32 = t.astype(np.float32)
+    over = t32.astype(np.float64) > t
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+def export_forest(rf, path_dir) -> Path:
+    p = Path(path_dir)
+    p.mkdir(parents=True, exist_ok=True)
+    trees = [e.tree_ for e in rf.estimators_]
+    sizes = np.array([t.node_count for t in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+    feature, threshold, children, value, missing_left = [], [], [], [], []
+    for t, off in zip(trees, roots):
+        leaf = t.children_left == -1
+        idx = np.arange(t.node_count, dtype=np.int64) + off
+        feature.append(np.where(leaf, -1, t.feature))
+        threshold.append(np.where(leaf, np.inf, t.threshold))
+        children.append(np.column_stack([
+            np.where(leaf, idx, t.children_right + off),
+            np.where(leaf, idx, t.children_left + off),
+        ]))
+        value.append(t.value[:, 0, 0])
+        mgl = getattr(t, "missing_go_to_left", None)
+        missing_left.append(np.zeros(t.node_count, bool) if mgl is None else np.asarray(mgl, bool))
+    arrays = {
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": _float32_floor(np.concatenate(threshold)),
+        "children": np.concatenate(children).astype(np.int32).ravel(),
+        "value": np.concatenate(value).astype(np.float64),
+        "missing_left": np.concatenate(missing_left),
+        "roots": roots,
+    }
+    for name, a in arrays.items():
+        np.save(p / f"{name}.npy", np.ascontiguousarray(a))
+    meta = {
+        "n_trees": len(trees),
+        "n_nodes": int(sizes.sum()),
+        "n_features": int(rf.n_features_in_),
+        "max_depth": int(max(t.max_depth for t in trees)),
+    }
+    (p / "meta.json").write_text(json.dumps(meta))
+    return p
+
+def load_forest(path_dir, mmap: bool = True) -> dict:
+    p = Path(path_dir)
+    forest = {name: np.load(p / f"{name}.npy", mmap_mode="r" if mmap else None) for name in ARRAYS}
+    forest.update(json.loads((p / "meta.json").read_text()))
+    return forest
+
+def _predict_block(forest: dict, X: np.ndarray, has_nan: bool) -> np.ndarray:
+    n, t = X.shape[0], forest["n_trees"]
+    feature, threshold = forest["feature"], forest["threshold"]
+    children, missing_left = forest["children"], forest["missing_left"]
+    nodes = np.repeat(np.asarray(forest["roots"], dtype=np.int32), n)
+    pos = np.arange(n * t, dtype=np.int32)
+    rows = np.tile(np.arange(n, dtype=np.int32) * X.shape[1], t)
+    Xf = X.ravel()
+    f = feature[nodes]
+    while pos.size:
+        keep = f >= 0
+        if not keep.all():
+            pos, rows, f = pos[keep], rows[keep], f[keep]
+            if not pos.size:
+                break
+        nd = nodes[pos]
+        x = Xf[rows + f]
+        go_left = x <= threshold[nd]
+        if has_nan:
+            go_left |= np.isnan(x) & missing_left[nd]
+        nxt = children[2 * nd + go_left]
+        nodes[pos] = nxt
+        f = feature[nxt]
+    vals = forest["value"][nodes].reshape(t, n)
+    out = np.zeros(n)
+    for v in vals:
+        out += v
+    out /= t
+    return out
+
+def predict_forest(forest: dict, X) -> np.ndarray:
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if X.ndim == 1:
+        X = X[None, :]
+    if X.shape[1] != forest["n_features"]:
+        raise ValueError(f"X has {X.shape[1]} features, forest expects {forest['n_features']}")
+    has_nan = bool(np.isnan(X).any())
+    if X.shape[0] <= ROW_BLOCK:
+        return _predict_block(forest, X, has_nan)
+    return np.concatenate([
+        _predict_block(forest, X[i:i + ROW_BLOCK], has_nan) for i in range(0, X.shape[0], ROW_BLOCK)
+    ])
\ No newline at end of file
@@ -1,13 +1,39 @@
+import sys
 import numpy as np
 import pandas as pd
 from sklearn.metrics import roc_auc_score, mean_absolute_error
 from sklearn.ensemble import RandomForestRegressor
 import json
+import hashlib
+import inspect
 import joblib
+import time
+import warnings
 from pathlib import Path
+from sharp import data as _data
+from sharp.backend import check_backend, query
+from sharp.forest import export_forest
+from sharp.versioning import new_version_dir, publish, current_dir
 
-def build_provider_year(df: pd.DataFrame) -> pd.DataFrame:
-    agg = df.groupby(["Provider_Id", "Provider_Name", "Provider_State", "year"]).agg(
+PROVIDER_YEAR_SQL = """
+select Provider_Id, Provider_Name, Provider_State, year,
+       avg(payment_ratio) as payment_ratio,
+       avg(medicare_coverage_ratio) as medicare_coverage_ratio,
+       avg(financial_stress_index) as financial_stress_index,
+       avg(avg_charges_log) as avg_charges_log,
+       avg(state_avg_payment_ratio) as state_avg_payment_ratio,
+       max(hospital_size_category) as hospital_size_category,
+       max(drg_diversity_index) as drg_diversity_index,
+       sum(Total_Discharges) as readmit_discharges
+from {cms}
+group by 1, 2, 3, 4
+order by 1, 2, 3, 4
+"""
+
+def build_provider_year(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        return query(PROVIDER_YEAR_SQL, df)
+    agg = df.groupby(["Provider_Id", "Provider_Name", "Provider_State", "year"], observed=True).agg(
         payment_ratio=("payment_ratio", "mean"),
         medicare_coverage_ratio=("medicare_coverage_ratio", "mean"),
         financial_stress_index=("financial_stress_index", "mean"),
@@ -19,6 +45,40 @@ def build_provider_year(df: pd.DataFrame) -> pd.DataFrame:
     ).reset_index()
     return agg
 
+PANEL_CACHE_DIR = _data.CACHE_DIR / "provider_year"
+
+def panel_code_hash() -> str:
+    from sharp import features
+    h = hashlib.sha256(Path(inspect.getsourcefile(features)).read_bytes())
+    h.update(inspect.getsource(build_provider_year).encode())
+    h.update(PROVIDER_YEAR_SQL.encode())
+    return h.hexdigest()[:16]
+
+def update_provider_year(cache_dir=PANEL_CACHE_DIR, backend: str = "pandas") -> tuple:
+    from sharp.features import build_features
+    cache_dir = Path(cache_dir)
+    frames, rebuilt = [], []
+    extra = {"code": panel_code_hash(), "backend": backend}
+    for f in _data.ipps_files():
+        if _data._is_fresh(f, cache_dir, extra):
+            frames.append(pd.read_parquet(cache_dir / f"{f.stem}.parquet"))
+            continue
+        cms = build_features(_data._read_year(f, _data.CACHE_DIR), copy=False)
+        part = build_provider_year(cms, backend=backend)
+        _data._write_cache(f, cache_dir, part, extra)
+        frames.append(part)
+        rebuilt.append(_data._detect_year(f))
+    if not frames:
+        raise FileNotFoundError(f"No IPPS files in {_data.DATA_DIR}")
+    for c in frames[0].select_dtypes("category").columns:
+        if frames[0][c].cat.ordered:
+            continue
+        cats = sorted(set().union(*(d[c].cat.categories for d in frames)))
+        for d in frames:
+            d[c] = d[c].cat.set_categories(cats)
+    panel = pd.concat(frames, ignore_index=True).sort_values(["Provider_Id", "year"], ignore_index=True)
+    return panel, rebuilt
+
 def add_next_year_target(agg: pd.DataFrame) -> pd.DataFrame:
     agg = agg.sort_values(["Provider_Id", "year"]) 
     agg["next_readmit_discharges"] = agg.groupby("Provider_Id")["readmit_discharges"].shift(-1)
@@ -27,34 +87,173 @@ def add_next_year_target(agg: pd.DataFrame) -> pd.DataFrame:
     agg["high_risk"] = (agg["target_growth"] >= q).astype(int)
     return agg.dropna(subset=["next_readmit_discharges"]) 
 
-def train_models(agg: pd.DataFrame):
-    feats = [
-        "payment_ratio",
-        "medicare_coverage_ratio",
-        "financial_stress_index",
-        "avg_charges_log",
-        "state_avg_payment_ratio",
-        "drg_diversity_index",
-        "year",
+SIZE_PREFIX = "hospital_size_category_"
+
+def design_matrix(cols, n: int, feats: list) -> np.ndarray:
+    X = np.zeros((n, len(feats)), dtype=np.float64)
+    size = cols["hospital_size_category"] if "hospital_size_category" in cols else None
+    if size is not None:
+        size = np.asarray([("nan" if s is None or s != s else str(s)) for s in size], dtype=object)
+    for j, f in enumerate(feats):
+        if f.startswith(SIZE_PREFIX):
+            if size is not None:
+                X[:, j] = size == f[len(SIZE_PREFIX):]
+        else:
+            X[:, j] = cols[f]
+    return X
+
+def rolling_splits(years) -> list:
+    ys = sorted(set(int(y) for y in years))
+    return [
+        {"train": ys[:i], "val": ys[i], "test": ys[i + 1]}
+        for i in range(1, len(ys) - 1)
     ]
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024.0 ** 2 if sys.platform == "darwin" else rss / 1024.0
+
+def _reset_peak_rss() -> float | None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    return _peak_rss_mb()
+
+FEATURES = [
+    "payment_ratio",
+    "medicare_coverage_ratio",
+    "financial_stress_index",
+    "avg_charges_log",
+    "state_avg_payment_ratio",
+    "drg_diversity_index",
+    "year",
+]
+
+def model_frame(agg: pd.DataFrame) -> tuple:
     d = agg.copy()
     d["hospital_size_category"] = d["hospital_size_category"].astype(str)
     d = pd.get_dummies(d, columns=["hospital_size_category"], dummy_na=True)
-    X = d[feats + [c for c in d.columns if c.startswith("hospital_size_category_")]]
+    return d, FEATURES + [c for c in d.columns if c.startswith(SIZE_PREFIX)]
+
+def growth_score(pred, readmit, thr: float) -> np.ndarray:
+    prob = (pred - readmit) / (readmit + 1e-6)
+    return np.clip(prob / (thr + 1e-6), 0, 1)
+
+def _threshold_points(y: np.ndarray, score: np.ndarray, groups: np.ndarray) -> dict:
+    o = np.lexsort((-score, groups))
+    y, score, groups = y[o], score[o], groups[o]
+    first = np.r_[True, groups[1:] != groups[:-1]]
+    start = np.flatnonzero(first)
+    seg = np.cumsum(first) - 1
+    tp = np.cumsum(y) - (np.cumsum(y) - y)[start][seg]
+    fp = np.arange(1, len(y) + 1) - start[seg] - tp
+    last = np.flatnonzero(np.r_[(groups[1:] != groups[:-1]) | (score[1:] != score[:-1]), True])
+    g = groups[last]
+    pos = np.bincount(groups, weights=y)
+    neg = np.bincount(groups) - pos
+    return {"group": g, "score": score[last], "tp": tp[last], "fp": fp[last], "pos": pos[g], "neg": neg[g]}
+
+def _auc_by_group(pt: dict, n_groups: int) -> tuple:
+    g, tp, fp, pos, neg = pt["group"], pt["tp"], pt["fp"], pt["pos"], pt["neg"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tpr, fpr = tp / pos, fp / neg
+        prec = tp / (tp + fp)
+    first = np.r_[True, g[1:] != g[:-1]]
+    prev = lambda a, v: np.where(first, v, np.r_[v, a[:-1]])
+    roc = np.bincount(g, weights=(fpr - prev(fpr, 0.0)) * (tpr + prev(tpr, 0.0)) / 2, minlength=n_groups)
+    pr = np.bincount(g, weights=(tpr - prev(tpr, 0.0)) * (prec + prev(prec, 1.0)) / 2, minlength=n_groups)
+    return roc, pr
+
+def _downsample(n: int, points: int) -> np.ndarray:
+    return np.unique(np.linspace(0, n - 1, min(n, points)).round().astype(np.int64))
+
+def evaluate_predictions(pred: pd.DataFrame, thr: float, importances=None, features=None,
+                         points: int = 200) -> dict:
+    y = pred["high_risk"].astype(int).to_numpy()
+    score = growth_score(pred["pred_next"].to_numpy(np.float64), pred["readmit_discharges"].to_numpy(np.float64), thr)
+    n, prev = len(y), float(y.mean())
+    pt = _threshold_points(y, score, np.zeros(n, dtype=np.int64))
+    roc, pr = _auc_by_group(pt, 1)
+    tpr = np.r_[0.0, pt["tp"] / pt["pos"]]
+    fpr = np.r_[0.0, pt["fp"] / pt["neg"]]
+    prec = np.r_[1.0, pt["tp"] / (pt["tp"] + pt["fp"])]
+    frac = np.r_[0.0, (pt["tp"] + pt["fp"]) / n]
+    k = _downsample(len(tpr), points)
+    o = np.argsort(-score, kind="stable")
+    decile = np.minimum(np.arange(n) * 10 // n, 9)
+    ys = y[o]
+    dec = pd.DataFrame({"decile": decile, "y": ys, "score": score[o]}).groupby("decile").agg(
+        n=("y", "size"), positives=("y", "sum"), mean_score=("score", "mean"))
+    dec["rate"] = dec["positives"] / dec["n"]
+    dec["lift"] = dec["positives"].cumsum() / (prev * dec["n"].cumsum())
+    dec["capture"] = dec["positives"].cumsum() / max(ys.sum(), 1)
+    cal = pd.DataFrame({"score": score, "y": y, "bin": pd.qcut(score, 10, labels=False, duplicates="drop")})
+    cal = cal.groupby("bin").agg(pred=("score", "mean"), obs=("y", "mean"), n=("y", "size"))
+    states, gid = np.unique(pred["Provider_State"].astype(str).to_numpy(), return_inverse=True)
+    s_roc, s_pr = _auc_by_group(_threshold_points(y, score, gid), len(states))
+    s_pos, s_n = np.bincount(gid, weights=y, minlength=len(states)), np.bincount(gid, minlength=len(states))
+    valid = (s_pos > 0) & (s_pos < s_n)
+    by_state = pd.DataFrame({"Provider_State": states, "ROC_AUC": np.where(valid, s_roc, np.nan),
+                             "PR_AUC": np.where(s_pos > 0, s_pr, np.nan), "Prevalence": s_pos / s_n, "n": s_n})
+    out = {
+        "n": n,
+        "prevalence": prev,
+        "threshold": float(thr),
+        "roc_auc": float(roc[0]),
+        "pr_auc": float(pr[0]),
+        "roc": {"fpr": fpr[k].tolist(), "tpr": tpr[k].tolist()},
+        "pr": {"recall": tpr[k].tolist(), "precision": prec[k].tolist()},
+        "gains": {"target_frac": frac[k].tolist(), "capture": tpr[k].tolist()},
+        "deciles": dec.reset_index().to_dict("records"),
+        "calibration": cal.reset_index().to_dict("records"),
+        "states": by_state.replace({np.nan: None}).to_dict("records"),
+    }
+    if importances is not None:
+        imp = pd.DataFrame({"feature": features, "importance": np.asarray(importances, dtype=np.float64)})
+        out["importances"] = imp.sort_values("importance", ascending=False).to_dict("records")
+    return out
+
+def train_models(agg: pd.DataFrame, n_estimators: int = 300, n_jobs: int = -1, split: dict | None = None,
+                 warm_start: dict | None = None, add_trees: int = 100):
+    d, cols = model_frame(agg)
+    X = d[cols]
     y_reg = d["next_readmit_discharges"]
     y_cls = d["high_risk"]
-    train = d[d["year"] <= 2013]
-    val = d[d["year"] == 2014]
-    test = d[d["year"] == 2015]
-    rf = RandomForestRegressor(n_estimators=300, random_state=42)
+    if split is None:
+        splits = rolling_splits(d["year"])
+        if not splits:
+            raise ValueError("Need at least three years with a next-year target to split train/val/test")
+        split = splits[-1]
+    train = d[d["year"].isin(split["train"])]
+    val = d[d["year"] == split["val"]]
+    test = d[d["year"] == split["test"]]
+    prev = warm_start["model"] if warm_start and warm_start["features"] == X.columns.tolist() else None
+    if warm_start and prev is None:
+        warnings.warn(f"warm start ignored: the saved model uses features {warm_start['features']}, "
+                      f"not {X.columns.tolist()}; refitting {n_estimators} trees from scratch")
+    if prev is not None:
+        rf = prev
+        rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + add_trees, n_jobs=n_jobs)
+    else:
+        rf = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs)
+    n_before = len(rf.estimators_) if prev is not None else 0
+    rss0 = _reset_peak_rss()
+    t0 = time.perf_counter()
     rf.fit(train[X.columns], train["next_readmit_discharges"])
+    train_seconds = time.perf_counter() - t0
+    rss1 = _peak_rss_mb()
     val_pred = rf.predict(val[X.columns])
     test_pred = rf.predict(test[X.columns])
     mae_val = mean_absolute_error(val["next_readmit_discharges"], val_pred)
     mae_test = mean_absolute_error(test["next_readmit_discharges"], test_pred)
-    prob = (test_pred - test["readmit_discharges"]) / (test["readmit_discharges"] + 1e-6)
     thr = d["target_growth"].quantile(0.80)
-    score = roc_auc_score(test["high_risk"], np.clip(prob / (thr + 1e-6), 0, 1))
+    score = roc_auc_score(test["high_risk"], growth_score(test_pred, test["readmit_discharges"], thr))
     return {
         "model": rf,
         "features": X.columns.tolist(),
@@ -62,10 +261,35 @@ def train_models(agg: pd.DataFrame):
         "mae_test": mae_test,
         "auc_test": float(score),
         "pred_test": test.assign(pred_next=test_pred),
+        "evaluation": evaluate_predictions(test.assign(pred_next=test_pred), thr, rf.feature_importances_,
+                                           X.columns.tolist()),
+        "split": split,
+        "n_trees": len(rf.estimators_),
+        "trees_added": len(rf.estimators_) - n_before,
+        "warm_started": prev is not None,
+        "train_seconds": train_seconds,
+        "peak_rss_mb": None if rss0 is None or rss1 is None else rss1 - rss0,
     }
 
-def save_model(bundle: dict, path_dir: str):
+REPORT_KEYS = ["split", "n_trees", "trees_added", "warm_started", "train_seconds", "peak_rss_mb",
+               "mae_val", "mae_test", "auc_test"]
+
+def model_dir(path_dir) -> Path:
     p = Path(path_dir)
-    p.mkdir(exist_ok=True)
+    return current_dir(p) or p
+
+def load_model(path_dir: str) -> dict | None:
+    p = model_dir(path_dir)
+    if not (p/"rf.pkl").exists() or not (p/"features.json").exists():
+        return None
+    return {"model": joblib.load(p/"rf.pkl"), "features": json.loads((p/"features.json").read_text())}
+
+def save_model(bundle: dict, path_dir: str, keep: int = 3) -> Path:
+    p = new_version_dir(path_dir)
+    bundle["model"].set_params(n_jobs=1)
+    export_forest(bundle["model"], p/"forest")
     joblib.dump(bundle["model"], p/"rf.pkl")
-    (p/"features.json").write_text(json.dumps(bundle["features"]))
\ No newline at end of file
+    (p/"features.json").write_text(json.dumps(bundle["features"]))
+    report = {k: bundle[k] for k in REPORT_KEYS if k in bundle}
+    (p/"train_report.json").write_text(json.dumps(report, indent=2, default=float))
+    return publish(p, keep=keep)
\ No newline at end of file
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from sharp.backend import check_backend, query
+
+WEIGHTED_DEGREE_SQL = """
+with e as (
+    select Provider_Zip_Code, Provider_Id, sum(Total_Discharges) as vol
+    from {cms}
+    group by 1, 2
+), r as (
+    select Provider_Id, vol,
+           count(*) over (partition by Provider_Zip_Code) as k,
+           row_number() over w as rn,
+           coalesce(sum(vol) over (w rows between unbounded preceding and 1 preceding), 0) as below
+    from e
+    window w as (partition by Provider_Zip_Code order by vol, Provider_Id)
+)
+select Provider_Id, sum(below + (k - rn) * vol) as degree
+from r
+where k > 1
+group by 1
+order by 1
+"""
+
+def _sorted_groups(group: np.ndarray, vol: np.ndarray) -> tuple:
+    order = np.lexsort((vol, group))
+    g = group[order]
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    sizes = np.diff(np.r_[starts, len(g)])
+    return order, starts, sizes
+
+def min_weighted_degree(group, vol) -> np.ndarray:
+    group = np.asarray(group)
+    vol = np.asarray(vol)
+    order, starts, sizes = _sorted_groups(group, vol)
+    v = vol[order]
+    csum = np.cumsum(v)
+    base = np.repeat(csum[starts] - v[starts], sizes)
+    rank = np.arange(len(v)) - np.repeat(starts, sizes)
+    k = np.repeat(sizes, sizes)
+    deg = np.empty_like(csum)
+    deg[order] = (csum - v - base) + (k - 1 - rank) * v
+    return deg
+
+def weighted_degree(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        return query(WEIGHTED_DEGREE_SQL, df)
+    e = df.groupby(["Provider_Zip_Code", "Provider_Id"]).agg(vol=("Total_Discharges", "sum")).reset_index()
+    e["degree"] = min_weighted_degree(e["Provider_Zip_Code"].to_numpy(), e["vol"].to_numpy())
+    shared = e.groupby("Provider_Zip_Code")["Provider_Id"].transform("size") > 1
+    return e[shared].groupby("Provider_Id")["degree"].sum().reset_index()
+
+def provider_graph(df: pd.DataFrame, region_digits: int = 3, by_year: bool = True, min_weight: float = 0.0):
+    import scipy.sparse as sp
+    keys = ["Provider_Id", "Provider_Zip_Code"] + (["year"] if by_year else [])
+    e = df.groupby(keys).agg(vol=("Total_Discharges", "sum")).reset_index()
+    e["region"] = e["Provider_Zip_Code"].to_numpy(np.int64) // 10 ** (5 - region_digits)
+    gkeys = ["region"] + (["year"] if by_year else [])
+    e = e.groupby(gkeys + ["Provider_Id"]).agg(vol=("vol", "sum")).reset_index()
+    ids, node = np.unique(e["Provider_Id"].to_numpy(), return_inverse=True)
+    group = e.groupby(gkeys, sort=False).ngroup().to_numpy()
+    order, starts, sizes = _sorted_groups(group, e["vol"].to_numpy())
+    node, vol = node[order], e["vol"].to_numpy(np.float64)[order]
+    # min(vol_u, vol_v) >= min_weight iff both ends qualify, i.e. a suffix of each vol-sorted group
+    keep = np.add.reduceat((vol >= min_weight).astype(np.int64), starts) if len(vol) else sizes
+    rows, cols, w = [], [], []
+    for s, k in zip((starts + sizes - keep)[keep > 1], keep[keep > 1]):
+        i, j = np.triu_indices(k, 1)
+        rows.append(node[s + i])
+        cols.append(node[s + j])
+        w.append(vol[s + i])
+    n = len(ids)
+    if rows:
+        r, c, w = np.concatenate(rows), np.concatenate(cols), np.concatenate(w)
+    else:
+        r = c = np.empty(0, dtype=np.int64)
+        w = np.empty(0)
+    A = sp.coo_matrix((np.r_[w, w], (np.r_[r, c], np.r_[c, r])), shape=(n, n)).tocsr()
+    A.sum_duplicates()
+    return A, ids
+
+def _power_iteration(M, n: int, damping: float | None = None, dangling=None, tol: float = 1e-10,
+                     max_iter: int = 200) -> np.ndarray:
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        y = M @ x
+        if damping is not None:
+            y = damping * y + (1 - damping) / n + damping * x[dangling].sum() / n
+        norm = np.abs(y).sum()
+        y = y / norm if norm > 0 else y
+        if np.abs(y - x).sum() < tol:
+            return y
+        x = y
+    return x
+
+def _component_eigenvector(M, comp: np.ndarray, n_comp: int, tol: float = 1e-10,
+                           max_iter: int = 500) -> np.ndarray:
+    # block power iteration: each component is normalised on its own so small ones do not underflow
+    x = 1.0 / np.bincount(comp, minlength=n_comp)[comp]
+    for _ in range(max_iter):
+        y = M @ x
+        y = y / np.bincount(comp, weights=np.abs(y), minlength=n_comp)[comp]
+        if np.abs(y - x).max() < tol:
+            break
+        x = y
+    top = np.zeros(n_comp)
+    np.maximum.at(top, comp, y)
+    return y / top[comp]
+
+def graph_centrality(A, ids: np.ndarray, damping: float = 0.85) -> pd.DataFrame:
+    import scipy.sparse as sp
+    from scipy.sparse.csgraph import connected_components
+    n = A.shape[0]
+    strength = np.asarray(A.sum(axis=1)).ravel()
+    n_comp, comp = connected_components(A, directed=False)
+    out = pd.DataFrame({
+        "Provider_Id": ids,
+        "degree": np.diff(A.indptr),
+        "strength": strength,
+        "component": comp,
+        "component_size": np.bincount(comp, minlength=n_comp)[comp],
+    })
+    if n == 0:
+        return out.assign(eigenvector=[], pagerank=[])
+    out["eigenvector"] = _component_eigenvector((A + sp.identity(n, format="csr")).tocsr(), comp, n_comp)
+    out.loc[out["component_size"] == 1, "eigenvector"] = 0.0
+    inv = np.divide(1.0, strength, out=np.zeros(n), where=strength > 0)
+    P = sp.csr_matrix(A.multiply(inv[:, None])).T.tocsr()
+    out["pagerank"] = _power_iteration(P, n, damping=damping, dangling=strength == 0)
+    return out
\ No newline at end of file
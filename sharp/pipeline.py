@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+import hashlib
+import importlib
+import inspect
+import json
+import pickle
+import time
+from sharp.profiling import profile_block
+
+CACHE_DIR = Path(".sharp_cache")
+FORMATS = {"pickle": ".pkl", "parquet": ".parquet"}
+
+def stage(name: str, fn, deps=(), params: dict | None = None, outputs=(), save=None, modules=(),
+          fmt: str = "pickle") -> dict:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown cache format {fmt!r} for stage {name}; expected one of {sorted(FORMATS)}")
+    return {
+        "name": name,
+        "fn": fn,
+        "deps": list(deps),
+        "params": params or {},
+        "outputs": list(outputs),
+        "save": save,
+        "modules": list(modules),
+        "fmt": fmt,
+    }
+
+def fingerprint_files(paths) -> str:
+    h = hashlib.sha256()
+    for p in sorted(Path(p) for p in paths):
+        st = p.stat()
+        h.update(f"{p.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+def _code_hash(s: dict) -> str:
+    h = hashlib.sha256(inspect.getsource(s["fn"]).encode())
+    if s["save"] is not None:
+        h.update(inspect.getsource(s["save"]).encode())
+    for m in s["modules"]:
+        mod = importlib.import_module(m) if isinstance(m, str) else m
+        h.update(Path(inspect.getsourcefile(mod)).read_bytes())
+    return h.hexdigest()
+
+def _toposort(stages: dict) -> list:
+    order, seen = [], set()
+    def visit(n, path=()):
+        if n in path:
+            raise ValueError(f"Cycle in pipeline at stage {n}")
+        if n in seen:
+            return
+        for d in stages[n]["deps"]:
+            if d not in stages:
+                raise KeyError(f"Stage {n} depends on unknown stage {d}")
+            visit(d, path + (n,))
+        seen.add(n)
+        order.append(n)
+    for n in stages:
+        visit(n)
+    return order
+
+def descendants(stages: dict, roots) -> set:
+    out = set(roots)
+    for n in _toposort(stages):
+        if any(d in out for d in stages[n]["deps"]):
+            out.add(n)
+    return out
+
+def stage_keys(stages: dict, fingerprint: str) -> dict:
+    keys = {}
+    for n in _toposort(stages):
+        s = stages[n]
+        payload = {
+            "name": n,
+            "code": _code_hash(s),
+            "params": s["params"],
+            "deps": [keys[d] for d in s["deps"]],
+            "data": fingerprint if not s["deps"] else None,
+        }
+        keys[n] = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return keys
+
+def _cache_path(cache_dir: Path, s: dict, key: str) -> Path:
+    return cache_dir / s["name"] / f"{key}{FORMATS[s['fmt']]}"
+
+def _load(path: Path):
+    if path.suffix == ".parquet":
+        import pandas as pd
+        return pd.read_parquet(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def _store(path: Path, value):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    if path.suffix == ".parquet":
+        value.to_parquet(tmp, index=False)
+    else:
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
+    for old in path.parent.iterdir():
+        if old != path and old.suffix in FORMATS.values():
+            old.unlink()
+
+def plan(stages: dict, fingerprint: str, only=None, since=None, force: bool = False,
+         cache_dir: Path = CACHE_DIR) -> dict:
+    unknown = set(only or ()) | set(since or ())
+    unknown -= set(stages)
+    if unknown:
+        raise KeyError(f"Unknown stages: {sorted(unknown)} (known: {list(stages)})")
+    keys = stage_keys(stages, fingerprint)
+    targets = set(only) if only else set(stages)
+    forced = set(stages) if force else set()
+    if since:
+        forced |= descendants(stages, since)
+        targets |= descendants(stages, since)
+    run = set()
+    for n in reversed(_toposort(stages)):
+        needed = n in targets or any(n in stages[m]["deps"] for m in run)
+        if not needed:
+            continue
+        if n in forced or not _cache_path(cache_dir, stages[n], keys[n]).exists():
+            run.add(n)
+        elif n in targets and only:
+            run.add(n)
+    load = {d for n in run for d in stages[n]["deps"] if d not in run}
+    return {"keys": keys, "run": run, "load": load, "targets": targets}
+
+def run_pipeline(stages: dict, fingerprint: str, only=None, since=None, force: bool = False,
+                 max_workers: int = 4, cache_dir: Path = CACHE_DIR, out_dir: Path | None = None,
+                 log=print) -> dict:
+    cache_dir = Path(cache_dir)
+    p = plan(stages, fingerprint, only=only, since=since, force=force, cache_dir=cache_dir)
+    keys, todo = p["keys"], set(p["run"])
+    results = {n: _load(_cache_path(cache_dir, stages[n], keys[n])) for n in p["load"]}
+    timings = {}
+    def execute(n):
+        s = stages[n]
+        t0 = time.perf_counter()
+        with profile_block(f"stage:{n}"):
+            value = s["fn"]({d: results[d] for d in s["deps"]}, **s["params"])
+            _store(_cache_path(cache_dir, stages[n], keys[n]), value)
+        return value, time.perf_counter() - t0
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        running = {}
+        while todo or running:
+            ready = [n for n in _toposort(stages) if n in todo and all(d in results for d in stages[n]["deps"])]
+            for n in ready:
+                todo.discard(n)
+                running[ex.submit(execute, n)] = n
+            if not running:
+                raise RuntimeError(f"Pipeline stalled with pending stages {sorted(todo)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                n = running.pop(f)
+                results[n], timings[n] = f.result()
+                log(f"[{n}] {timings[n]:.2f}s")
+    if out_dir is not None:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(exist_ok=True)
+        for n in _toposort(stages):
+            s = stages[n]
+            if s["save"] is None or n not in p["targets"]:
+                continue
+            missing = any(not (out_dir / o).exists() for o in s["outputs"])
+            if n in p["run"] or missing:
+                if n not in results:
+                    results[n] = _load(_cache_path(cache_dir, stages[n], keys[n]))
+                with profile_block(f"save:{n}"):
+                    s["save"](results[n], out_dir)
+    for n in sorted(p["targets"] - set(timings)):
+        log(f"[{n}] cached {keys[n]}")
+    return {"results": results, "keys": keys, "ran": sorted(p["run"]), "timings": timings}
\ No newline at end of file
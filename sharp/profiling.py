@@ -0,0 +1,283 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_ENV = "SHARP_PROFILE"
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+_STATE = {"enabled": os.environ.get(PROFILE_ENV, "") not in ("", "0"), "records": []}
+_LOCK = threading.Lock()
+_STACK = ContextVar("sharp_profile_stack", default=())
+
+def enable():
+    _STATE["enabled"] = True
+
+def disable():
+    _STATE["enabled"] = False
+
+def enabled() -> bool:
+    return _STATE["enabled"]
+
+def reset():
+    with _LOCK:
+        _STATE["records"] = []
+
+def records() -> list:
+    with _LOCK:
+        return list(_STATE["records"])
+
+def _rss_mb() -> float | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
+def _peak_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+def _rows(x) -> int | None:
+    if isinstance(x, (str, bytes, dict, Path)) or x is None:
+        return None
+    if isinstance(x, tuple):
+        return _rows(x[0]) if x else None
+    shape = getattr(x, "shape", None)
+    if shape is not None and len(shape):
+        return int(shape[0])
+    return len(x) if isinstance(x, list) else None
+
+def _delta(a, b):
+    return None if a is None or b is None else b - a
+
+@contextmanager
+def _record(name: str, rows_in=None):
+    stack = _STACK.get()
+    token = _STACK.set(stack + (name,))
+    rec = {"name": name, "parent": stack[-1] if stack else None, "depth": len(stack), "rows_in": rows_in,
+           "rows_out": None, "thread": threading.current_thread().name}
+    rss0, peak0 = _rss_mb(), _peak_mb()
+    c0, t0 = time.process_time(), time.perf_counter()
+    rec["start"] = time.time()
+    try:
+        yield rec
+    finally:
+        rec["wall_s"] = time.perf_counter() - t0
+        rec["cpu_s"] = time.process_time() - c0
+        rec["rss_delta_mb"] = _delta(rss0, _rss_mb())
+        rec["peak_rss_delta_mb"] = _delta(peak0, _peak_mb())
+        _STACK.reset(token)
+        with _LOCK:
+            _STATE["records"].append(rec)
+
+def profile_block(name: str, rows_in=None):
+    return _record(name, rows_in) if _STATE["enabled"] else nullcontext({})
+
+def profiled(fn=None, *, name: str | None = None):
+    if fn is None:
+        return functools.partial(profiled, name=name)
+    label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _STATE["enabled"]:
+            return fn(*args, **kwargs)
+        with _record(label, _rows(args[0]) if args else None) as rec:
+            out = fn(*args, **kwargs)
+            rec["rows_out"] = _rows(out)
+            return out
+    wrapper._sharp_profiled = True
+    return wrapper
+
+def instrument(package: str = "sharp", skip=("sharp.profiling",)) -> int:
+    wrapped = {}
+    for modname, mod in list(sys.modules.items()):
+        if mod is None or not (modname == package or modname.startswith(package + ".")) or modname in skip:
+            continue
+        for attr, obj in list(vars(mod).items()):
+            if (attr.startswith("_") or not inspect.isfunction(obj) or obj.__module__ != modname
+                    or getattr(obj, "_sharp_profiled", False)):
+                continue
+            w = wrapped.setdefault(id(obj), (obj, profiled(obj)))[1]
+            setattr(mod, attr, w)
+    for mod in list(sys.modules.values()):
+        g = getattr(mod, "__dict__", None)
+        if not isinstance(g, dict):
+            continue
+        for attr, obj in list(g.items()):
+            hit = wrapped.get(id(obj)) if inspect.isfunction(obj) else None
+            if hit is not None and hit[0] is obj:
+                g[attr] = hit[1]
+    return len(wrapped)
+
+def summarize(recs: list | None = None) -> list:
+    recs = records() if recs is None else recs
+    agg = {}
+    for r in recs:
+        a = agg.setdefault(r["name"], {"name": r["name"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0,
+                                        "rows_in": 0, "rows_out": 0, "peak_rss_delta_mb": 0.0, "depth": r["depth"]})
+        a["calls"] += 1
+        a["wall_s"] += r["wall_s"]
+        a["cpu_s"] += r["cpu_s"]
+        a["max_wall_s"] = max(a["max_wall_s"], r["wall_s"])
+        a["rows_in"] += r["rows_in"] or 0
+        a["rows_out"] += r["rows_out"] or 0
+        a["peak_rss_delta_mb"] = max(a["peak_rss_delta_mb"], r["peak_rss_delta_mb"] or 0.0)
+        a["depth"] = min(a["depth"], r["depth"])
+    return sorted(agg.values(), key=lambda a: -a["wall_s"])
+
+def format_table(summary: list, limit: int = 40) -> str:
+    head = f"{'name':<52} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rows in':>11} {'rows out':>11} {'peak +MB':>9}"
+    lines = [head, "-" * len(head)]
+    for a in summary[:limit]:
+        lines.append(f"{a['name'][-52:]:<52} {a['calls']:>6} {a['wall_s']:>9.3f} {a['cpu_s']:>9.3f} "
+                     f"{a['rows_in']:>11,} {a['rows_out']:>11,} {a['peak_rss_delta_mb']:>9.1f}")
+    return "\n".join(lines)
+
+def write_report(out_dir, prefix: str = "profile_report", meta: dict | None = None) -> tuple:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    recs = records()
+    summary = summarize(recs)
+    payload = {"meta": meta or {}, "summary": summary, "records": recs, "peak_rss_mb": _peak_mb()}
+    js, txt = out_dir / f"{prefix}.json", out_dir / f"{prefix}.txt"
+    js.write_text(json.dumps(payload, indent=1, default=str))
+    txt.write_text(format_table(summary))
+    return js, txt
+
+class StackSampler:
+    def __init__(self, interval_ms: float = 5.0, thread_id: int | None = None):
+        self.interval = interval_ms / 1000.0
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stack(self, frame) -> str:
+        parts = []
+        while frame is not None:
+            c = frame.f_code
+            parts.append(f"{Path(c.co_filename).name}:{c.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._stack(frame)] += 1
+                self.samples += 1
+
+    def start(self):
+        self.thread_id = self.thread_id or threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="sharp-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def folded(self) -> str:
+        return "\n".join(f"{s} {n}" for s, n in self.stacks.most_common())
+
+    def top(self, limit: int = 25) -> list:
+        own, total = Counter(), Counter()
+        for s, n in self.stacks.items():
+            frames = s.split(";")
+            own[frames[-1]] += n
+            for f in set(frames):
+                total[f] += n
+        return [{"frame": f, "self": n, "total": total[f], "self_pct": 100.0 * n / max(self.samples, 1)}
+                for f, n in own.most_common(limit)]
+
+@contextmanager
+def sample_profile(path, interval_ms: float = 5.0):
+    s = StackSampler(interval_ms).start()
+    try:
+        yield s
+    finally:
+        s.stop()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(s.folded())
+
+def sampled(fn, path, interval_ms: float = 5.0):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with sample_profile(path, interval_ms) as s:
+            out = fn(*args, **kwargs)
+        print(f"[profile] {s.samples} samples -> {path}")
+        for t in s.top(15):
+            print(f"  {t['self_pct']:5.1f}%  {t['frame']}")
+        return out
+    return wrapper
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS, labels=("route", "method")):
+        self.name, self.help, self.buckets, self.labels = name, help_text, list(buckets), tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            s = self._series.setdefault(tuple(label_values), {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0})
+            i = next((k for k, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+            s["counts"][i] += 1
+            s["sum"] += value
+
+    def _labels(self, values, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in zip(self.labels, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, s in sorted(self._series.items()):
+                cum = 0
+                for b, c in zip(self.buckets + ["+Inf"], s["counts"]):
+                    cum += c
+                    le = 'le="%s"' % b
+                    lines.append(f"{self.name}_bucket{self._labels(values, le)} {cum}")
+                lines.append(f"{self.name}_sum{self._labels(values)} {s['sum']}")
+                lines.append(f"{self.name}_count{self._labels(values)} {cum}")
+        return "\n".join(lines)
+
+class Counters:
+    def __init__(self, name: str, help_text: str, labels=("route", "method", "status")):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[tuple(label_values)] += amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._values.items()):
+                lab = ",".join(f'{k}="{x}"' for k, x in zip(self.labels, values))
+                lines.append(f"{self.name}{{{lab}}} {v}")
+        return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,66 @@
+from pathlib import Path
+import json
+import numpy as np
+import pandas as pd
+from sharp.versioning import new_version_dir, publish, current_dir
+
+PROVIDER_INDEX_DIR = Path("outputs/provider_index")
+
+def write_provider_index(df: pd.DataFrame, root=PROVIDER_INDEX_DIR) -> Path:
+    import pyarrow as pa
+    ids = df["Provider_Id"].to_numpy(np.int64)
+    order = np.lexsort((df["year"].to_numpy(), ids))
+    rows = df.take(order).reset_index(drop=True)
+    ids = ids[order]
+    uniq, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+    last = starts + counts - 1
+    directory = pd.DataFrame({
+        "Provider_Id": uniq,
+        "start": starts.astype(np.int64),
+        "count": counts.astype(np.int64),
+        "Provider_Name": rows["Provider_Name"].astype(str).to_numpy()[last],
+        "Provider_City": rows["Provider_City"].astype(str).to_numpy()[last] if "Provider_City" in rows else "",
+        "Provider_State": rows["Provider_State"].astype(str).to_numpy()[last],
+    })
+    tmp = new_version_dir(root)
+    tbl = pa.Table.from_pandas(rows, preserve_index=False)
+    with pa.OSFile(str(tmp / "rows.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, tbl.schema) as w:
+            w.write_table(tbl, max_chunksize=1 << 16)
+    directory.to_parquet(tmp / "providers.parquet", index=False)
+    (tmp / "meta.json").write_text(json.dumps({"n_rows": len(rows), "n_providers": len(directory)}))
+    return publish(tmp)
+
+def load_provider_index(root=PROVIDER_INDEX_DIR) -> dict | None:
+    import pyarrow as pa
+    d = current_dir(root)
+    if d is None or not (d / "meta.json").exists():
+        return None
+    directory = pd.read_parquet(d / "providers.parquet")
+    idx = {
+        "version": d.name,
+        "rows": pa.ipc.open_file(pa.memory_map(str(d / "rows.arrow"), "r")).read_all(),
+        "providers": directory,
+        "ids": directory["Provider_Id"].to_numpy(np.int64),
+        "starts": directory["start"].to_numpy(np.int64),
+        "counts": directory["count"].to_numpy(np.int64),
+    }
+    idx.update(json.loads((d / "meta.json").read_text()))
+    return idx
+
+def provider_labels(idx: dict) -> dict:
+    p = idx["providers"]
+    return dict(zip(
+        p["Provider_Id"].tolist(),
+        (p["Provider_Name"] + " (" + p["Provider_City"] + ", " + p["Provider_State"] + ") #"
+         + p["Provider_Id"].astype(str)).tolist(),
+    ))
+
+def provider_history(idx: dict, provider_id: int, columns: list | None = None) -> pd.DataFrame | None:
+    i = np.searchsorted(idx["ids"], provider_id)
+    if i >= len(idx["ids"]) or idx["ids"][i] != provider_id:
+        return None
+    part = idx["rows"].slice(int(idx["starts"][i]), int(idx["counts"][i]))
+    if columns is not None:
+        part = part.select(columns)
+    return part.to_pandas()
\ No newline at end of file
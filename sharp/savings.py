@@ -1,6 +1,54 @@
+import numpy as np
 import pandas as pd
+from sharp.backend import check_backend, query
 
-def tam_and_top_hospitals(df: pd.DataFrame) -> tuple:
+TAM_SQL = """
+with s as (
+    select DRG_Code, avg(Average_Total_Payments) as atp, sum(Total_Discharges) as td
+    from {cms} where payment_ratio < 0.3 group by 1
+), n as (
+    select DRG_Code, avg(Average_Total_Payments) as atp
+    from {cms} where payment_ratio > 0.5 group by 1
+)
+select coalesce(sum((s.atp - n.atp) * s.td), 0) as tam
+from s join n using (DRG_Code)
+"""
+
+TOP_HOSPITALS_SQL = """
+with m as (
+    select Provider_Id, Provider_Name, Provider_State, Total_Discharges, Average_Total_Payments,
+           median(Average_Total_Payments) over (partition by DRG_Code) as drg_median
+    from {cms}
+    where DRG_Code is not null
+)
+select Provider_Id, Provider_Name, Provider_State,
+       sum((Average_Total_Payments - drg_median) * Total_Discharges) as opportunity
+from m
+group by 1, 2, 3
+order by opportunity desc
+limit 100
+"""
+
+READMIT_RATIO_SQL = """
+select sum(case when payment_ratio < 0.3 then Total_Discharges else 0 end) as low,
+       sum(case when payment_ratio >= 0.3 then Total_Discharges else 0 end) as high
+from {cms} where is_readmit_prone
+"""
+
+def readmit_ratio(df: pd.DataFrame, backend: str = "pandas") -> float:
+    if check_backend(backend) == "duckdb":
+        r = query(READMIT_RATIO_SQL, df).iloc[0]
+        low, high = float(r["low"] or 0), float(r["high"] or 0)
+    else:
+        d = df[df["is_readmit_prone"]]
+        low = d.loc[d["payment_ratio"] < 0.3, "Total_Discharges"].sum()
+        high = d.loc[d["payment_ratio"] >= 0.3, "Total_Discharges"].sum()
+    return low / (high + 1e-6)
+
+def tam_and_top_hospitals(df: pd.DataFrame, backend: str = "pandas") -> tuple:
+    if check_backend(backend) == "duckdb":
+        tam = float(query(TAM_SQL, df)["tam"].iloc[0])
+        return tam, query(TOP_HOSPITALS_SQL, df)
     stressed = df[df["payment_ratio"] < 0.3].groupby("DRG_Code").agg(
         Average_Total_Payments=("Average_Total_Payments", "mean"),
         Total_Discharges=("Total_Discharges", "sum"),
@@ -11,13 +59,164 @@ def tam_and_top_hospitals(df: pd.DataFrame) -> tuple:
     )
     s = (stressed["Average_Total_Payments"] - normal["Average_Total_Payments"]) * stressed["Total_Discharges"]
     tam = s.sum()
-    by_hospital = df.copy()
-    by_hospital["delta_cost"] = by_hospital["Average_Total_Payments"] - by_hospital.groupby("DRG_Code")["Average_Total_Payments"].transform("median")
-    by_hospital["opportunity"] = by_hospital["delta_cost"] * by_hospital["Total_Discharges"]
+    d = df[df["DRG_Code"].notna()]
+    by_hospital = d[["Provider_Id", "Provider_Name", "Provider_State"]].copy()
+    delta_cost = d["Average_Total_Payments"] - d.groupby("DRG_Code")["Average_Total_Payments"].transform("median")
+    by_hospital["opportunity"] = delta_cost * d["Total_Discharges"]
     ranking = (
-        by_hospital.groupby(["Provider_Id", "Provider_Name", "Provider_State"]).agg(
+        by_hospital.groupby(["Provider_Id", "Provider_Name", "Provider_State"], observed=True).agg(
             opportunity=("opportunity", "sum")
         ).reset_index().sort_values("opportunity", ascending=False)
     )
     top100 = ranking.head(100)
-    return tam, top100
\ No newline at end of file
+    return tam, top100
+
+STRESSED_MAX = 0.3
+NORMAL_MIN = 0.5
+SIZES = ["small", "medium", "large", "nan"]
+
+def _codes(values, categories=None) -> tuple:
+    codes, uniq = pd.factorize(values, sort=True) if categories is None else (
+        pd.Categorical(values, categories=categories).codes, pd.Index(categories))
+    codes = np.asarray(codes, dtype=np.int32)
+    codes[codes < 0] = len(uniq)
+    return codes, list(uniq)
+
+def _sizes(df: pd.DataFrame) -> np.ndarray:
+    size = df["hospital_size_category"]
+    size = size.astype(str) if not isinstance(size.dtype, pd.CategoricalDtype) else size.astype(object).fillna("nan")
+    return _codes(size.astype(str), SIZES)[0]
+
+def build_savings_engine(df: pd.DataFrame) -> dict:
+    drg, drgs = _codes(df["DRG_Code"].astype(object))
+    state, states = _codes(df["Provider_State"].astype(str))
+    size = _sizes(df)
+    atp = df["Average_Total_Payments"].to_numpy(np.float64)
+    ratio = df["payment_ratio"].to_numpy(np.float64)
+    td = df["Total_Discharges"].to_numpy(np.float64)
+    has_drg = drg < len(drgs)
+    ok = has_drg & ~np.isnan(ratio)
+    o = np.lexsort((ratio[ok], drg[ok]))
+    rows = {
+        "drg": drg[ok][o], "ratio": ratio[ok][o], "state": state[ok][o], "size": size[ok][o],
+        "atp": np.nan_to_num(atp[ok][o]), "atp_n": (~np.isnan(atp[ok][o])).astype(np.float64), "td": td[ok][o],
+    }
+    bounds = np.searchsorted(rows["drg"], np.arange(len(drgs) + 1))
+    cum = {k: np.concatenate([[0.0], np.cumsum(rows[k])]) for k in ("atp", "atp_n", "td")}
+    ok = has_drg & ~np.isnan(atp)
+    o = np.lexsort((atp[ok], drg[ok]))
+    med = {"drg": drg[ok][o], "atp": atp[ok][o], "state": state[ok][o], "size": size[ok][o]}
+    keys = ["Provider_Id", "Provider_Name", "Provider_State", "DRG_Code", "hospital_size_category"]
+    c = df.loc[ok, keys].assign(atp_td=atp[ok] * td[ok], td=td[ok])
+    c = c.groupby(keys, observed=True, dropna=False, sort=False)[["atp_td", "td"]].sum().reset_index()
+    prov = c.groupby(["Provider_Id", "Provider_Name", "Provider_State"], observed=True, sort=False).ngroup().to_numpy()
+    providers = c.drop_duplicates(["Provider_Id", "Provider_Name", "Provider_State"])[
+        ["Provider_Id", "Provider_Name", "Provider_State"]].reset_index(drop=True)
+    contrib = {
+        "provider": prov,
+        "drg": _codes(c["DRG_Code"].astype(object), drgs)[0],
+        "state": _codes(c["Provider_State"].astype(str), states)[0],
+        "size": _sizes(c),
+        "atp_td": c["atp_td"].to_numpy(np.float64),
+        "td": c["td"].to_numpy(np.float64),
+    }
+    return {"drgs": drgs, "states": states, "rows": rows, "bounds": bounds, "cum": cum, "median": med,
+            "contrib": contrib, "providers": providers}
+
+def _ratio_keys(engine: dict) -> dict:
+    if "ratio_key" not in engine:
+        r = engine["rows"]["ratio"]
+        lo = float(r.min()) if len(r) else 0.0
+        span = float(2.0 ** np.ceil(np.log2(float(r.max()) - lo + 1.0))) if len(r) else 1.0
+        engine["ratio_key"] = {"key": engine["rows"]["drg"] * span + (r - lo), "min": lo, "span": span}
+    return engine["ratio_key"]
+
+def _drg_bounds(engine: dict, t, side: str) -> np.ndarray:
+    k, b = _ratio_keys(engine), engine["bounds"]
+    q = np.arange(len(b) - 1) * k["span"] + (np.asarray(t, dtype=np.float64)[..., None] - k["min"])
+    return np.clip(np.searchsorted(k["key"], q, side), b[:-1], b[1:])
+
+def _allow(selected, universe: list) -> np.ndarray | None:
+    if not selected:
+        return None
+    pos = {v: i for i, v in enumerate(universe)}
+    t = np.zeros(len(universe) + 1, dtype=bool)
+    t[[pos[v] for v in map(str, selected) if v in pos]] = True
+    return t
+
+def _mask(part: dict, tables: dict) -> np.ndarray | None:
+    m = None
+    for k, t in tables.items():
+        if t is not None:
+            m = t[part[k]] if m is None else m & t[part[k]]
+    return m
+
+def _tables(engine: dict, states=None, drgs=None, sizes=None) -> dict:
+    return {"state": _allow(states, engine["states"]), "drg": _allow(drgs, engine["drgs"]), "size": _allow(sizes, SIZES)}
+
+def tam_by_drg(engine: dict, states=None, drgs=None, sizes=None, stressed_max: float = STRESSED_MAX,
+               normal_min: float = NORMAL_MIN) -> pd.DataFrame:
+    n = len(engine["drgs"])
+    m = _mask(engine["rows"], _tables(engine, states, drgs, sizes))
+    if m is None:
+        b, cum = engine["bounds"], engine["cum"]
+        lo, hi = _drg_bounds(engine, stressed_max, "left"), _drg_bounds(engine, normal_min, "right")
+        s = {k: cum[k][lo] - cum[k][b[:-1]] for k in cum}
+        nrm = {k: cum[k][b[1:]] - cum[k][hi] for k in ("atp", "atp_n")}
+    else:
+        rows = engine["rows"]
+        s_m = m & (rows["ratio"] < stressed_max)
+        n_m = m & (rows["ratio"] > normal_min)
+        bc = lambda mask, k: np.bincount(rows["drg"][mask], weights=rows[k][mask], minlength=n)
+        s = {k: bc(s_m, k) for k in ("atp", "atp_n", "td")}
+        nrm = {k: bc(n_m, k) for k in ("atp", "atp_n")}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = pd.DataFrame({
+            "DRG_Code": engine["drgs"],
+            "stressed_atp": s["atp"] / s["atp_n"],
+            "normal_atp": nrm["atp"] / nrm["atp_n"],
+            "stressed_discharges": s["td"],
+        })
+    out["tam"] = (out["stressed_atp"] - out["normal_atp"]) * out["stressed_discharges"]
+    return out.dropna(subset=["tam"]).reset_index(drop=True)
+
+def tam_curve(engine: dict, thresholds, normal_min: float = NORMAL_MIN) -> pd.DataFrame:
+    t = np.asarray(thresholds, dtype=np.float64)
+    b, cum = engine["bounds"], engine["cum"]
+    lo, hi = _drg_bounds(engine, t, "left"), _drg_bounds(engine, normal_min, "right")
+    s = {k: cum[k][lo] - cum[k][b[:-1]] for k in cum}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normal = (cum["atp"][b[1:]] - cum["atp"][hi]) / (cum["atp_n"][b[1:]] - cum["atp_n"][hi])
+        tam = (s["atp"] / s["atp_n"] - normal) * s["td"]
+    return pd.DataFrame({"threshold": t, "tam": np.nansum(tam, axis=1)})
+
+def engine_tam(engine: dict, states=None, drgs=None, sizes=None, stressed_max: float = STRESSED_MAX,
+               normal_min: float = NORMAL_MIN) -> float:
+    return float(tam_by_drg(engine, states, drgs, sizes, stressed_max, normal_min)["tam"].sum())
+
+def drg_medians(engine: dict, states=None, drgs=None, sizes=None) -> np.ndarray:
+    med, n = engine["median"], len(engine["drgs"])
+    m = _mask(med, _tables(engine, states, drgs, sizes))
+    pos = np.arange(len(med["drg"])) if m is None else np.flatnonzero(m)
+    counts = np.bincount(med["drg"][pos], minlength=n)
+    starts = np.cumsum(counts) - counts
+    out = np.full(n, np.nan)
+    has = counts > 0
+    a = med["atp"][pos]
+    out[has] = 0.5 * (a[starts[has] + (counts[has] - 1) // 2] + a[starts[has] + counts[has] // 2])
+    return out
+
+def engine_top_hospitals(engine: dict, k: int = 100, states=None, drgs=None, sizes=None) -> pd.DataFrame:
+    c = engine["contrib"]
+    median = drg_medians(engine, states, drgs, sizes)
+    m = _mask(c, _tables(engine, states, drgs, sizes))
+    idx = np.arange(len(c["provider"])) if m is None else np.flatnonzero(m)
+    v = c["atp_td"][idx] - median[c["drg"][idx]] * c["td"][idx]
+    opp = np.bincount(c["provider"][idx], weights=v, minlength=len(engine["providers"]))
+    present = np.zeros(len(opp), dtype=bool)
+    present[c["provider"][idx]] = True
+    cand = np.flatnonzero(present)
+    if len(cand) > k:
+        cand = cand[np.argpartition(-opp[cand], k - 1)[:k]]
+    cand = cand[np.argsort(-opp[cand], kind="stable")]
+    return engine["providers"].iloc[cand].assign(opportunity=opp[cand]).reset_index(drop=True)
\ No newline at end of file
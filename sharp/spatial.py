@@ -0,0 +1,191 @@
+from pathlib import Path
+import hashlib
+import numpy as np
+import pandas as pd
+
+CENTROIDS_PATH = Path(__file__).with_name("zip_centroids.csv.gz")
+WEIGHTS_CACHE_DIR = Path(".sharp_cache") / "spatial"
+PERM_BLOCK = 128
+LOCAL_CELLS = 1 << 22
+SPATIAL_VARS = ["payment_ratio", "financial_stress_index"]
+_CENTROIDS = {}
+
+def load_centroids(path=CENTROIDS_PATH) -> pd.DataFrame:
+    key = str(path)
+    if key not in _CENTROIDS:
+        c = pd.read_csv(path, dtype={"zip": np.int32, "lat": np.float64, "lon": np.float64, "state": str})
+        _CENTROIDS[key] = c.sort_values("zip", ignore_index=True)
+    return _CENTROIDS[key]
+
+def zip_coords(zips, centroids: pd.DataFrame | None = None) -> np.ndarray:
+    c = load_centroids() if centroids is None else centroids
+    zips = np.asarray(zips, dtype=np.int64)
+    table = c["zip"].to_numpy(np.int64)
+    latlon = c[["lat", "lon"]].to_numpy()
+    i = np.clip(np.searchsorted(table, zips), 0, len(table) - 1)
+    out = np.where((table[i] == zips)[:, None], latlon[i], np.nan)
+    miss = np.isnan(out[:, 0])
+    if miss.any():
+        z3 = pd.DataFrame(latlon, columns=["lat", "lon"]).groupby(table // 100).mean()
+        out[miss] = z3.reindex(zips[miss] // 100).to_numpy()
+    return out
+
+def _unit_vectors(latlon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(latlon[:, 0]), np.radians(latlon[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+def knn_weights(zips, k: int = 8, centroids: pd.DataFrame | None = None):
+    import scipy.sparse as sp
+    from scipy.spatial import cKDTree
+    zips = np.asarray(zips, dtype=np.int64)
+    n = len(zips)
+    xyz = _unit_vectors(zip_coords(zips, centroids))
+    ok = np.flatnonzero(~np.isnan(xyz[:, 0]))
+    k = min(k, len(ok) - 1)
+    if k < 1:
+        return sp.csr_matrix((n, n))
+    _, nb = cKDTree(xyz[ok]).query(xyz[ok], k=k + 1)
+    rows = np.repeat(ok, k)
+    cols = ok[nb[:, 1:]].ravel()
+    return sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+
+def zip3_weights(zips):
+    import scipy.sparse as sp
+    zips = np.asarray(zips, dtype=np.int64)
+    n = len(zips)
+    g = zips // 100
+    order = np.argsort(g, kind="stable")
+    starts = np.flatnonzero(np.r_[True, g[order][1:] != g[order][:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    rows, cols = [], []
+    for s, m in zip(starts[sizes > 1], sizes[sizes > 1]):
+        i, j = np.nonzero(~np.eye(m, dtype=bool))
+        rows.append(order[s + i])
+        cols.append(order[s + j])
+    if not rows:
+        return sp.csr_matrix((n, n))
+    r, c = np.concatenate(rows), np.concatenate(cols)
+    return sp.csr_matrix((np.ones(len(r)), (r, c)), shape=(n, n))
+
+def row_standardize(W):
+    import scipy.sparse as sp
+    s = np.asarray(W.sum(axis=1)).ravel()
+    inv = np.divide(1.0, s, out=np.zeros_like(s), where=s > 0)
+    return sp.diags(inv) @ W
+
+def _weights_key(zips: np.ndarray, method: str, k: int) -> str:
+    h = hashlib.sha256(np.ascontiguousarray(zips, dtype=np.int64).tobytes())
+    h.update(f"{method}:{k}".encode())
+    if method == "knn":
+        st = CENTROIDS_PATH.stat()
+        h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+def build_weights(zips, method: str = "knn", k: int = 8, cache_dir=WEIGHTS_CACHE_DIR) -> dict:
+    import scipy.sparse as sp
+    zips = np.unique(np.asarray(zips, dtype=np.int64))
+    if method not in ("knn", "zip3"):
+        raise ValueError(f"Unknown weights method {method!r}; expected 'knn' or 'zip3'")
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / f"{method}_{_weights_key(zips, method, k)}.npz"
+        if path.exists():
+            return {"zips": zips, "W": sp.load_npz(path).tocsr(), "method": method, "k": k}
+    W = knn_weights(zips, k) if method == "knn" else zip3_weights(zips)
+    W = row_standardize(W).tocsr()
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        sp.save_npz(tmp, W)
+        tmp.replace(path)
+    return {"zips": zips, "W": W, "method": method, "k": k}
+
+def _permuted(z: np.ndarray, n_perm: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.permuted(np.broadcast_to(z[:, None], (len(z), n_perm)), axis=0)
+
+def _padded_weights(W) -> np.ndarray:
+    k = np.diff(W.indptr)
+    wpad = np.zeros((W.shape[0], int(k.max()) if len(k) else 0))
+    wpad[np.repeat(np.arange(W.shape[0]), k), np.arange(W.nnz) - np.repeat(W.indptr[:-1], k)] = W.data
+    return wpad
+
+def _local_p_sim(W, z: np.ndarray, local: np.ndarray, m2: float, permutations: int,
+                 rng: np.random.Generator) -> np.ndarray:
+    n = len(z)
+    wpad = _padded_weights(W.tocsr())
+    kmax = min(wpad.shape[1], n - 1)
+    if kmax < 1:
+        return np.ones(n)
+    wpad = wpad[:, :kmax]
+    above = np.zeros(n, dtype=np.int64)
+    for start in range(0, permutations, PERM_BLOCK):
+        p = min(PERM_BLOCK, permutations - start)
+        R = rng.permuted(rng.random((p, n - 1)).argpartition(kmax - 1, axis=1)[:, :kmax], axis=1)
+        step = max(1, LOCAL_CELLS // (p * kmax))
+        for s in range(0, n, step):
+            i = np.arange(s, min(n, s + step))
+            ids = R[None] + (R[None] >= i[:, None, None])
+            Li = z[i, None] * np.einsum("ipk,ik->ip", z[ids], wpad[i]) / m2
+            loc = local[i, None]
+            above[i] += np.where(loc >= 0, Li >= loc, Li <= loc).sum(axis=1)
+    return (above + 1) / (permutations + 1)
+
+def morans_i(W, x, permutations: int = 999, random_state: int = 42) -> dict:
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    z = x - x.mean()
+    zz = z @ z
+    s0 = W.sum()
+    scale = n / s0 if s0 > 0 else np.nan
+    lag = W @ z
+    I = scale * (z @ lag) / zz if zz > 0 else np.nan
+    m2 = zz / n
+    local = z * lag / m2 if m2 > 0 else np.full(n, np.nan)
+    out = {"I": I, "EI": -1.0 / (n - 1) if n > 1 else np.nan, "n": n, "local_I": local, "lag": lag + x.mean()}
+    if not permutations or not np.isfinite(I):
+        out.update(p_sim=np.nan, local_p_sim=np.full(n, np.nan))
+        return out
+    rng = np.random.default_rng(random_state)
+    above = 0
+    for start in range(0, permutations, PERM_BLOCK):
+        Z = _permuted(z, min(PERM_BLOCK, permutations - start), rng)
+        L = W @ Z
+        I_p = scale * np.einsum("ij,ij->j", Z, L) / zz
+        above += np.count_nonzero(I_p >= I) if I >= out["EI"] else np.count_nonzero(I_p <= I)
+    out["p_sim"] = (above + 1) / (permutations + 1)
+    out["local_p_sim"] = _local_p_sim(W, z, local, m2, permutations, rng)
+    return out
+
+def _quadrant(z: np.ndarray, lag_z: np.ndarray) -> np.ndarray:
+    return np.select([(z > 0) & (lag_z > 0), (z <= 0) & (lag_z > 0), (z <= 0) & (lag_z <= 0)], ["HH", "LH", "LL"], "HL")
+
+def zip_year_means(df: pd.DataFrame, variables=SPATIAL_VARS) -> pd.DataFrame:
+    return df.groupby(["Provider_Zip_Code", "year"])[list(variables)].mean().reset_index()
+
+def moran_by_year(df: pd.DataFrame, variables=SPATIAL_VARS, method: str = "knn", k: int = 8,
+                  permutations: int = 999, random_state: int = 42, cache_dir=WEIGHTS_CACHE_DIR) -> tuple:
+    c = zip_year_means(df, variables)
+    glob, local = [], []
+    for year, g in c.groupby("year"):
+        g = g.sort_values("Provider_Zip_Code")
+        w = build_weights(g["Provider_Zip_Code"].to_numpy(), method, k, cache_dir)
+        for v in variables:
+            x = g[v].to_numpy(np.float64)
+            ok = ~np.isnan(x)
+            W = row_standardize(w["W"][ok][:, ok]).tocsr() if not ok.all() else w["W"]
+            r = morans_i(W, x[ok], permutations, random_state)
+            glob.append({"year": year, "variable": v, "I": r["I"], "EI": r["EI"], "p_sim": r["p_sim"], "n": r["n"]})
+            z = x[ok] - x[ok].mean()
+            local.append(pd.DataFrame({
+                "Provider_Zip_Code": g["Provider_Zip_Code"].to_numpy()[ok],
+                "year": year,
+                "variable": v,
+                "value": x[ok],
+                "lag": r["lag"],
+                "local_I": r["local_I"],
+                "p_sim": r["local_p_sim"],
+                "quadrant": _quadrant(z, r["lag"] - x[ok].mean()),
+            }))
+    glob = pd.DataFrame(glob)
+    local = pd.concat(local, ignore_index=True) if local else pd.DataFrame()
+    return glob, local
\ No newline at end of file
@@ -0,0 +1,55 @@
+from pathlib import Path
+import json
+import os
+import numpy as np
+import pandas as pd
+from sharp.model import design_matrix
+from sharp.versioning import new_version_dir, publish, current_dir, POINTER
+
+STORE_DIR = Path("models/feature_store")
+YEAR_BASE = 10000
+
+def _key(provider_id, year) -> int:
+    return int(provider_id) * YEAR_BASE + int(year)
+
+def write_feature_store(panel: pd.DataFrame, feats: list, root=STORE_DIR) -> Path:
+    p = panel.sort_values(["Provider_Id", "year"]).reset_index(drop=True)
+    tmp = new_version_dir(root)
+    X = design_matrix(p, len(p), feats)
+    np.save(tmp / "X.npy", np.ascontiguousarray(X))
+    np.save(tmp / "keys.npy", p["Provider_Id"].to_numpy(np.int64) * YEAR_BASE + p["year"].to_numpy(np.int64))
+    np.save(tmp / "provider_name.npy", p["Provider_Name"].astype(str).to_numpy("U"))
+    np.save(tmp / "provider_state.npy", p["Provider_State"].astype(str).to_numpy("U"))
+    meta = {"features": feats, "rows": len(p), "years": sorted(int(y) for y in p["year"].unique())}
+    (tmp / "meta.json").write_text(json.dumps(meta))
+    return publish(tmp)
+
+def load_feature_store(root=STORE_DIR) -> dict | None:
+    d = current_dir(root)
+    if d is None or not (d / "meta.json").exists():
+        return None
+    keys = np.load(d / "keys.npy")
+    store = {
+        "version": d.name,
+        "X": np.load(d / "X.npy", mmap_mode="r"),
+        "keys": keys,
+        "provider_name": np.load(d / "provider_name.npy", mmap_mode="r"),
+        "provider_state": np.load(d / "provider_state.npy", mmap_mode="r"),
+        "index": dict(zip(keys.tolist(), range(len(keys)))),
+        "latest": {},
+        "predictions": {},
+    }
+    for k in keys.tolist():
+        store["latest"][k // YEAR_BASE] = k
+    store.update(json.loads((d / "meta.json").read_text()))
+    return store
+
+def store_mtime(root=STORE_DIR) -> float:
+    try:
+        return os.stat(Path(root) / POINTER).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+def lookup(store: dict, provider_id: int, year: int | None = None) -> int | None:
+    k = store["latest"].get(int(provider_id)) if year is None else _key(provider_id, year)
+    return None if k is None else store["index"].get(k)
\ No newline at end of file
@@ -0,0 +1,170 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from sharp.advanced import survival_dataset
+
+SURVIVAL_COVARIATES = ["payment_ratio", "medicare_coverage_ratio", "avg_charges_log", "state_avg_payment_ratio",
+                       "drg_diversity_index"]
+KM_STRATA = ["Provider_State", "hospital_size_category", "stress_quartile"]
+
+def survival_frame(df: pd.DataFrame, panel: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    s = survival_dataset(df, backend=backend)
+    p = panel.sort_values(["Provider_Id", "year"]).drop_duplicates("Provider_Id")
+    cols = ["Provider_Id", "Provider_State", "hospital_size_category", "financial_stress_index"] + SURVIVAL_COVARIATES
+    s = s.merge(p[cols], on="Provider_Id", how="left")
+    s["Provider_State"] = s["Provider_State"].astype(str)
+    s["hospital_size_category"] = s["hospital_size_category"].astype(str)
+    s["stress_quartile"] = pd.qcut(s["financial_stress_index"], 4, labels=["Q1", "Q2", "Q3", "Q4"]).astype(str)
+    return s
+
+def _segment_cumsum(x: np.ndarray, first: np.ndarray) -> np.ndarray:
+    c = np.cumsum(x)
+    seg = np.cumsum(first) - 1
+    return c - (c - x)[first][seg]
+
+def kaplan_meier(duration, event, groups=None, alpha: float = 0.05) -> pd.DataFrame:
+    t = np.asarray(duration, dtype=np.float64)
+    e = np.asarray(event).astype(bool)
+    if groups is None:
+        g, labels = np.zeros(len(t), dtype=np.int64), pd.Index(["all"])
+    else:
+        g, labels = pd.factorize(pd.Series(groups).astype(str).to_numpy(), sort=True)
+    ok = (g >= 0) & ~np.isnan(t)
+    t, e, g = t[ok], e[ok], g[ok]
+    o = np.lexsort((t, g))
+    t, e, g = t[o], e[o], g[o]
+    idx = np.flatnonzero(np.r_[True, (g[1:] != g[:-1]) | (t[1:] != t[:-1])])
+    counts = np.diff(np.r_[idx, len(t)]).astype(np.float64)
+    d = np.add.reduceat(e.astype(np.float64), idx) if len(idx) else np.empty(0)
+    gg, tt = g[idx], t[idx]
+    first = np.r_[True, gg[1:] != gg[:-1]] if len(idx) else np.empty(0, dtype=bool)
+    at_risk = np.bincount(g, minlength=len(labels))[gg] - (_segment_cumsum(counts, first) - counts)
+    q = d / at_risk
+    dead = q >= 1
+    S = np.where(_segment_cumsum(dead.astype(np.float64), first) > 0, 0.0,
+                 np.exp(_segment_cumsum(np.log1p(-np.where(dead, 0.0, q)), first)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = _segment_cumsum(np.where(dead, 0.0, d / (at_risk * (at_risk - d))), first)
+        z = NormalDist().inv_cdf(1 - alpha / 2)
+        logS = np.log(S)
+        theta = np.log(-logS)
+        se = np.sqrt(var) / np.abs(logS)
+        lower = np.exp(-np.exp(theta + z * se))
+        upper = np.exp(-np.exp(theta - z * se))
+    lower = np.where(S >= 1, 1.0, np.where(S <= 0, 0.0, lower))
+    upper = np.where(S >= 1, 1.0, np.where(S <= 0, 0.0, upper))
+    return pd.DataFrame({
+        "group": np.asarray(labels)[gg],
+        "time": tt,
+        "at_risk": at_risk.astype(np.int64),
+        "events": d.astype(np.int64),
+        "censored": (counts - d).astype(np.int64),
+        "survival": S,
+        "ci_lower": lower,
+        "ci_upper": upper,
+    })
+
+def km_strata(frame: pd.DataFrame, strata=KM_STRATA, alpha: float = 0.05) -> pd.DataFrame:
+    parts = [kaplan_meier(frame["duration"], frame["event"], alpha=alpha).assign(stratum="all")]
+    for s in strata:
+        parts.append(kaplan_meier(frame["duration"], frame["event"], frame[s], alpha).assign(stratum=s))
+    out = pd.concat(parts, ignore_index=True)
+    return out[["stratum"] + [c for c in out.columns if c != "stratum"]]
+
+def median_survival(km: pd.DataFrame) -> pd.DataFrame:
+    keys = ["stratum", "group"] if "stratum" in km else ["group"]
+    hit = km[km["survival"] <= 0.5].groupby(keys)["time"].min()
+    return km.groupby(keys).size().rename("n_times").to_frame().join(hit.rename("median_time")).reset_index()
+
+def _cox_numpy(t: np.ndarray, e: np.ndarray, X: np.ndarray, penalizer: float, ties: str, max_iter: int,
+               tol: float) -> tuple:
+    o = np.lexsort((e, -t))
+    t, e, X = t[o], e[o].astype(bool), X[o]
+    ends = np.r_[np.flatnonzero(t[1:] != t[:-1]), len(t) - 1]
+    block = np.searchsorted(ends, np.arange(len(t)))
+    ev = np.flatnonzero(e)
+    k = block[ev]
+    d = np.bincount(k, minlength=len(ends)).astype(np.float64)
+    rank = np.arange(len(ev)) - np.searchsorted(k, k)
+    f = rank / d[k] if ties == "efron" else np.zeros(len(ev))
+    xe = X[ev].sum(axis=0)
+    p = X.shape[1]
+    penalizer = penalizer * len(t)
+
+    def terms(b, second: bool):
+        w = np.exp(X @ b)
+        wx = w[:, None] * X
+        S0, S1 = np.cumsum(w)[ends][k], np.cumsum(wx, axis=0)[ends][k]
+        E0 = np.bincount(block[ev], weights=w[ev], minlength=len(ends))[k]
+        E1 = np.stack([np.bincount(block[ev], weights=wx[ev, j], minlength=len(ends)) for j in range(p)], 1)[k]
+        den = S0 - f * E0
+        ll = xe @ b - np.log(den).sum() - 0.5 * penalizer * b @ b
+        if not second:
+            return ll, None, None
+        m = (S1 - f[:, None] * E1) / den[:, None]
+        wxx = w[:, None, None] * X[:, :, None] * X[:, None, :]
+        S2 = np.cumsum(wxx, axis=0)[ends][k]
+        E2 = np.zeros((len(ends), p, p))
+        np.add.at(E2, block[ev], wxx[ev])
+        H = ((S2 - f[:, None, None] * E2[k]) / den[:, None, None] - m[:, :, None] * m[:, None, :]).sum(axis=0)
+        return ll, xe - m.sum(axis=0) - penalizer * b, H + penalizer * np.eye(p)
+
+    beta = np.zeros(p)
+    ll, grad, H = terms(beta, True)
+    for _ in range(max_iter):
+        step = np.linalg.solve(H, grad)
+        for _ in range(30):
+            nll = terms(beta + step, False)[0]
+            if nll >= ll - 1e-12:
+                break
+            step = step / 2
+        beta = beta + step
+        done = abs(nll - ll) < tol
+        ll, grad, H = terms(beta, True)
+        if done:
+            break
+    return beta, np.linalg.inv(H), ll
+
+def cox_model(frame: pd.DataFrame, covariates=SURVIVAL_COVARIATES, penalizer: float = 0.0, engine: str = "auto",
+              ties: str = "efron", max_iter: int = 50, tol: float = 1e-9) -> dict:
+    d = frame[list(covariates) + ["duration", "event"]].dropna()
+    d = d[d["duration"] > 0]
+    covariates = [c for c in covariates if not np.isclose(d[c].min(), d[c].max())]
+    d = d[covariates + ["duration", "event"]]
+    if engine in ("auto", "lifelines") and ties == "efron":
+        try:
+            from lifelines import CoxPHFitter
+        except ImportError:
+            if engine == "lifelines":
+                raise
+        else:
+            cph = CoxPHFitter(penalizer=penalizer).fit(d, "duration", "event")
+            s = cph.summary.rename(columns={"se(coef)": "se"})[["coef", "exp(coef)", "se", "z", "p"]]
+            return {"summary": s.rename_axis("covariate").reset_index(), "log_likelihood": float(cph.log_likelihood_),
+                    "concordance": float(cph.concordance_index_), "n": len(d), "events": int(d["event"].sum()),
+                    "engine": "lifelines"}
+    X = d[list(covariates)].to_numpy(np.float64)
+    mu, sd = X.mean(axis=0), X.std(axis=0)
+    beta, cov, ll = _cox_numpy(d["duration"].to_numpy(np.float64), d["event"].to_numpy(), (X - mu) / sd,
+                               penalizer, ties, max_iter, tol)
+    coef = beta / sd
+    se = np.sqrt(np.diag(cov)) / sd
+    z = coef / se
+    p = 2 * (1 - np.vectorize(NormalDist().cdf)(np.abs(z)))
+    s = pd.DataFrame({"covariate": list(covariates), "coef": coef, "exp(coef)": np.exp(coef), "se": se, "z": z, "p": p})
+    return {"summary": s, "log_likelihood": float(ll), "concordance": concordance(d, (X - mu) / sd @ beta),
+            "n": len(d), "events": int(d["event"].sum()), "engine": "numpy"}
+
+def concordance(d: pd.DataFrame, risk: np.ndarray, block_cells: int = 4_000_000) -> float:
+    t = d["duration"].to_numpy(np.float64)
+    e = d["event"].to_numpy().astype(bool)
+    ti, ri = t[e], risk[e]
+    conc = pairs = 0.0
+    step = max(1, block_cells // max(len(t), 1))
+    for start in range(0, len(ti), step):
+        tb = ti[start:start + step, None]
+        comp = (t[None, :] > tb) | ((t[None, :] == tb) & ~e[None, :])
+        diff = ri[start:start + step, None] - risk[None, :]
+        pairs += comp.sum()
+        conc += ((diff > 0) & comp).sum() + 0.5 * ((diff == 0) & comp).sum()
+    return float(conc / pairs) if pairs else float("nan")
\ No newline at end of file
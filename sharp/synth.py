@@ -0,0 +1,205 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+IPPS_DRGS = [
+    "039 - EXTRACRANIAL PROCEDURES W/O CC/MCC", "057 - DEGENERATIVE NERVOUS SYSTEM DISORDERS W/O MCC",
+    "064 - INTRACRANIAL HEMORRHAGE OR CEREBRAL INFARCTION W MCC",
+    "065 - INTRACRANIAL HEMORRHAGE OR CEREBRAL INFARCTION W CC",
+    "066 - INTRACRANIAL HEMORRHAGE OR CEREBRAL INFARCTION W/O CC/MCC", "069 - TRANSIENT ISCHEMIA",
+    "074 - CRANIAL & PERIPHERAL NERVE DISORDERS W/O MCC", "101 - SEIZURES W/O MCC",
+    "149 - DYSEQUILIBRIUM", "176 - PULMONARY EMBOLISM W/O MCC",
+    "177 - RESPIRATORY INFECTIONS & INFLAMMATIONS W MCC", "178 - RESPIRATORY INFECTIONS & INFLAMMATIONS W CC",
+    "189 - PULMONARY EDEMA & RESPIRATORY FAILURE", "190 - CHRONIC OBSTRUCTIVE PULMONARY DISEASE W MCC",
+    "191 - CHRONIC OBSTRUCTIVE PULMONARY DISEASE W CC", "192 - CHRONIC OBSTRUCTIVE PULMONARY DISEASE W/O CC/MCC",
+    "193 - SIMPLE PNEUMONIA & PLEURISY W MCC", "194 - SIMPLE PNEUMONIA & PLEURISY W CC",
+    "195 - SIMPLE PNEUMONIA & PLEURISY W/O CC/MCC", "202 - BRONCHITIS & ASTHMA W CC/MCC",
+    "203 - BRONCHITIS & ASTHMA W/O CC/MCC", "207 - RESPIRATORY SYSTEM DIAGNOSIS W VENTILATOR SUPPORT 96+ HOURS",
+    "208 - RESPIRATORY SYSTEM DIAGNOSIS W VENTILATOR SUPPORT <96 HOURS",
+    "238 - MAJOR CARDIOVASC PROCEDURES W/O MCC", "243 - PERMANENT CARDIAC PACEMAKER IMPLANT W CC",
+    "244 - PERMANENT CARDIAC PACEMAKER IMPLANT W/O CC/MCC",
+    "246 - PERC CARDIOVASC PROC W DRUG-ELUTING STENT W MCC OR 4+ VESSELS/STENTS",
+    "247 - PERC CARDIOVASC PROC W DRUG-ELUTING STENT W/O MCC",
+    "249 - PERC CARDIOVASC PROC W NON-DRUG-ELUTING STENT W/O MCC",
+    "251 - PERC CARDIOVASC PROC W/O CORONARY ARTERY STENT W/O MCC", "252 - OTHER VASCULAR PROCEDURES W MCC",
+    "253 - OTHER VASCULAR PROCEDURES W CC", "254 - OTHER VASCULAR PROCEDURES W/O CC/MCC",
+    "280 - ACUTE MYOCARDIAL INFARCTION, DISCHARGED ALIVE W MCC",
+    "281 - ACUTE MYOCARDIAL INFARCTION, DISCHARGED ALIVE W CC",
+    "282 - ACUTE MYOCARDIAL INFARCTION, DISCHARGED ALIVE W/O CC/MCC",
+    "286 - CIRCULATORY DISORDERS EXCEPT AMI, W CARD CATH W MCC",
+    "287 - CIRCULATORY DISORDERS EXCEPT AMI, W CARD CATH W/O MCC", "291 - HEART FAILURE & SHOCK W MCC",
+    "292 - HEART FAILURE & SHOCK W CC", "293 - HEART FAILURE & SHOCK W/O CC/MCC",
+    "300 - PERIPHERAL VASCULAR DISORDERS W CC", "301 - PERIPHERAL VASCULAR DISORDERS W/O CC/MCC",
+    "303 - ATHEROSCLEROSIS W/O MCC", "305 - HYPERTENSION W/O MCC",
+    "308 - CARDIAC ARRHYTHMIA & CONDUCTION DISORDERS W MCC", "309 - CARDIAC ARRHYTHMIA & CONDUCTION DISORDERS W CC",
+    "310 - CARDIAC ARRHYTHMIA & CONDUCTION DISORDERS W/O CC/MCC", "312 - SYNCOPE & COLLAPSE",
+    "313 - CHEST PAIN", "314 - OTHER CIRCULATORY SYSTEM DIAGNOSES W MCC",
+    "315 - OTHER CIRCULATORY SYSTEM DIAGNOSES W CC", "329 - MAJOR SMALL & LARGE BOWEL PROCEDURES W MCC",
+    "330 - MAJOR SMALL & LARGE BOWEL PROCEDURES W CC",
+    "372 - MAJOR GASTROINTESTINAL DISORDERS & PERITONEAL INFECTIONS W CC", "377 - G.I. HEMORRHAGE W MCC",
+    "378 - G.I. HEMORRHAGE W CC", "379 - G.I. HEMORRHAGE W/O CC/MCC", "389 - G.I. OBSTRUCTION W CC",
+    "390 - G.I. OBSTRUCTION W/O CC/MCC", "391 - ESOPHAGITIS, GASTROENT & MISC DIGEST DISORDERS W MCC",
+    "392 - ESOPHAGITIS, GASTROENT & MISC DIGEST DISORDERS W/O MCC", "394 - OTHER DIGESTIVE SYSTEM DIAGNOSES W CC",
+    "418 - LAPAROSCOPIC CHOLECYSTECTOMY W/O C.D.E. W CC",
+    "419 - LAPAROSCOPIC CHOLECYSTECTOMY W/O C.D.E. W/O CC/MCC",
+    "439 - DISORDERS OF PANCREAS EXCEPT MALIGNANCY W CC", "460 - SPINAL FUSION EXCEPT CERVICAL W/O MCC",
+    "469 - MAJOR JOINT REPLACEMENT OR REATTACHMENT OF LOWER EXTREMITY W MCC",
+    "470 - MAJOR JOINT REPLACEMENT OR REATTACHMENT OF LOWER EXTREMITY W/O MCC",
+    "480 - HIP & FEMUR PROCEDURES EXCEPT MAJOR JOINT W MCC", "481 - HIP & FEMUR PROCEDURES EXCEPT MAJOR JOINT W CC",
+    "491 - BACK & NECK PROC EXC SPINAL FUSION W/O CC/MCC", "535 - FRACTURES OF HIP & PELVIS W MCC",
+    "536 - FRACTURES OF HIP & PELVIS W/O MCC", "552 - MEDICAL BACK PROBLEMS W/O MCC",
+    "602 - CELLULITIS W MCC", "603 - CELLULITIS W/O MCC", "638 - DIABETES W CC",
+    "640 - MISC DISORDERS OF NUTRITION,METABOLISM,FLUIDS/ELECTROLYTES W MCC",
+    "641 - MISC DISORDERS OF NUTRITION,METABOLISM,FLUIDS/ELECTROLYTES W/O MCC", "682 - RENAL FAILURE W MCC",
+    "683 - RENAL FAILURE W CC", "684 - RENAL FAILURE W/O CC/MCC", "689 - KIDNEY & URINARY TRACT INFECTIONS W MCC",
+    "690 - KIDNEY & URINARY TRACT INFECTIONS W/O MCC", "698 - OTHER KIDNEY & URINARY TRACT DIAGNOSES W MCC",
+    "699 - OTHER KIDNEY & URINARY TRACT DIAGNOSES W CC", "811 - RED BLOOD CELL DISORDERS W MCC",
+    "812 - RED BLOOD CELL DISORDERS W/O MCC", "853 - INFECTIOUS & PARASITIC DISEASES W O.R. PROCEDURE W MCC",
+    "870 - SEPTICEMIA OR SEVERE SEPSIS W MV 96+ HOURS", "871 - SEPTICEMIA OR SEVERE SEPSIS W/O MV 96+ HOURS W MCC",
+    "872 - SEPTICEMIA OR SEVERE SEPSIS W/O MV 96+ HOURS W/O MCC", "885 - PSYCHOSES",
+    "897 - ALCOHOL/DRUG ABUSE OR DEPENDENCE W/O REHABILITATION THERAPY W/O MCC",
+    "917 - POISONING & TOXIC EFFECTS OF DRUGS W MCC", "918 - POISONING & TOXIC EFFECTS OF DRUGS W/O MCC",
+    "948 - SIGNS & SYMPTOMS W/O MCC",
+]
+
+STATE_HOSPITALS = {
+    "AL": 91, "AK": 9, "AZ": 59, "AR": 48, "CA": 299, "CO": 46, "CT": 32, "DE": 6, "DC": 7, "FL": 167,
+    "GA": 101, "HI": 12, "ID": 14, "IL": 129, "IN": 85, "IA": 37, "KS": 52, "KY": 70, "LA": 89, "ME": 20,
+    "MD": 46, "MA": 65, "MI": 95, "MN": 51, "MS": 59, "MO": 72, "MT": 9, "NE": 24, "NV": 21, "NH": 13,
+    "NJ": 64, "NM": 25, "NY": 167, "NC": 88, "ND": 6, "OH": 130, "OK": 68, "OR": 33, "PA": 151, "RI": 11,
+    "SC": 55, "SD": 12, "TN": 95, "TX": 309, "UT": 27, "VT": 6, "VA": 77, "WA": 53, "WV": 32, "WI": 66, "WY": 7,
+}
+
+STATE_CCN = {
+    "AL": 1, "AK": 2, "AZ": 3, "AR": 4, "CA": 5, "CO": 6, "CT": 7, "DE": 8, "DC": 9, "FL": 10, "GA": 11,
+    "HI": 12, "ID": 13, "IL": 14, "IN": 15, "IA": 16, "KS": 17, "KY": 18, "LA": 19, "ME": 20, "MD": 21,
+    "MA": 22, "MI": 23, "MN": 24, "MS": 25, "MO": 26, "MT": 27, "NE": 28, "NV": 29, "NH": 30, "NJ": 31,
+    "NM": 32, "NY": 33, "NC": 34, "ND": 35, "OH": 36, "OK": 37, "OR": 38, "PA": 39, "RI": 41, "SC": 42,
+    "SD": 43, "TN": 44, "TX": 45, "UT": 46, "VT": 47, "VA": 49, "WA": 50, "WV": 51, "WI": 52, "WY": 53,
+}
+
+IPPS_COLUMNS = [
+    "DRG Definition", "Provider Id", "Provider Name", "Provider Street Address", "Provider City",
+    "Provider State", "Provider Zip Code", "Hospital Referral Region Description", " Total Discharges ",
+    " Average Covered Charges ", " Average Total Payments ", "Average Medicare Payments",
+]
+
+ROWS_PER_PROVIDER = 49
+_NAME_WORDS = ["MERCY", "ST JOSEPH", "REGIONAL", "COMMUNITY", "MEMORIAL", "GENERAL", "BAPTIST", "METHODIST",
+               "UNIVERSITY", "SACRED HEART", "GOOD SAMARITAN", "VALLEY", "COUNTY", "PROVIDENCE", "ST MARY"]
+_NAME_TYPES = ["HOSPITAL", "MEDICAL CENTER", "HEALTH SYSTEM", "REGIONAL MEDICAL CENTER"]
+
+def synth_providers(scale: float = 1.0, seed: int = 42) -> pd.DataFrame:
+    from sharp.spatial import load_centroids
+    rng = np.random.default_rng(seed)
+    cent = load_centroids()
+    counts = {s: max(1, int(round(n * scale))) for s, n in STATE_HOSPITALS.items()}
+    width = max(4, len(str(max(counts.values()))))
+    parts = []
+    for s, n in counts.items():
+        zips = cent.loc[cent["state"] == s, "zip"].to_numpy()
+        if not len(zips):
+            zips = cent["zip"].to_numpy()
+        hubs = rng.choice(zips, size=min(len(zips), max(3, int(0.9 * n))), replace=False)
+        w = 1.0 / np.arange(1, len(hubs) + 1) ** 0.5
+        zi = rng.choice(len(hubs), size=n, p=w / w.sum())
+        parts.append(pd.DataFrame({
+            "Provider_Id": STATE_CCN[s] * 10 ** width + np.arange(1, n + 1),
+            "Provider_State": s,
+            "Provider_Zip_Code": hubs[zi],
+            "city": zi,
+            "state_cost": np.exp(rng.normal(0, 0.12)),
+            "state_markup": rng.normal(0, 0.2),
+        }))
+    p = pd.concat(parts, ignore_index=True)
+    n = len(p)
+    p["size"] = rng.lognormal(0.0, 1.0, n)
+    p["cost"] = np.exp(rng.normal(0, 0.1, n)) * p["state_cost"]
+    p["markup"] = np.exp(rng.normal(1.2, 0.3, n) + p["state_markup"])
+    p["medicare_share"] = np.clip(rng.normal(0.86, 0.04, n), 0.6, 0.98)
+    life = rng.random(n)
+    p["open_rank"] = np.where(life < 0.03, rng.random(n), 0.0)
+    p["close_rank"] = np.where(life > 0.97, rng.random(n), 1.1)
+    city = "CITY " + p["Provider_State"] + " " + p["city"].astype(str)
+    p["Provider_Name"] = (pd.Series(rng.choice(_NAME_WORDS, n)) + " " + pd.Series(rng.choice(_NAME_TYPES, n))
+                          + " " + (np.arange(n) % 97).astype(str)).to_numpy()
+    p["Provider_Street_Address"] = (rng.integers(1, 9999, n)).astype(str) + " MAIN STREET"
+    p["Provider_City"] = city
+    p["Hospital_Referral_Region_Description"] = p["Provider_State"] + " - " + city
+    return p.drop(columns=["city", "state_cost", "state_markup"])
+
+def synth_drgs(drgs=IPPS_DRGS, seed: int = 42) -> pd.DataFrame:
+    from sharp.features import HIGH_READMIT_DRGS
+    rng = np.random.default_rng(seed + 1)
+    d = pd.DataFrame({"DRG_Definition": list(dict.fromkeys(drgs))})
+    d["code"] = d["DRG_Definition"].str[:3]
+    pop = rng.lognormal(0, 1.0, len(d)) * np.where(d["code"].isin(list(HIGH_READMIT_DRGS)), 3.0, 1.0)
+    d["pop"] = pop / pop.mean()
+    d["base_payment"] = np.exp(rng.normal(9.2, 0.5, len(d)))
+    return d
+
+def presence_scale(size: np.ndarray, pop: np.ndarray, target: float = ROWS_PER_PROVIDER) -> float:
+    target = min(target, 0.95 * len(pop))
+    lo, hi = 1e-6, 1e3
+    for _ in range(60):
+        c = (lo * hi) ** 0.5
+        m = (1 - np.exp(-c * np.outer(size[:5000], pop))).sum(axis=1).mean()
+        lo, hi = (c, hi) if m < target else (lo, c)
+    return (lo * hi) ** 0.5
+
+def synth_year(providers: pd.DataFrame, drgs: pd.DataFrame, year: int, elapsed: int = 0, rank: float = 0.0,
+               seed: int = 42, chunk: int = 0, inflation: float = 0.025, presence: float | None = None) -> pd.DataFrame:
+    rng = np.random.default_rng([seed, year, chunk])
+    active = providers[(providers["open_rank"] <= rank) & (providers["close_rank"] > rank)]
+    size = active["size"].to_numpy() * np.exp(rng.normal(0, 0.05, len(active)))
+    pop = drgs["pop"].to_numpy()
+    c = presence_scale(providers["size"].to_numpy(), pop) if presence is None else presence
+    lam = c * np.outer(size, pop)
+    pi, di = np.nonzero(rng.random(lam.shape) < 1 - np.exp(-lam))
+    lam = lam[pi, di]
+    n = len(pi)
+    td = 11 + np.floor(rng.lognormal(np.log(6 * lam / (1 - np.exp(-lam))), 0.7)).astype(np.int64)
+    a = active.iloc[pi]
+    atp = (drgs["base_payment"].to_numpy()[di] * a["cost"].to_numpy() * (1 + inflation) ** elapsed
+           * rng.lognormal(0, 0.08, n))
+    return pd.DataFrame({
+        "DRG Definition": drgs["DRG_Definition"].to_numpy()[di],
+        "Provider Id": a["Provider_Id"].to_numpy(),
+        "Provider Name": a["Provider_Name"].to_numpy(),
+        "Provider Street Address": a["Provider_Street_Address"].to_numpy(),
+        "Provider City": a["Provider_City"].to_numpy(),
+        "Provider State": a["Provider_State"].to_numpy(),
+        "Provider Zip Code": a["Provider_Zip_Code"].to_numpy(),
+        "Hospital Referral Region Description": a["Hospital_Referral_Region_Description"].to_numpy(),
+        " Total Discharges ": td,
+        " Average Covered Charges ": atp * a["markup"].to_numpy() * rng.lognormal(0, 0.1, n),
+        " Average Total Payments ": atp,
+        "Average Medicare Payments": atp * np.clip(a["medicare_share"].to_numpy() + rng.normal(0, 0.02, n), 0.5, 0.99),
+    })
+
+def _money(x: np.ndarray) -> pd.Series:
+    return pd.Series(np.round(x, 2)).map("${:.2f}".format)
+
+def write_synthetic_ipps(out_dir="data", scale: float = 1.0, years=range(2011, 2017), year_scale: int = 1,
+                         seed: int = 42, chunk_providers: int = 20_000, dollars: bool = True) -> list:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    years = list(years)
+    years = list(range(years[0], years[0] + len(years) * year_scale))
+    providers = synth_providers(scale, seed)
+    drgs = synth_drgs(seed=seed)
+    c = presence_scale(providers["size"].to_numpy(), drgs["pop"].to_numpy())
+    paths = []
+    for k, year in enumerate(years):
+        path = out_dir / f"Medicare_Provider_Charge_Inpatient_DRG100_FY{year}.csv"
+        tmp = path.with_suffix(".csv.tmp")
+        for i, start in enumerate(range(0, len(providers), chunk_providers)):
+            part = synth_year(providers.iloc[start:start + chunk_providers], drgs, year, k,
+                              k / max(len(years) - 1, 1), seed, i, presence=c)
+            if dollars:
+                for col in IPPS_COLUMNS[-3:]:
+                    part[col] = _money(part[col].to_numpy()).to_numpy()
+            part.to_csv(tmp, mode="w" if i == 0 else "a", header=i == 0, index=False, float_format="%.2f")
+        tmp.replace(path)
+        paths.append(path)
+    return paths
\ No newline at end of file
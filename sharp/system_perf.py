@@ -1,10 +1,28 @@
 import pandas as pd
+from sharp.backend import check_backend, query
 
-def build_system_perf(df: pd.DataFrame) -> pd.DataFrame:
+SYSTEMS = r"(BAPTIST|MERCY|ADVENTIST|PRESBYTERIAN|METHODIST|CATHOLIC|KAISER|HCA|TENET|ASCENSION)"
+
+SYSTEM_PERF_SQL = """
+with s as (
+    select regexp_extract(Provider_Name, '""" + SYSTEMS + """', 1) as hospital_system, *
+    from {cms}
+)
+select hospital_system, is_readmit_prone,
+       sum(Total_Discharges) as Total_Discharges,
+       avg(payment_ratio) as payment_ratio,
+       avg(Average_Total_Payments) as Average_Total_Payments
+from s
+where hospital_system <> ''
+group by 1, 2
+order by 1, 2
+"""
+
+def build_system_perf(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        return query(SYSTEM_PERF_SQL, df)
     df = df.copy()
-    df["hospital_system"] = df["Provider_Name"].str.extract(
-        r"(BAPTIST|MERCY|ADVENTIST|PRESBYTERIAN|METHODIST|CATHOLIC|KAISER|HCA|TENET|ASCENSION)"
-    )
+    df["hospital_system"] = df["Provider_Name"].str.extract(SYSTEMS)
     s = df.groupby(["hospital_system", "is_readmit_prone"]).agg(
         Total_Discharges=("Total_Discharges", "sum"),
         payment_ratio=("payment_ratio", "mean"),
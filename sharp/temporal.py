@@ -1,18 +1,47 @@
 import pandas as pd
+from sharp.backend import check_backend, query
 
-def build_temporal(df: pd.DataFrame) -> pd.DataFrame:
-    t = df.groupby(["year", "Provider_State", "is_readmit_prone"]).agg(
+TEMPORAL_SQL = """
+select year, Provider_State, is_readmit_prone,
+       sum(Total_Discharges) as Total_Discharges,
+       avg(payment_ratio) as payment_ratio,
+       avg(Average_Total_Payments) as Average_Total_Payments
+from {cms}
+group by 1, 2, 3
+order by 1, 2, 3
+"""
+
+YOY_SQL = """
+with g as (
+    select Provider_Id, year, sum(Total_Discharges) as readmit_discharges
+    from {cms}
+    where is_readmit_prone
+    group by 1, 2
+)
+select Provider_Id, year, readmit_discharges,
+       lag(readmit_discharges) over (partition by Provider_Id order by year) as prev
+from g
+order by 1, 2
+"""
+
+def build_temporal(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        return query(TEMPORAL_SQL, df)
+    t = df.groupby(["year", "Provider_State", "is_readmit_prone"], observed=True).agg(
         Total_Discharges=("Total_Discharges", "sum"),
         payment_ratio=("payment_ratio", "mean"),
         Average_Total_Payments=("Average_Total_Payments", "mean"),
     ).reset_index()
     return t
 
-def yoy_readmit_growth(df: pd.DataFrame) -> pd.DataFrame:
-    g = df[df["is_readmit_prone"]].groupby(["Provider_Id", "year"]).agg(
-        readmit_discharges=("Total_Discharges", "sum")
-    ).reset_index()
-    g = g.sort_values(["Provider_Id", "year"]) 
-    g["prev"] = g.groupby("Provider_Id")["readmit_discharges"].shift(1)
+def yoy_readmit_growth(df: pd.DataFrame, backend: str = "pandas") -> pd.DataFrame:
+    if check_backend(backend) == "duckdb":
+        g = query(YOY_SQL, df)
+    else:
+        g = df[df["is_readmit_prone"]].groupby(["Provider_Id", "year"]).agg(
+            readmit_discharges=("Total_Discharges", "sum")
+        ).reset_index()
+        g = g.sort_values(["Provider_Id", "year"]) 
+        g["prev"] = g.groupby("Provider_Id")["readmit_discharges"].shift(1)
     g["yoy_growth"] = (g["readmit_discharges"] - g["prev"]) / g["prev"]
     return g
\ No newline at end of file
@@ -0,0 +1,39 @@
+from pathlib import Path
+from datetime import datetime, timezone
+import os
+import shutil
+
+POINTER = "CURRENT"
+
+def new_version_dir(root) -> Path:
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("v%Y%m%dT%H%M%S%fZ")
+    d = root / f".{stamp}.tmp"
+    d.mkdir()
+    return d
+
+def publish(tmp_dir, keep: int = 3) -> Path:
+    tmp_dir = Path(tmp_dir)
+    root = tmp_dir.parent
+    final = root / tmp_dir.name[1:-len(".tmp")]
+    tmp_dir.rename(final)
+    ptr = root / f".{POINTER}.tmp"
+    ptr.write_text(final.name)
+    os.replace(ptr, root / POINTER)
+    for old in list_versions(root)[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    return final
+
+def list_versions(root) -> list:
+    return sorted(p for p in Path(root).glob("v*") if p.is_dir())
+
+def current_version(root) -> str | None:
+    ptr = Path(root) / POINTER
+    if not ptr.exists():
+        return None
+    return ptr.read_text().strip() or None
+
+def current_dir(root) -> Path | None:
+    v = current_version(root)
+    return None if v is None else Path(root) / v
\ No newline at end of file
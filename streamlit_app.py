@@ -4,45 +4,90 @@ import plotly.express as px
 import plotly.graph_objects as go
 import json
 import numpy as np
-from sklearn.metrics import roc_curve, precision_recall_curve, auc
 import joblib
 from pathlib import Path
 from sharp.data import load_ipps_data
 from sharp.features import build_features
 from sharp.cluster import build_zip_metrics
-from sharp.savings import tam_and_top_hospitals
-from sharp.model import build_provider_year, add_next_year_target, train_models
+from sharp.savings import build_savings_engine, engine_tam, engine_top_hospitals, tam_by_drg, tam_curve
+from sharp.providers import write_provider_index, load_provider_index, provider_labels, provider_history
+from sharp.cube import build_cube, load_cube, slice_cube, state_year, correlation
+from sharp.model import build_provider_year, add_next_year_target, train_models, evaluate_predictions
+from sharp.survival import survival_frame, km_strata, cox_model, KM_STRATA
 
 st.set_page_config(page_title="SHARP Dashboard", layout="wide")
-@st.cache_data
+@st.cache_resource
 def load_data():
     d = load_ipps_data()
     d = build_features(d)
     return d
 
-data = load_data()
+@st.cache_resource
+def load_olap_cube():
+    p = Path("outputs/cube.parquet")
+    if p.exists():
+        return load_cube(p)
+    return build_cube(load_data())
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["National Heatmap","Hospital Deep Dive","Opportunity Finder","What-If Simulator","Model Performance"])
+@st.cache_resource
+def load_providers():
+    idx = load_provider_index()
+    if idx is None:
+        write_provider_index(load_data())
+        idx = load_provider_index()
+    return idx, provider_labels(idx)
+
+@st.cache_resource
+def load_engine():
+    p = Path("outputs/savings_engine.joblib")
+    if p.exists():
+        return joblib.load(p)
+    return build_savings_engine(load_data())
+
+@st.cache_resource
+def load_tam_curve():
+    return tam_curve(load_engine(), np.round(np.arange(0.1, 0.501, 0.01), 2))
+
+@st.cache_resource
+def load_survival():
+    km, cox = Path("outputs/km_curves.csv"), Path("outputs/cox_summary.csv")
+    if km.exists() and cox.exists():
+        return pd.read_csv(km), pd.read_csv(cox)
+    d = load_data()
+    frame = survival_frame(d, build_provider_year(d))
+    return km_strata(frame), cox_model(frame)["summary"]
+
+@st.cache_resource
+def load_evaluation():
+    p = Path("outputs/model_eval.json")
+    if p.exists():
+        return json.loads(p.read_text())
+    pred = pd.read_csv("outputs/predictions_2016.csv")
+    panel = pd.read_csv("outputs/provider_year.csv")
+    return evaluate_predictions(pred, panel["target_growth"].quantile(0.80))
+
+cube = load_olap_cube()
+providers, provider_names = load_providers()
+engine = load_engine()
+states = sorted(cube["Provider_State"].dropna().unique())
+years = (int(cube["year"].min()), int(cube["year"].max()))
+
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["National Heatmap","Hospital Deep Dive","Opportunity Finder","What-If Simulator","Model Performance","Time to Surge"])
 
 with tab1:
     st.sidebar.title("Filters")
-    sel_state = st.sidebar.multiselect("State", sorted(data["Provider_State"].unique()))
-    sel_years = st.sidebar.slider("Years", 2011, 2016, (2011, 2016))
-    df = data[(data["year"]>=sel_years[0]) & (data["year"]<=sel_years[1])]
-    if sel_state:
-        df = df[df["Provider_State"].isin(sel_state)]
-    s = df.groupby(["Provider_State","year"]).agg(
-        readmit_discharges=("Total_Discharges","sum"),
-        stress=("financial_stress_index","mean")
-    ).reset_index()
+    sel_state = st.sidebar.multiselect("State", states)
+    sel_years = st.sidebar.slider("Years", years[0], years[1], years)
+    c = slice_cube(cube, states=sel_state, years=sel_years)
+    s = state_year(c)
     fig_anim = px.choropleth(s, locations="Provider_State", locationmode="USA-states", color="readmit_discharges", scope="usa", animation_frame="year")
     st.plotly_chart(fig_anim, use_container_width=True)
-    corr = df[["payment_ratio","medicare_coverage_ratio","financial_stress_index","avg_charges_log"]].corr()
+    corr = correlation(c)
     st.plotly_chart(px.imshow(corr, text_auto=True, aspect="auto"), use_container_width=True)
 
 with tab2:
-    pid = st.selectbox("Hospital", options=sorted(data["Provider_Name"].unique()))
-    h = data[data["Provider_Name"]==pid]
+    pid = st.selectbox("Hospital", options=list(provider_names), format_func=provider_names.get)
+    h = provider_history(providers, pid, ["year", "Total_Discharges", "payment_ratio", "is_readmit_prone"])
     ts = h.groupby("year").agg(
         discharges=("Total_Discharges","sum"),
         payment_ratio=("payment_ratio","mean"),
@@ -54,106 +99,75 @@ with tab2:
 
 with tab3:
     st.subheader("Filters")
-    f_state = st.multiselect("State", sorted(data["Provider_State"].unique()))
-    f_drg = st.multiselect("DRG", sorted(data["DRG_Code"].dropna().unique()))
+    f_state = st.multiselect("State", states)
+    f_drg = st.multiselect("DRG", sorted(cube["DRG_Code"].dropna().unique()))
     f_size = st.multiselect("Size", ["small","medium","large"])
-    df = data.copy()
-    if f_state:
-        df = df[df["Provider_State"].isin(f_state)]
-    if f_drg:
-        df = df[df["DRG_Code"].isin(f_drg)]
-    if f_size:
-        df = df[df["hospital_size_category"].astype(str).isin(f_size)]
-    tam, top100 = tam_and_top_hospitals(df)
-    st.metric("Total Addressable Market", f"${tam:,.0f}")
+    st.metric("Total Addressable Market", f"${engine_tam(engine, f_state, f_drg, f_size):,.0f}")
+    top100 = engine_top_hospitals(engine, 100, f_state, f_drg, f_size)
     st.dataframe(top100)
     st.download_button("Download Top 100 CSV", top100.to_csv(index=False), file_name="top100_hospitals.csv")
 
 with tab4:
-    ratio = st.slider("Payment ratio", 0.1, 0.8, 0.3, 0.01)
-    df = data.copy()
-    df["scenario_ratio"] = ratio
-    df["scenario_stress"] = 1 - df["scenario_ratio"]
-    base_tam, _ = tam_and_top_hospitals(df)
-    st.metric("Projected Savings TAM", f"${base_tam:,.0f}")
-    st.write(df[["Provider_Name","Provider_State","scenario_ratio","scenario_stress"]].head(50))
+    ratio = st.slider("Stressed payment ratio threshold", 0.1, 0.5, 0.3, 0.01)
+    by_drg = tam_by_drg(engine, stressed_max=ratio)
+    st.metric("Projected Savings TAM", f"${by_drg['tam'].sum():,.0f}")
+    st.plotly_chart(px.line(load_tam_curve(), x="threshold", y="tam"), use_container_width=True)
+    st.write(by_drg.sort_values("tam", ascending=False).head(20))
 
 with tab5:
     try:
-        pred = pd.read_csv("outputs/predictions_2016.csv")
-        panel = pd.read_csv("outputs/provider_year.csv")
-        thr = panel["target_growth"].quantile(0.80)
-        score_raw = (pred["pred_next"] - pred["readmit_discharges"]) / (pred["readmit_discharges"] + 1e-6)
-        score = np.clip(score_raw / (thr + 1e-6), 0, 1)
-        y = pred["high_risk"].astype(int).values
-        fpr, tpr, _ = roc_curve(y, score)
-        roc_auc = auc(fpr, tpr)
-        precision, recall, _ = precision_recall_curve(y, score)
-        pr_auc = auc(recall, precision)
-        prev = float(y.mean())
-        df_lift = pd.DataFrame({"score": score, "y": y}).sort_values("score", ascending=False)
-        df_lift["rank"] = np.arange(1, len(df_lift)+1)
-        df_lift["decile"] = pd.qcut(df_lift["rank"], 10, labels=False)
-        lift = df_lift.groupby("decile")["y"].sum().cumsum() / (prev * ((df_lift.groupby("decile").size().cumsum())))
-        lift = lift.rename("lift")
-        cal = pd.DataFrame({"score": score, "y": y})
-        cal["bin"] = pd.qcut(cal["score"], 10, duplicates="drop")
-        cal_plot = cal.groupby("bin").agg(pred=("score","mean"), obs=("y","mean")).reset_index()
+        ev = load_evaluation()
         fig_roc = go.Figure()
-        fig_roc.add_trace(go.Scatter(x=fpr, y=tpr, mode="lines", name=f"ROC AUC={roc_auc:.3f}"))
+        fig_roc.add_trace(go.Scatter(x=ev["roc"]["fpr"], y=ev["roc"]["tpr"], mode="lines", name=f"ROC AUC={ev['roc_auc']:.3f}"))
         fig_roc.add_trace(go.Scatter(x=[0,1], y=[0,1], mode="lines", name="baseline", line=dict(dash="dash")))
         st.plotly_chart(fig_roc, use_container_width=True)
         fig_pr = go.Figure()
-        fig_pr.add_trace(go.Scatter(x=recall, y=precision, mode="lines", name=f"PR AUC={pr_auc:.3f}"))
+        fig_pr.add_trace(go.Scatter(x=ev["pr"]["recall"], y=ev["pr"]["precision"], mode="lines", name=f"PR AUC={ev['pr_auc']:.3f}"))
         st.plotly_chart(fig_pr, use_container_width=True)
-        fig_lift = px.line(lift.reset_index(), x="decile", y="lift")
-        st.plotly_chart(fig_lift, use_container_width=True)
+        deciles = pd.DataFrame(ev["deciles"])
+        st.plotly_chart(px.line(deciles, x="decile", y="lift"), use_container_width=True)
+        cal_plot = pd.DataFrame(ev["calibration"])
         fig_cal = go.Figure()
         fig_cal.add_trace(go.Scatter(x=cal_plot["pred"], y=cal_plot["obs"], mode="markers+lines", name="calibration"))
         fig_cal.add_trace(go.Scatter(x=[0,1], y=[0,1], mode="lines", name="perfect", line=dict(dash="dash")))
         st.plotly_chart(fig_cal, use_container_width=True)
-        total_pos = df_lift["y"].sum()
-        df_gains = df_lift.copy()
-        df_gains["target_frac"] = df_gains["rank"] / len(df_gains)
-        df_gains["cum_positives"] = df_gains["y"].cumsum()
-        df_gains["cum_capture_rate"] = df_gains["cum_positives"] / (total_pos + 1e-6)
+        gains = ev["gains"]
         fig_gains = go.Figure()
-        fig_gains.add_trace(go.Scatter(x=df_gains["target_frac"], y=df_gains["cum_capture_rate"], mode="lines", name="cumulative gains"))
+        fig_gains.add_trace(go.Scatter(x=gains["target_frac"], y=gains["capture"], mode="lines", name="cumulative gains"))
         fig_gains.add_trace(go.Scatter(x=[0,1], y=[0,1], mode="lines", name="baseline", line=dict(dash="dash")))
         st.plotly_chart(fig_gains, use_container_width=True)
         frac = st.slider("Target fraction", 0.05, 0.5, 0.2, 0.05)
-        top_k = int(frac * len(df_lift))
-        cap = df_lift.iloc[:top_k]["y"].sum() / (total_pos + 1e-6)
+        cap = float(np.interp(frac, gains["target_frac"], gains["capture"]))
         st.metric("Top-K Capture Rate", f"{cap:.2%}")
-        sel_states = st.multiselect("States for breakdown", sorted(pred["Provider_State"].unique()))
-        perf_rows = []
-        for stt, g in pred.groupby("Provider_State"):
-            yy = g["high_risk"].astype(int).values
-            ss = np.clip(((g["pred_next"] - g["readmit_discharges"]) / (g["readmit_discharges"] + 1e-6)) / (thr + 1e-6), 0, 1)
-            try:
-                fpr_s, tpr_s, _ = roc_curve(yy, ss)
-                roc_s = auc(fpr_s, tpr_s)
-                pr_s = auc(*precision_recall_curve(yy, ss)[1::-1])
-            except Exception:
-                roc_s = np.nan
-                pr_s = np.nan
-            perf_rows.append({"Provider_State": stt, "ROC_AUC": roc_s, "PR_AUC": pr_s, "Prevalence": float(np.mean(yy))})
-        perf = pd.DataFrame(perf_rows)
+        st.dataframe(deciles)
+        perf = pd.DataFrame(ev["states"])
+        sel_states = st.multiselect("States for breakdown", perf["Provider_State"].tolist())
         if sel_states:
             perf = perf[perf["Provider_State"].isin(sel_states)]
         perf = perf.sort_values("ROC_AUC", ascending=False)
         st.dataframe(perf)
         st.plotly_chart(px.bar(perf.dropna(subset=["ROC_AUC"]).head(20), x="Provider_State", y="ROC_AUC"), use_container_width=True)
-        try:
-            rf = joblib.load("models/rf.pkl")
-            feats = json.loads(Path("models/features.json").read_text())
-            imp = pd.DataFrame({"feature": feats, "importance": rf.feature_importances_})
-            imp = imp.sort_values("importance", ascending=False)
+        if ev.get("importances"):
+            imp = pd.DataFrame(ev["importances"])
             st.plotly_chart(px.bar(imp.head(20), x="feature", y="importance"), use_container_width=True)
-        except Exception:
+        else:
             st.write("Model feature importances unavailable.")
-        st.metric("Baseline Prevalence", f"{prev:.2%}")
-        st.metric("ROC AUC", f"{roc_auc:.3f}")
-        st.metric("PR AUC", f"{pr_auc:.3f}")
+        st.metric("Baseline Prevalence", f"{ev['prevalence']:.2%}")
+        st.metric("ROC AUC", f"{ev['roc_auc']:.3f}")
+        st.metric("PR AUC", f"{ev['pr_auc']:.3f}")
     except Exception as e:
-        st.write(f"Performance data unavailable: {e}")
\ No newline at end of file
+        st.write(f"Performance data unavailable: {e}")
+
+with tab6:
+    km, cox = load_survival()
+    stratum = st.selectbox("Stratify by", ["all"] + KM_STRATA)
+    curves = km[km["stratum"] == stratum]
+    groups = sorted(curves["group"].astype(str).unique())
+    sel_groups = st.multiselect("Groups", groups, default=groups[:8])
+    curves = curves[curves["group"].astype(str).isin(sel_groups)] if sel_groups else curves
+    fig_km = px.line(curves, x="time", y="survival", color="group", line_shape="hv", markers=True)
+    fig_km.update_yaxes(range=[0, 1])
+    st.plotly_chart(fig_km, use_container_width=True)
+    st.dataframe(curves)
+    st.subheader("Cox proportional hazards")
+    st.dataframe(cox)
\ No newline at end of file
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path as _P
+sys.path.append(str(_P(__file__).resolve().parents[1]))
+
+import pytest
+
+@pytest.fixture(scope="session")
+def features(tmp_path_factory):
+    from sharp import data
+    from sharp.features import build_features
+    from sharp.synth import write_synthetic_ipps
+    d = tmp_path_factory.mktemp("ipps")
+    write_synthetic_ipps(d, 0.02, seed=7)
+    old, data.DATA_DIR = data.DATA_DIR, d
+    try:
+        return build_features(data.load_ipps_data(cache=False))
+    finally:
+        data.DATA_DIR = old
\ No newline at end of file
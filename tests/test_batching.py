@@ -0,0 +1,48 @@
+import asyncio
+import numpy as np
+import pytest
+from api.batching import MicroBatcher
+
+def test_mismatched_rows_fail_every_caller():
+    b = MicroBatcher(lambda m, X: X.sum(axis=1), max_batch=8, max_wait_ms=50)
+
+    async def run():
+        rows = [np.ones(3), np.ones(4), np.ones(3)]
+        out = await asyncio.wait_for(asyncio.gather(*(b.submit(r, None) for r in rows), return_exceptions=True), 5)
+        return out, await asyncio.wait_for(b.submit(np.ones(3), None), 5)
+
+    out, after = asyncio.run(run())
+    assert all(isinstance(e, ValueError) for e in out)
+    assert after == pytest.approx(3.0)
+
+def test_rows_are_scored_by_the_model_they_were_submitted_with():
+    old, new = {"version": "v1", "k": 1.0}, {"version": "v2", "k": 2.0}
+    seen = []
+
+    def predict(m, X):
+        seen.append((m["version"], len(X)))
+        return X.sum(axis=1) * m["k"]
+
+    b = MicroBatcher(predict, max_batch=8, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(b.submit(np.ones(2), old), b.submit(np.ones(2), new), b.submit(np.ones(2), old))
+
+    assert asyncio.run(run()) == [2.0, 4.0, 2.0]
+    assert sorted(seen) == [("v1", 2), ("v2", 1)]
+
+def test_concurrent_submits_coalesce_in_order():
+    calls = []
+
+    def predict(m, X):
+        calls.append(len(X))
+        return X[:, 0] * 10
+
+    b = MicroBatcher(predict, max_batch=64, max_wait_ms=50)
+
+    async def run():
+        return await asyncio.gather(*(b.submit(np.array([float(i), 0.0]), None) for i in range(10)))
+
+    assert asyncio.run(run()) == [10.0 * i for i in range(10)]
+    assert calls == [10]
+    assert b.stats()["batches"] == 1 and b.stats()["rows"] == 10
\ No newline at end of file
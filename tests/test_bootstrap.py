@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sharp.bootstrap import (bootstrap_tam, bootstrap_readmit_ratio, bootstrap_did, parallel_bootstrap,
+                             _tam_stat, _readmit_ratio_stat, _did_stat)
+from sharp.causal import EXPANSION_STATES
+
+N_BOOT = 60
+
+def _did_frame(df):
+    return pd.DataFrame({
+        "Provider_State": df["Provider_State"],
+        "payment_ratio": df["payment_ratio"],
+        "post": df["year"] >= 2014,
+        "treated": df["Provider_State"].isin(EXPANSION_STATES),
+    })
+
+CASES = {
+    "tam": (bootstrap_tam, lambda d: d, _tam_stat, "DRG_Code",
+            ["DRG_Code", "payment_ratio", "Average_Total_Payments", "Total_Discharges"]),
+    "readmit": (bootstrap_readmit_ratio, lambda d: d, _readmit_ratio_stat, "Provider_Id",
+                ["payment_ratio", "is_readmit_prone", "Total_Discharges"]),
+    "did": (bootstrap_did, _did_frame, _did_stat, "Provider_State", ["payment_ratio", "post", "treated"]),
+}
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_weight_shortcut_matches_row_resampling(features, name):
+    fn, frame, stat, cluster, cols = CASES[name]
+    fast = fn(features, n_boot=N_BOOT)
+    slow = parallel_bootstrap(frame(features), stat, cluster, N_BOOT, n_workers=1, columns=cols)
+    assert list(fast.columns) == list(slow.columns)
+    np.testing.assert_allclose(fast.to_numpy(float), slow.to_numpy(float), rtol=1e-6)
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_worker_count_does_not_change_results(features, name):
+    fn = CASES[name][0]
+    one = fn(features, n_boot=N_BOOT, n_workers=1)
+    pd.testing.assert_frame_equal(one, fn(features, n_boot=N_BOOT, n_workers=2))
+
+def test_tol_stops_early(features):
+    out = bootstrap_tam(features, n_boot=2000, tol=0.5)
+    assert out["n_boot"].iloc[0] < 2000
+
+def _resample(df, key, w):
+    codes = pd.factorize(df[key])[0]
+    idx = np.concatenate([np.repeat(np.flatnonzero(codes == c), int(k)) for c, k in enumerate(w) if k])
+    return df.iloc[np.sort(idx, kind="stable")]
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_cluster_weights_match_explicit_resampling(features, seed):
+    from sharp.bootstrap import (tam_cluster_stats, did_cluster_stats, _cluster_sums, _tam_from_weights,
+                                 _ratio_from_weights, _did_from_weights)
+    from sharp.savings import tam_and_top_hospitals, readmit_ratio
+    from sharp.did import did_cells, did_2x2
+    rng = np.random.default_rng(seed)
+    df = features
+
+    v = tam_cluster_stats(df).to_numpy()
+    w = rng.multinomial(len(v), np.full(len(v), 1 / len(v)))
+    assert _tam_from_weights(w[None].astype(float), v)[0] == pytest.approx(
+        tam_and_top_hospitals(_resample(df, "DRG_Code", w))[0], rel=1e-6)
+
+    ratio, prone = df["payment_ratio"].to_numpy(), df["is_readmit_prone"].to_numpy(bool)
+    td = df["Total_Discharges"].to_numpy(np.float64)
+    _, s = _cluster_sums(df["Provider_Id"], {"low": np.where(prone & (ratio < 0.3), td, 0.0),
+                                             "high": np.where(prone & (ratio >= 0.3), td, 0.0)})
+    w = rng.multinomial(len(s["low"]), np.full(len(s["low"]), 1 / len(s["low"])))
+    assert _ratio_from_weights(w[None].astype(float), s["low"], s["high"])[0] == pytest.approx(
+        readmit_ratio(_resample(df, "Provider_Id", w)), rel=1e-9)
+
+    stats = did_cluster_stats(df)
+    w = rng.multinomial(len(stats), np.full(len(stats), 1 / len(stats)))
+    assert _did_from_weights(w[None].astype(float), stats)[0] == pytest.approx(
+        did_2x2(did_cells(_resample(df, "Provider_State", w)))["did"].iloc[0], rel=1e-9)
\ No newline at end of file
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from sharp.cube import build_cube, slice_cube, correlation, CORR_COLS
+
+@pytest.mark.parametrize("missing", [0.0, 0.1])
+def test_correlation_matches_pairwise_corr(features, missing):
+    rng = np.random.default_rng(2)
+    df = features.copy()
+    for c in CORR_COLS:
+        df.loc[rng.random(len(df)) < missing, c] = np.nan
+    cube = build_cube(df)
+    np.testing.assert_allclose(correlation(cube).to_numpy(), df[CORR_COLS].corr().to_numpy(), atol=1e-10)
+    states = sorted(df["Provider_State"].unique())[:5]
+    sub = df[df["Provider_State"].isin(states)]
+    np.testing.assert_allclose(correlation(slice_cube(cube, states=states)).to_numpy(),
+                               sub[CORR_COLS].corr().to_numpy(), atol=1e-10)
@@ -0,0 +1,22 @@
+import pytest
+from sharp.data import _read_csv, iter_year_chunks
+
+CSV = """DRG Definition,Provider Id,Provider State,Provider Zip Code,Total Discharges,Average Covered Charges,Average Total Payments,Average Medicare Payments
+039 - X,10001,AL,36301,91,$32963.07,$5777.24,$4763.73
+039 - X,10005,AL,35957,,$15131.85,$5787.57,$4976.71
+039 - X,10006,AL,35631,"1,038",$37560.37,$5434.95,$4453.79
+039 - X,10011,AL,35235,n/a,$13998.28,$5417.56,$4129.16
+"""
+
+def test_blank_discharges_name_file_and_lines(tmp_path):
+    p = tmp_path / "ipps_fy2011.csv"
+    p.write_text(CSV)
+    with pytest.raises(ValueError, match=r"ipps_fy2011\.csv.*2 line\(s\): \[3, 5\]"):
+        _read_csv(p)
+    with pytest.raises(ValueError, match=r"1 line\(s\): \[3\]"):
+        list(iter_year_chunks(p, chunksize=1, cache=False))
+
+def test_thousands_separator_parses(tmp_path):
+    p = tmp_path / "ipps_fy2011.csv"
+    p.write_text("\n".join(l for i, l in enumerate(CSV.splitlines()) if i in (0, 1, 3)))
+    assert _read_csv(p)["Total_Discharges"].tolist() == [91, 1038]
\ No newline at end of file
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sharp.did import did_cells, event_study, default_cohorts
+
+def _row_twfe(df, cohorts, ref=-1, static=False):
+    d = df[df["payment_ratio"].notna()].reset_index(drop=True)
+    y = d["payment_ratio"].to_numpy(np.float64)
+    state = d["Provider_State"].astype(str)
+    g = state.map(cohorts).to_numpy(np.float64)
+    rel = d["year"].to_numpy() - g
+    treated = ~np.isnan(g)
+    if static:
+        events, D = [0], (treated & (rel >= 0))[:, None].astype(float)
+    else:
+        events = [e for e in np.unique(rel[treated]) if e != ref]
+        D = np.column_stack([(treated & (rel == e)).astype(float) for e in events])
+    X = np.column_stack([pd.get_dummies(state).to_numpy(float),
+                         pd.get_dummies(d["year"]).to_numpy(float)[:, 1:], D])
+    beta = np.linalg.lstsq(X, y, rcond=None)[0]
+    e = y - X @ beta
+    bread = np.linalg.pinv(X.T @ X)
+    si, su = pd.factorize(state)
+    S = np.zeros((len(su), X.shape[1]))
+    np.add.at(S, si, X * e[:, None])
+    n, k, G = len(y), np.linalg.matrix_rank(X), len(su)
+    cov = G / (G - 1) * (n - 1) / (n - k) * bread @ (S.T @ S) @ bread
+    m = D.shape[1]
+    return np.array(events, dtype=int), beta[-m:], np.sqrt(np.diag(cov)[-m:])
+
+@pytest.mark.parametrize("static", [False, True])
+def test_cell_event_study_matches_row_twfe_cr1(features, static):
+    cohorts = default_cohorts()
+    got = event_study(did_cells(features), cohorts=cohorts, static=static)
+    if not static:
+        got = got[got["event_time"] != -1]
+    events, coef, se = _row_twfe(features, cohorts, static=static)
+    assert got["event_time"].tolist() == events.tolist()
+    np.testing.assert_allclose(got["coef"].to_numpy(), coef, rtol=1e-8, atol=1e-12)
+    np.testing.assert_allclose(got["se"].to_numpy(), se, rtol=1e-8)
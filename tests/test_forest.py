@@ -0,0 +1,62 @@
+import json
+import numpy as np
+import pandas as pd
+import joblib
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sharp.forest import export_forest, load_forest, predict_forest, ROW_BLOCK
+from api.models import ModelHolder, predict_rows
+from sharp.model import save_model
+
+FEATS = ["a", "b", "c", "d", "e"]
+
+@pytest.fixture(scope="module")
+def rf():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(2000, len(FEATS))), columns=FEATS)
+    X["e"] = rng.integers(0, 3, len(X)).astype(float)
+    y = X["a"] * 3 + np.sin(X["b"]) + X["e"] + rng.normal(scale=0.1, size=len(X))
+    return RandomForestRegressor(n_estimators=25, min_samples_leaf=2, random_state=0, n_jobs=1).fit(X, y)
+
+def _rows(n, seed=1):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, len(FEATS)))
+    X[:, 4] = rng.integers(0, 3, n)
+    return X
+
+@pytest.mark.parametrize("n", [1, 7, 64, ROW_BLOCK + 3, 3000])
+def test_forest_matches_sklearn(rf, tmp_path, n):
+    forest = load_forest(export_forest(rf, tmp_path / "forest"))
+    X = _rows(n)
+    assert np.array_equal(predict_forest(forest, X), rf.predict(pd.DataFrame(X, columns=FEATS)))
+
+def test_forest_matches_sklearn_on_thresholds(rf, tmp_path):
+    forest = load_forest(export_forest(rf, tmp_path / "forest"))
+    t = rf.estimators_[0].tree_
+    split = t.feature >= 0
+    X = np.tile(_rows(1)[0], (int(split.sum()), 1))
+    X[np.arange(len(X)), t.feature[split]] = t.threshold[split]
+    assert np.array_equal(predict_forest(forest, X), rf.predict(pd.DataFrame(X, columns=FEATS)))
+
+def test_holder_routes_by_batch_size(rf, tmp_path):
+    export_forest(rf, tmp_path / "forest")
+    joblib.dump(rf, tmp_path / "rf.pkl")
+    (tmp_path / "features.json").write_text(json.dumps(FEATS))
+    holder = ModelHolder(tmp_path, forest_max_rows=100)
+    m = holder.get()
+    small, large = _rows(50), _rows(500)
+    assert np.array_equal(predict_rows(m, small), rf.predict(pd.DataFrame(small, columns=FEATS)))
+    assert m["rf"] is None
+    assert np.array_equal(predict_rows(m, large), rf.predict(pd.DataFrame(large, columns=FEATS)))
+    assert m["rf"] is not None
+
+def test_saved_production_model_matches_forest(tmp_path):
+    rng = np.random.default_rng(3)
+    X = pd.DataFrame(rng.normal(size=(3000, len(FEATS))), columns=FEATS)
+    y = X["a"] * 2 + np.cos(X["c"]) + rng.normal(scale=0.1, size=len(X))
+    rf = RandomForestRegressor(n_estimators=40, random_state=0, n_jobs=-1).fit(X, y)
+    save_model({"model": rf, "features": FEATS}, tmp_path)
+    m = ModelHolder(tmp_path, forest_max_rows=0).get()
+    rows = _rows(2000, seed=4)
+    assert np.array_equal(predict_rows(m, rows), predict_forest(m["forest"], rows))
+    assert m["rf"].n_jobs == 1
\ No newline at end of file
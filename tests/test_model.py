@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import roc_auc_score, precision_recall_curve, auc
+from sharp.model import evaluate_predictions, growth_score
+
+THR = 0.2
+
+@pytest.fixture(scope="module")
+def pred():
+    rng = np.random.default_rng(3)
+    n = 3000
+    readmit = rng.integers(5, 80, n).astype(float)
+    growth = rng.normal(0.1, 0.25, n)
+    pred_next = np.round(readmit * (1 + growth + rng.normal(0, 0.15, n)))
+    state = rng.choice(["AL", "CA", "NY", "TX", "WY"], n, p=[0.3, 0.3, 0.2, 0.19, 0.01])
+    high = growth > THR
+    high[state == "WY"] = False
+    return pd.DataFrame({"Provider_State": state, "readmit_discharges": readmit, "pred_next": pred_next,
+                         "high_risk": high})
+
+def _pr_auc(y, s):
+    p, r, _ = precision_recall_curve(y, s)
+    return auc(r, p)
+
+def test_aucs_match_sklearn(pred):
+    out = evaluate_predictions(pred, THR)
+    y = pred["high_risk"].astype(int).to_numpy()
+    s = growth_score(pred["pred_next"].to_numpy(float), pred["readmit_discharges"].to_numpy(float), THR)
+    assert len(np.unique(s)) < len(s)
+    assert out["roc_auc"] == pytest.approx(roc_auc_score(y, s), rel=1e-12)
+    assert out["pr_auc"] == pytest.approx(_pr_auc(y, s), rel=1e-12)
+    states = {r["Provider_State"]: r for r in out["states"]}
+    for st in sorted(states):
+        m = (pred["Provider_State"] == st).to_numpy()
+        if st == "WY":
+            assert states[st]["ROC_AUC"] is None and states[st]["PR_AUC"] is None
+            continue
+        assert states[st]["ROC_AUC"] == pytest.approx(roc_auc_score(y[m], s[m]), rel=1e-12)
+        assert states[st]["PR_AUC"] == pytest.approx(_pr_auc(y[m], s[m]), rel=1e-12)
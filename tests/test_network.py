@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sharp.network import weighted_degree
+
+@pytest.fixture(scope="module")
+def rows():
+    rng = np.random.default_rng(5)
+    n = 400
+    return pd.DataFrame({
+        "Provider_Id": rng.integers(0, 40, n),
+        "Provider_Zip_Code": 10000 + rng.integers(0, 6, n) * 7,
+        "Total_Discharges": rng.integers(1, 6, n) * 10,
+        "year": rng.integers(2011, 2014, n),
+    })
+
+def _self_join(df):
+    e = df.groupby(["Provider_Zip_Code", "Provider_Id"]).agg(vol=("Total_Discharges", "sum")).reset_index()
+    z = e.merge(e, on="Provider_Zip_Code", suffixes=("_u", "_v"))
+    z = z[z["Provider_Id_u"] != z["Provider_Id_v"]]
+    z["weight"] = z[["vol_u", "vol_v"]].min(axis=1)
+    return z.groupby("Provider_Id_u")["weight"].sum().rename("degree").reset_index().rename(
+        columns={"Provider_Id_u": "Provider_Id"})
+
+@pytest.mark.parametrize("backend", ["pandas", "duckdb"])
+def test_weighted_degree_matches_self_join(rows, backend):
+    if backend == "duckdb":
+        pytest.importorskip("duckdb")
+    got = weighted_degree(rows, backend=backend).sort_values("Provider_Id").reset_index(drop=True)
+    ref = _self_join(rows)
+    assert got["Provider_Id"].tolist() == ref["Provider_Id"].tolist()
+    np.testing.assert_allclose(got["degree"].to_numpy(float), ref["degree"].to_numpy(float))
+
+def _dense_eigenvector(A):
+    vals, vecs = np.linalg.eigh(A)
+    v = np.abs(vecs[:, -1])
+    return v / v.max()
+
+def test_eigenvector_is_computed_per_component():
+    from sharp.network import provider_graph, graph_centrality
+    df = pd.DataFrame({
+        "Provider_Id": [1, 2, 3, 4, 5, 6, 7, 8],
+        "Provider_Zip_Code": [10001, 10002, 10003, 10004, 20001, 20002, 20003, 30001],
+        "Total_Discharges": [500, 400, 300, 900, 2, 3, 4, 7],
+        "year": 2015,
+    })
+    A, ids = provider_graph(df)
+    out = graph_centrality(A, ids)
+    D = A.toarray()
+    for ix in ([0, 1, 2, 3], [4, 5, 6]):
+        np.testing.assert_allclose(out["eigenvector"].to_numpy()[ix], _dense_eigenvector(D[np.ix_(ix, ix)]),
+                                   rtol=1e-6)
+    assert out["eigenvector"].iloc[7] == 0.0
+
+def test_min_weight_drops_edges_not_providers(rows):
+    from sharp.network import provider_graph
+    A0, ids0 = provider_graph(rows, by_year=False)
+    A, ids = provider_graph(rows, by_year=False, min_weight=300)
+    assert ids.tolist() == ids0.tolist()
+    D0 = A0.toarray()
+    np.testing.assert_array_equal(A.toarray(), np.where(D0 >= 300, D0, 0))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sharp.savings import (build_savings_engine, engine_tam, engine_top_hospitals, tam_and_top_hospitals,
+                           tam_curve)
+
+@pytest.fixture(scope="module")
+def engine(features):
+    return build_savings_engine(features)
+
+FILTERS = [
+    {},
+    {"states": ["CA", "TX", "NY"]},
+    {"drgs": ["291", "292", "470"]},
+    {"sizes": ["large"]},
+    {"states": ["CA", "TX"], "sizes": ["small", "medium"]},
+]
+
+def _subset(df, states=None, drgs=None, sizes=None):
+    m = np.ones(len(df), dtype=bool)
+    if states:
+        m &= df["Provider_State"].astype(str).isin(states).to_numpy()
+    if drgs:
+        m &= df["DRG_Code"].isin(drgs).to_numpy()
+    if sizes:
+        m &= df["hospital_size_category"].astype(str).isin(sizes).to_numpy()
+    return df[m]
+
+@pytest.mark.parametrize("f", FILTERS)
+def test_engine_matches_row_level_savings(features, engine, f):
+    tam, top = tam_and_top_hospitals(_subset(features, **f))
+    assert engine_tam(engine, **f) == pytest.approx(tam, rel=1e-5)
+    got = engine_top_hospitals(engine, 100, **f)
+    assert got["Provider_Id"].tolist() == top["Provider_Id"].tolist()
+    np.testing.assert_allclose(got["opportunity"], top["opportunity"], rtol=1e-5, atol=1e-3)
+
+def _row_tam(df, t):
+    g = lambda d: d.groupby("DRG_Code")
+    s = g(df[df["payment_ratio"] < t]).agg(atp=("Average_Total_Payments", "mean"), td=("Total_Discharges", "sum"))
+    n = g(df[df["payment_ratio"] > 0.5])["Average_Total_Payments"].mean()
+    return float(((s["atp"] - n) * s["td"]).sum())
+
+def test_threshold_curve_matches_row_level_tam(features, engine):
+    grid = np.round(np.arange(0.05, 0.701, 0.05), 2)
+    curve = tam_curve(engine, grid)
+    np.testing.assert_allclose(curve["tam"], [engine_tam(engine, stressed_max=t) for t in grid], rtol=1e-12)
+    np.testing.assert_allclose(curve["tam"], [_row_tam(features, t) for t in grid], rtol=1e-5)
+
+def test_missing_drg_rows_are_dropped_on_both_backends(features):
+    pytest.importorskip("duckdb")
+    rng = np.random.default_rng(4)
+    df = features.copy()
+    gone = df["Provider_Id"].iloc[0]
+    df.loc[(df["Provider_Id"] == gone) | (rng.random(len(df)) < 0.05), "DRG_Code"] = np.nan
+    tam, top = tam_and_top_hospitals(df)
+    sql_tam, sql_top = tam_and_top_hospitals(df, backend="duckdb")
+    assert gone not in top["Provider_Id"].tolist()
+    assert tam == pytest.approx(sql_tam, rel=1e-6)
+    a, b = top.set_index("Provider_Id")["opportunity"], sql_top.set_index("Provider_Id")["opportunity"]
+    assert sorted(a.index) == sorted(b.index)
+    np.testing.assert_allclose(a.sort_index(), b.sort_index(), rtol=1e-5, atol=1e-3)
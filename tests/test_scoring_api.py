@@ -0,0 +1,18 @@
+import pytest
+from fastapi.testclient import TestClient
+from api.scoring_api import app
+
+client = TestClient(app)
+
+@pytest.mark.parametrize("body,ctype", [
+    (b"{bad", "application/json"),
+    (b"42", "application/json"),
+    (b'"records"', "application/json"),
+    (b'{"records": 5}', "application/json"),
+    (b"[1, 2]", "application/json"),
+    (b'{"payment_ratio": 1}\n{bad', "application/x-ndjson"),
+    (b"\xff\xfe", "application/json"),
+])
+def test_malformed_batch_is_422(body, ctype):
+    r = client.post("/score/batch", content=body, headers={"content-type": ctype})
+    assert r.status_code == 422, r.text
\ No newline at end of file
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sharp.survival import kaplan_meier, cox_model
+
+lifelines = pytest.importorskip("lifelines")
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(11)
+    n = 600
+    x = rng.normal(size=(n, 3))
+    t = np.ceil(rng.exponential(4 * np.exp(-(x @ [0.5, -0.3, 0.0]))))
+    return pd.DataFrame({
+        "a": x[:, 0], "b": x[:, 1], "c": x[:, 2],
+        "group": rng.choice(["x", "y", "z"], n),
+        "duration": np.minimum(t, 6),
+        "event": (t <= 6) & (rng.random(n) < 0.85),
+    })
+
+def test_kaplan_meier_matches_lifelines(frame):
+    got = kaplan_meier(frame["duration"], frame["event"], frame["group"])
+    for g, d in frame.groupby("group"):
+        kmf = lifelines.KaplanMeierFitter().fit(d["duration"], d["event"])
+        mine = got[got["group"] == g].set_index("time")
+        ref = kmf.survival_function_.join(kmf.confidence_interval_).loc[mine.index]
+        np.testing.assert_allclose(mine["survival"], ref.iloc[:, 0], rtol=1e-10)
+        np.testing.assert_allclose(mine["ci_lower"], ref.iloc[:, 1], rtol=1e-8)
+        np.testing.assert_allclose(mine["ci_upper"], ref.iloc[:, 2], rtol=1e-8)
+        np.testing.assert_array_equal(mine["at_risk"], kmf.event_table.loc[mine.index, "at_risk"])
+
+def test_numpy_cox_matches_lifelines(frame):
+    cov = ["a", "b", "c"]
+    mine = cox_model(frame, cov, engine="numpy")
+    ref = cox_model(frame, cov, engine="lifelines")
+    assert mine["engine"] == "numpy" and ref["engine"] == "lifelines"
+    a, b = mine["summary"].set_index("covariate"), ref["summary"].set_index("covariate")
+    np.testing.assert_allclose(a["coef"], b.loc[a.index, "coef"], rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(a["se"], b.loc[a.index, "se"], rtol=1e-5)
+    assert mine["log_likelihood"] == pytest.approx(ref["log_likelihood"], rel=1e-8)
+    assert mine["concordance"] == pytest.approx(ref["concordance"], rel=1e-8)